@@ -0,0 +1,21 @@
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "letsdance.settings")
+
+application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+from letsdance.core.asgi import BodySizeLimit  # noqa: E402
+from letsdance.core.cache import board_cache  # noqa: E402
+from letsdance.core.tasks import scheduler  # noqa: E402
+
+application = BodySizeLimit(application)
+
+scheduler.start()
+
+# ASGI servers may import the application from inside of a running event loop,
+# where the ORM refuses to run, so warm the cache from a scheduler thread instead.
+scheduler.add_job(board_cache.warm, args=[settings.BOARD_CACHE_WARM_COUNT])
@@ -1,5 +1,9 @@
 import pytest
 
+from letsdance.core import crypto
+from letsdance.core.cache import board_cache
+from letsdance.core.newsstand import newsstand
+
 
 # Allow database access in all unit tests
 def pytest_collection_modifyitems(items):
@@ -10,3 +14,10 @@ def pytest_collection_modifyitems(items):
 @pytest.fixture(autouse=True)
 def media_storage(settings, tmpdir) -> None:
     settings.MEDIA_ROOT = tmpdir.strpath
+
+
+@pytest.fixture(autouse=True)
+def clear_caches() -> None:
+    board_cache.clear()
+    newsstand.clear()
+    crypto.clear_caches()
@@ -1,12 +1,38 @@
+from django import forms
 from django.contrib import admin
+from django.db import transaction
 from django.urls import reverse
 from django.utils.html import format_html
 
-from letsdance.core.models import Board, Peer
+from letsdance.core.cache import board_cache
+from letsdance.core.constants import BOARD_MAX_COUNT
+from letsdance.core.models import Board, Delivery, FollowedKey, Peer
+from letsdance.core.newsstand import newsstand
+
+
+class BoardAdminForm(forms.ModelForm):
+    """
+    Edit the board content as text, it's stored as the raw bytes that were signed.
+    """
+
+    content = forms.CharField(widget=forms.Textarea, strip=False)
+
+    class Meta:
+        model = Board
+        fields = ["key", "content", "signature", "last_modified"]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk is not None:
+            self.initial["content"] = self.instance.text
+
+    def clean_content(self) -> bytes:
+        return self.cleaned_data["content"].encode()
 
 
 @admin.register(Board)
 class BoardAdmin(admin.ModelAdmin):
+    form = BoardAdminForm
     list_display = ["id", "key", "last_modified"]
     search_fields = ["key"]
     readonly_fields = ["url"]
@@ -17,8 +43,55 @@ class BoardAdmin(admin.ModelAdmin):
         url = reverse("board", args=[obj.key])
         return format_html("<a href='{}'>{}</a>", url, url)
 
+    def changelist_view(self, request, extra_context=None):
+        count = Board.objects.stored_count()
+        title = f"Boards ({count:,} of {BOARD_MAX_COUNT:,}, {count / BOARD_MAX_COUNT:.1%} full)"
+        return super().changelist_view(request, {"title": title, **(extra_context or {})})
+
+    def save_model(self, request, obj, form, change):
+        obj.set_content(obj.content)
+        with transaction.atomic():
+            # The stored version, the form has already updated obj
+            removed = []
+            if change:
+                removed = list(Board.objects.filter(pk=obj.pk).values_list("key", "last_modified"))
+            super().save_model(request, obj, form, change)
+            Board.objects.track(added=[(obj.key, obj.last_modified)], removed=removed)
+        board_cache.delete(obj.key)
+        newsstand.discard([obj.key])
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            Board.objects.track(removed=[(obj.key, obj.last_modified)])
+        board_cache.delete(obj.key)
+        newsstand.discard([obj.key])
+
+    def delete_queryset(self, request, queryset):
+        removed = list(queryset.values_list("key", "last_modified"))
+        keys = [key for key, _ in removed]
+        with transaction.atomic():
+            queryset.delete()
+            Board.objects.track(removed=removed)
+        board_cache.delete_many(keys)
+        newsstand.discard(keys)
+
 
 @admin.register(Peer)
 class PeerAdmin(admin.ModelAdmin):
-    list_display = ["id", "url"]
+    list_display = ["id", "url", "latency", "failure_rate", "last_success", "breaker_state"]
     search_fields = ["url"]
+
+
+@admin.register(Delivery)
+class DeliveryAdmin(admin.ModelAdmin):
+    list_display = ["id", "key", "peer", "attempts", "next_attempt"]
+    list_filter = ["attempts"]
+    search_fields = ["key", "peer__url"]
+    raw_id_fields = ["peer"]
+
+
+@admin.register(FollowedKey)
+class FollowedKeyAdmin(admin.ModelAdmin):
+    list_display = ["id", "key", "created_at"]
+    search_fields = ["key"]
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from letsdance.core.constants import BOARD_MAX_SIZE_BYTES
+
+
+class BodySizeLimit:
+    """
+    ASGI wrapper that turns away request bodies over the board size limit.
+
+    Django reads the whole body into memory or a temporary file before an
+    async view runs, so the view can't stop reading a large upload part way
+    through. This reads PUT bodies first, answering 413 as soon as either
+    the Content-Length header or the bytes received go over the limit, then
+    passes the buffered body on to the application.
+    """
+
+    def __init__(self, app, max_bytes: int = BOARD_MAX_SIZE_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "PUT":
+            return await self.app(scope, receive, send)
+
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                return await self.reject(send)
+
+        messages = []
+        size = 0
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            size += len(message.get("body", b""))
+            if size > self.max_bytes:
+                return await self.reject(send)
+            if not message.get("more_body", False):
+                break
+
+        async def replay():
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        return await self.app(scope, replay, send)
+
+    async def reject(self, send) -> None:
+        body = f"Board is larger than {self.max_bytes} bytes.".encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"spring-version", b"83"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,69 @@
+import sqlite3
+import threading
+from collections import defaultdict
+
+from django.db.backends.sqlite3 import base
+
+# Idle connections by database file, shared by every thread
+pools: defaultdict[str, list[sqlite3.Connection]] = defaultdict(list)
+pools_lock = threading.Lock()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend tuned for a server with concurrent readers and writers.
+
+    Two extra OPTIONS are understood on top of the stock backend:
+
+    - "pragmas": PRAGMA statements to run on every new connection, like
+      {"journal_mode": "wal", "busy_timeout": 5000}.
+    - "transaction_mode": how transactions are started, e.g. "IMMEDIATE".
+      SQLite can't wait on busy_timeout when a deferred transaction that
+      has already read tries to upgrade to a write, it fails right away with
+      "database is locked". Taking the write lock at BEGIN avoids that.
+    - "pool_size": how many idle connections to keep for reuse. Django
+      keeps connections per thread, and under ASGI every request runs in a
+      new thread, so CONN_MAX_AGE can't reuse them. Closing a connection
+      returns it to a pool shared by all threads instead, which saves
+      opening it and running the pragmas again on the next request.
+    """
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop("pragmas", None)
+        params.pop("transaction_mode", None)
+        params.pop("pool_size", None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        with pools_lock:
+            pool = pools[self.settings_dict["NAME"]]
+            if pool:
+                return pool.pop()
+
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict["OPTIONS"].get("pragmas", {}).items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _close(self):
+        pool_size = self.settings_dict["OPTIONS"].get("pool_size", 0)
+        if self.connection is None or not pool_size or self.is_in_memory_db():
+            return super()._close()
+
+        try:
+            # A connection closed part way through a transaction is left to roll back
+            if self.connection.in_transaction:
+                self.connection.rollback()
+        except sqlite3.Error:
+            return super()._close()
+        with pools_lock:
+            pool = pools[self.settings_dict["NAME"]]
+            if len(pool) < pool_size:
+                pool.append(self.connection)
+                return
+        super()._close()
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict["OPTIONS"].get("transaction_mode")
+        self.cursor().execute(f"BEGIN {mode}" if mode else "BEGIN")
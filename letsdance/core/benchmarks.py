@@ -0,0 +1,525 @@
+from __future__ import annotations
+
+import copy
+import gzip
+import json
+import math
+import os
+import platform
+import random
+import secrets
+import tempfile
+import threading
+import time
+import warnings
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import timedelta
+from pathlib import Path
+from typing import Any
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.test import Client, override_settings
+from django.urls import path, reverse
+from django.utils import timezone
+from parsel import Selector
+
+from letsdance.core.cache import board_cache
+from letsdance.core.constants import BOARD_MAX_SIZE_BYTES, TEST_KEY_PUBLIC
+from letsdance.core.crypto import (
+    clear_caches,
+    dump_public_key,
+    generate_private_key,
+    validate_public_key,
+    verify_signature,
+)
+from letsdance.core.models import Board
+from letsdance.core.newsstand import format_cursor, newsstand
+from letsdance.core.parsing import find_time_tags
+from letsdance.core.utils import (
+    date_from_header,
+    date_to_header,
+    generate_fake_board_content,
+)
+from letsdance.core.views import BoardView
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    timings: list[float]
+    # Wall clock time, for operations that were timed concurrently
+    elapsed: float | None = None
+    # Extra context that shouldn't be part of the name, like response sizes
+    notes: str = ""
+
+    @property
+    def iterations(self) -> int:
+        return len(self.timings)
+
+    @property
+    def ops_per_second(self) -> float:
+        return self.iterations / (self.elapsed or sum(self.timings))
+
+    def percentile(self, percent: float) -> float:
+        """
+        Return the given percentile of the timings, in seconds (nearest-rank).
+        """
+        timings = sorted(self.timings)
+        index = max(math.ceil(percent / 100 * len(timings)) - 1, 0)
+        return timings[index]
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "iterations": self.iterations,
+            "ops_per_second": self.ops_per_second,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "notes": self.notes,
+        }
+
+
+@dataclass
+class Comparison:
+    """
+    The throughput of a benchmark against the same benchmark in a baseline run.
+    """
+
+    name: str
+    baseline: float
+    current: float
+
+    @property
+    def change(self) -> float:
+        """
+        Relative change in ops/s, e.g. -0.25 when 25% slower than the baseline.
+        """
+        return self.current / self.baseline - 1
+
+    def is_regression(self, threshold: float) -> bool:
+        return self.change < -threshold
+
+
+def save_results(path: str | Path, results: list[BenchmarkResult], duration: float) -> None:
+    """
+    Write the summary of a run to a JSON file that later runs can be compared against.
+    """
+    data = {
+        "created": timezone.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "duration": duration,
+        "results": {result.name: result.to_dict() for result in results},
+    }
+    with open(path, "w") as fp:
+        json.dump(data, fp, indent=2)
+        fp.write("\n")
+
+
+def load_results(path: str | Path) -> dict[str, dict[str, Any]]:
+    with open(path) as fp:
+        return json.load(fp)["results"]
+
+
+def compare_results(
+    baseline: dict[str, dict[str, Any]], results: list[BenchmarkResult]
+) -> dict[str, Comparison]:
+    """
+    Compare each result against the baseline result of the same name.
+
+    Results that are missing from the baseline, or that have no throughput
+    to compare (e.g. every operation failed), are left out.
+    """
+    comparisons = {}
+    for result in results:
+        if result.name not in baseline:
+            continue
+        before = baseline[result.name]["ops_per_second"]
+        after = result.ops_per_second
+        if not before or math.isnan(before) or math.isnan(after):
+            continue
+        comparisons[result.name] = Comparison(result.name, before, after)
+    return comparisons
+
+
+def measure(
+    name: str,
+    func: Callable[[], object],
+    duration: float = 1.0,
+    setup: Callable[[], object] | None = None,
+    min_iterations: int = 5,
+) -> BenchmarkResult:
+    """
+    Call func repeatedly for roughly the given number of seconds and time each call.
+
+    The setup function, if provided, is called before every iteration and is
+    not included in the timings.
+    """
+    timings = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline or len(timings) < min_iterations:
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return BenchmarkResult(name, timings)
+
+
+Benchmark = Callable[[float], list[BenchmarkResult]]
+
+benchmarks: dict[str, Benchmark] = {}
+
+
+def register(name: str) -> Callable[[Benchmark], Benchmark]:
+    def decorator(func: Benchmark) -> Benchmark:
+        benchmarks[name] = func
+        return func
+
+    return decorator
+
+
+def create_fake_boards(count: int, using: str = "default") -> list[Board]:
+    """
+    Insert boards with realistic content, the keys and signatures are not valid.
+    """
+    now = timezone.now()
+    boards = []
+    for i in range(count):
+        last_modified = now - timedelta(minutes=i)
+        board = Board(
+            key=secrets.token_hex(32),
+            signature=secrets.token_hex(64),
+            last_modified=last_modified,
+        )
+        board.set_content(generate_fake_board_content(last_modified).encode())
+        boards.append(board)
+    return Board.objects.using(using).bulk_create(boards)
+
+
+@register("index")
+def bench_index(duration: float) -> list[BenchmarkResult]:
+    """
+    The newsstand with 500 boards, with and without pre-rendered fragments.
+
+    The cold run renders every board on each request, which is the same work
+    the index did before fragments were cached. The older page is streamed
+    from a cursor in the middle of the boards.
+    """
+    boards = create_fake_boards(500)
+    client = Client()
+    url = reverse("index")
+    middle = boards[len(boards) // 2]
+    older_url = f"{url}?before={format_cursor(middle.last_modified, middle.id)}"
+
+    results = [
+        measure("index (cold)", lambda: client.get(url), duration, setup=newsstand.clear),
+        measure("index (warm)", lambda: client.get(url), duration),
+    ]
+    with warnings.catch_warnings():
+        # The sync test client has to consume the async stream in one go
+        warnings.simplefilter("ignore")
+        results.append(
+            measure("index older page", lambda: b"".join(client.get(older_url)), duration)
+        )
+    Board.objects.all().delete()
+    newsstand.clear()
+    return results
+
+
+class UnlimitedBoardView(BoardView):
+    """
+    BoardView without the key suffix check or upload rate limits.
+
+    Finding a key with a valid suffix takes far too long, and every PUT in the
+    benchmark is from the same address for the same key.
+    """
+
+    def validate_public_key(self, key: str) -> str:
+        return key
+
+    async def throttle_address(self, address: str) -> None:
+        pass
+
+    async def store_board(self, *args, **kwargs) -> tuple[Board, bool]:
+        kwargs["rate_limit"] = False
+        return await super().store_board(*args, **kwargs)
+
+
+class UnlimitedURLConf:
+    urlpatterns = [path("<str:key>", UnlimitedBoardView.as_view(), name="board")]
+
+
+@register("board")
+def bench_board(duration: float) -> list[BenchmarkResult]:
+    """
+    BoardView GET and PUT through the full request cycle of the test client.
+
+    Every PUT is a new, correctly signed version of the same board.
+    """
+    private_key = generate_private_key()
+    key = dump_public_key(private_key.public_key())
+    url = reverse("board", args=[key])
+    test_url = reverse("board", args=[TEST_KEY_PUBLIC])
+    client = Client()
+
+    # Start in the past so that each version can be a second newer than the last
+    last_modified = timezone.now().replace(microsecond=0) - timedelta(days=1)
+    request: dict[str, Any] = {}
+
+    def prepare_put():
+        nonlocal last_modified
+        last_modified += timedelta(seconds=1)
+        content = generate_fake_board_content(last_modified).encode()
+        request["data"] = content
+        request["HTTP_SPRING_SIGNATURE"] = private_key.sign(content).hex()
+        request["HTTP_IF_UNMODIFIED_SINCE"] = date_to_header(last_modified)
+
+    def put():
+        response = client.put(url, content_type="text/html", **request)
+        assert response.status_code == 200, response.content
+
+    # A replay of the stored version, turned away before its signature is verified
+    replay: dict[str, Any] = {}
+
+    def put_replay():
+        response = client.put(url, content_type="text/html", **replay)
+        assert response.status_code == 409, response.content
+
+    def put_oversized():
+        response = client.put(url, data=oversized, content_type="text/html")
+        assert response.status_code == 413, response.content
+
+    oversized = b"x" * BOARD_MAX_SIZE_BYTES * 100
+
+    with override_settings(ROOT_URLCONF=UnlimitedURLConf):
+        results = [measure("board put", put, duration, setup=prepare_put)]
+        replay.update(request)
+        results += [
+            measure("board put (replay)", put_replay, duration),
+            measure("board put (oversized)", put_oversized, duration),
+        ]
+
+    results += [
+        measure("board get (cold)", lambda: client.get(url), duration, setup=board_cache.clear),
+        measure("board get (cached)", lambda: client.get(url), duration),
+        measure("test board get", lambda: client.get(test_url), duration),
+    ]
+    Board.objects.all().delete()
+    board_cache.clear()
+    newsstand.clear()
+    return results
+
+
+@register("time_tag")
+def bench_time_tag(duration: float) -> list[BenchmarkResult]:
+    """
+    Finding the last-modified <time> tag in a full-size board.
+    """
+    content = generate_fake_board_content(timezone.now() - timedelta(minutes=1))
+    while len(content.encode()) < BOARD_MAX_SIZE_BYTES:
+        content += "<p>Lorem ipsum <b>dolor</b> sit amet, <a href='#'>consectetur</a>.</p>\n"
+    content = content.encode()[:BOARD_MAX_SIZE_BYTES].decode(errors="ignore")
+
+    view = BoardView()
+    return [
+        measure("time tag (parsel)", lambda: Selector(content).css("time"), duration),
+        measure("time tag (scan)", lambda: find_time_tags(content, limit=2), duration),
+        measure(
+            "parse_last_modified_meta",
+            lambda: view.parse_last_modified_meta(content),
+            duration,
+        ),
+    ]
+
+
+@register("crypto")
+def bench_crypto(duration: float) -> list[BenchmarkResult]:
+    """
+    Checking a board signature and the public key suffix.
+
+    The cold run clears the key and signature caches before every call, which
+    is the cost of a board that this server hasn't seen before.
+    """
+    private_key = generate_private_key()
+    key = dump_public_key(private_key.public_key())
+    content = generate_fake_board_content(timezone.now()).encode()
+    signature = private_key.sign(content).hex()
+
+    results = [
+        measure(
+            "verify_signature (cold)",
+            lambda: verify_signature(signature, key, content),
+            duration,
+            setup=clear_caches,
+        ),
+        measure(
+            "verify_signature (cached)",
+            lambda: verify_signature(signature, key, content),
+            duration,
+        ),
+        measure("validate_public_key", lambda: validate_public_key(key), duration),
+    ]
+    clear_caches()
+    return results
+
+
+@register("dates")
+def bench_dates(duration: float) -> list[BenchmarkResult]:
+    """
+    Formatting and parsing the HTTP date headers sent with every board.
+    """
+    now = timezone.now()
+    header = date_to_header(now)
+    return [
+        measure("date_to_header", lambda: date_to_header(now), duration),
+        measure("date_from_header", lambda: date_from_header(header), duration),
+    ]
+
+
+@contextmanager
+def temporary_database(profile: str) -> Iterator[str]:
+    """
+    Create a file-backed database with the given storage profile, yielding its alias.
+    """
+    alias = f"benchmark_{profile}"
+    with tempfile.TemporaryDirectory() as tmpdir:
+        connections.settings[alias] = {
+            **connections.settings["default"],
+            **copy.deepcopy(settings.DATABASE_PROFILES[profile]),
+            "NAME": os.path.join(tmpdir, "benchmark.sqlite3"),
+        }
+        try:
+            with connections[alias].schema_editor() as editor:
+                editor.create_model(Board)
+            yield alias
+        finally:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+
+
+def run_concurrently(
+    workers: dict[str, tuple[int, Callable[[], object]]], duration: float, using: str
+) -> list[BenchmarkResult]:
+    """
+    Run each named operation in its own pool of threads for the given number of seconds.
+
+    Connections are closed after every operation unless the database keeps
+    them alive between requests (CONN_MAX_AGE), like the request cycle does.
+    Operations that fail with a database error are counted instead of timed.
+    """
+    timings: dict[str, list[float]] = {name: [] for name in workers}
+    errors: Counter[str] = Counter()
+    deadline = time.perf_counter() + duration
+
+    def work(name: str, func: Callable[[], object]) -> None:
+        connection = connections[using]
+        try:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    func()
+                except DatabaseError:
+                    errors[name] += 1
+                else:
+                    timings[name].append(time.perf_counter() - start)
+                connection.close_if_unusable_or_obsolete()
+        finally:
+            connection.close()
+
+    threads = [
+        threading.Thread(target=work, args=(name, func))
+        for name, (count, func) in workers.items()
+        for _ in range(count)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    results = []
+    for name, values in timings.items():
+        notes = f"{errors[name]} errors" if errors[name] else ""
+        results.append(BenchmarkResult(name, values or [math.nan], elapsed, notes))
+    return results
+
+
+@register("storage")
+def bench_storage(duration: float) -> list[BenchmarkResult]:
+    """
+    Mixed GET/PUT traffic from concurrent threads against each storage profile.
+
+    Readers fetch random boards (a cache miss in BoardView.get), writers do
+    the same read-check-write transaction as BoardView.put.
+    """
+    results = []
+    for profile in settings.DATABASE_PROFILES:
+        with temporary_database(profile) as using:
+            keys = [board.key for board in create_fake_boards(2000, using=using)]
+            boards = Board.objects.using(using)
+
+            def read():
+                boards.get(key=random.choice(keys))
+
+            def write():
+                with transaction.atomic(using=using):
+                    board = boards.get(key=random.choice(keys))
+                    board.last_modified = timezone.now()
+                    board.content = generate_fake_board_content(board.last_modified).encode()
+                    board.save(using=using)
+
+            results += run_concurrently(
+                {f"{profile} get": (8, read), f"{profile} put": (4, write)},
+                duration,
+                using,
+            )
+    return results
+
+
+@register("encoding")
+def bench_encoding(duration: float) -> list[BenchmarkResult]:
+    """
+    Board and newsstand GETs with each content-coding, and the size of each response.
+
+    The "gzip per request" row compresses the board on every request instead,
+    which is what GZipMiddleware would do.
+    """
+    boards = create_fake_boards(500)
+    board = boards[0]
+    client = Client()
+    url = reverse("board", args=[board.key])
+    client.get(url)
+
+    results = []
+    for encoding in ["identity", "gzip", "br"]:
+        if encoding != "identity" and encoding not in board.variants:
+            continue
+
+        for name, page_url in [("board", url), ("index", reverse("index"))]:
+            size = len(client.get(page_url, HTTP_ACCEPT_ENCODING=encoding).getvalue())
+            result = measure(
+                f"{name} get ({encoding})",
+                lambda: client.get(page_url, HTTP_ACCEPT_ENCODING=encoding),
+                duration,
+            )
+            result.notes = f"{size} B"
+            results.append(result)
+
+    content = bytes(board.content)
+    results.append(
+        measure(
+            "board gzip per request",
+            lambda: (client.get(url), gzip.compress(content)),
+            duration,
+        )
+    )
+    Board.objects.all().delete()
+    newsstand.clear()
+    return results
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from django.utils import timezone
+
+from letsdance.core.models import Board, get_expiry_cutoff
+from letsdance.core.utils import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CachedBoard:
+    """
+    Everything needed to send a board back to a client without touching the database.
+    """
+
+    key: str
+    content: bytes
+    signature: str
+    last_modified: datetime
+    variants: dict[str, bytes] = field(default_factory=dict)
+
+    @classmethod
+    def from_board(cls, board: Board) -> CachedBoard:
+        return cls(
+            key=board.key,
+            content=bytes(board.content),
+            signature=board.signature,
+            last_modified=board.last_modified,
+            variants=board.variants,
+        )
+
+    @property
+    def etag(self) -> str:
+        # The signature already identifies this exact content for this key
+        return f'"{self.signature[:32]}"'
+
+    @property
+    def is_expired(self) -> bool:
+        return self.last_modified < get_expiry_cutoff()
+
+    @property
+    def size(self) -> int:
+        # Rough per-entry overhead for the object, the datetime and the dict slot
+        variants = sum(len(data) for data in self.variants.values())
+        return len(self.content) + variants + len(self.signature) + len(self.key) + 256
+
+
+class BoardCache:
+    """
+    Cache of ready-to-send board responses, keyed by the board's public key.
+
+    Entries are held in a process-local LRU unless a django cache alias is
+    configured, in which case they are stored there so that multiple workers
+    can share (and invalidate) the same entries. A worker can't invalidate
+    another worker's local entries, so deployments with more than one worker
+    need the alias.
+
+    Entries expire after BOARD_CACHE_TTL_SECONDS either way. A GET that read
+    the old board just before a PUT replaced it can put it back in the cache
+    after the PUT cleared it, this bounds how long that is served for.
+    """
+
+    key_prefix = "board:"
+
+    def __init__(self, max_bytes: int, alias: str | None = None):
+        self.alias = alias
+        # Local entries are (expiry time, board) pairs
+        self.local = LRUCache(max_bytes, sizeof=lambda entry: entry[1].size)
+        self._test_board: CachedBoard | None = None
+        self._test_board_lock = threading.Lock()
+
+    @property
+    def shared(self) -> BaseCache | None:
+        return caches[self.alias] if self.alias else None
+
+    @property
+    def timeout(self) -> int:
+        return settings.BOARD_CACHE_TTL_SECONDS
+
+    def get_local(self, key: str) -> CachedBoard | None:
+        entry = self.local.get(key)
+        if entry is None:
+            return None
+        expires, board = entry
+        if expires <= time.monotonic():
+            self.local.delete(key)
+            return None
+        return board
+
+    def set_local(self, board: CachedBoard) -> None:
+        self.local.set(board.key, (time.monotonic() + self.timeout, board))
+
+    def get(self, key: str) -> CachedBoard | None:
+        if self.shared is not None:
+            return self.shared.get(self.key_prefix + key)
+        return self.get_local(key)
+
+    def set(self, board: Board) -> CachedBoard:
+        cached_board = CachedBoard.from_board(board)
+        if self.shared is not None:
+            self.shared.set(self.key_prefix + board.key, cached_board, self.timeout)
+        else:
+            self.set_local(cached_board)
+        return cached_board
+
+    async def aget(self, key: str) -> CachedBoard | None:
+        if self.shared is not None:
+            return await self.shared.aget(self.key_prefix + key)
+        return self.get_local(key)
+
+    async def aset(self, board: Board) -> CachedBoard:
+        cached_board = CachedBoard.from_board(board)
+        if self.shared is not None:
+            await self.shared.aset(self.key_prefix + board.key, cached_board, self.timeout)
+        else:
+            self.set_local(cached_board)
+        return cached_board
+
+    async def adelete(self, key: str) -> None:
+        if self.shared is not None:
+            await self.shared.adelete(self.key_prefix + key)
+        else:
+            self.local.delete(key)
+
+    def delete(self, key: str) -> None:
+        self.delete_many([key])
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        if self.shared is not None:
+            self.shared.delete_many([self.key_prefix + key for key in keys])
+        else:
+            for key in keys:
+                self.local.delete(key)
+
+    def clear(self) -> None:
+        """
+        Clear the process-local entries, a shared django cache is left untouched.
+        """
+        self.local.clear()
+        self._test_board = None
+
+    def get_test_board(self) -> CachedBoard | None:
+        """
+        Return the generated board for the test key, or None if it's due for a refresh.
+        """
+        board = self._test_board
+        if board is None:
+            return None
+        age = (timezone.now() - board.last_modified).total_seconds()
+        if age >= settings.TEST_BOARD_REFRESH_SECONDS:
+            return None
+        return board
+
+    def refresh_test_board(self) -> CachedBoard:
+        """
+        Generate a new board for the test key, unless another thread just did.
+        """
+        with self._test_board_lock:
+            board = self.get_test_board()
+            if board is None:
+                board = CachedBoard.from_board(Board.generate_board())
+                self._test_board = board
+        return board
+
+    def warm(self, count: int) -> int:
+        """
+        Preload the most recently modified boards, returning the number cached.
+        """
+        boards = Board.objects.order_by("-last_modified")[:count]
+        loaded = 0
+        for board in boards.iterator():
+            self.set(board)
+            loaded += 1
+        logger.info(f"Warmed board cache with {loaded} board(s).")
+        return loaded
+
+
+board_cache = BoardCache(settings.BOARD_CACHE_MAX_BYTES, settings.BOARD_CACHE_ALIAS)
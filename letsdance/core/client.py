@@ -1,11 +1,17 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import threading
 import typing
+from collections.abc import Iterable
+from datetime import datetime
 from urllib.parse import urljoin
 
+import httpx
 import requests
 from django.conf import settings
+from requests.adapters import HTTPAdapter
 
 from letsdance.core.utils import date_to_header
 
@@ -14,26 +20,173 @@ if typing.TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
 
-def put_board(board: Board, peer_url: str) -> requests.Response:
-    url = urljoin(peer_url, f"/{board.key}")
-    headers = {
+
+def get_session() -> requests.Session:
+    """
+    Return the shared HTTP session used to talk to peers.
+
+    The session keeps a bounded pool of keep-alive connections for each peer
+    host, so repeated publishes to the same server reuse the TCP/TLS connection.
+    """
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                adapter = HTTPAdapter(
+                    pool_connections=settings.PEER_POOL_CONNECTIONS,
+                    pool_maxsize=settings.PEER_POOL_MAXSIZE,
+                )
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def close_session() -> None:
+    """
+    Close the shared session and all of its pooled connections.
+    """
+    global _session
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get_timeout() -> tuple[float, float]:
+    return settings.PEER_CONNECT_TIMEOUT, settings.PEER_READ_TIMEOUT
+
+
+def build_put_headers(board: Board) -> dict[str, str]:
+    return {
         "User-Agent": settings.USER_AGENT,
         "Content-Type": "text/html;charset=utf-8",
         "Spring-Version": "83",
         "Spring-Signature": f"{board.signature}",
         "If-Unmodified-Since": date_to_header(board.last_modified),
     }
-    data = board.content.encode("utf-8")
-    response = requests.put(url, data=data, headers=headers, timeout=5)
-    return response
 
 
-def get_board(key: str, peer_url: str) -> requests.Response:
-    url = urljoin(peer_url, f"/{key}")
+def build_get_headers(if_modified_since: datetime | None = None) -> dict[str, str]:
     headers = {
         "User-Agent": settings.USER_AGENT,
         "Spring-Version": "83",
     }
-    response = requests.put(url, headers=headers, timeout=5)
+    if if_modified_since is not None:
+        headers["If-Modified-Since"] = date_to_header(if_modified_since)
+    return headers
+
+
+def put_board(board: Board, peer_url: str) -> requests.Response:
+    url = urljoin(peer_url, f"/{board.key}")
+    headers = build_put_headers(board)
+    data = bytes(board.content)
+    response = get_session().put(url, data=data, headers=headers, timeout=get_timeout())
     return response
+
+
+def get_board(
+    key: str, peer_url: str, if_modified_since: datetime | None = None
+) -> requests.Response:
+    url = urljoin(peer_url, f"/{key}")
+    headers = build_get_headers(if_modified_since)
+    response = get_session().get(url, headers=headers, timeout=get_timeout())
+    return response
+
+
+class AsyncClient:
+    """
+    Async HTTP client for fanning a board out to many peers at once.
+
+    Use it as an async context manager, the underlying connection pool is
+    closed on exit. The number of requests in flight at any moment is capped
+    at max_concurrency.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.max_concurrency = max_concurrency or settings.PEER_MAX_CONCURRENCY
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        connect_timeout, read_timeout = get_timeout()
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            ),
+            transport=transport,
+        )
+
+    async def __aenter__(self) -> AsyncClient:
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def put_board(self, board: Board, peer_url: str) -> httpx.Response:
+        url = urljoin(peer_url, f"/{board.key}")
+        headers = build_put_headers(board)
+        data = bytes(board.content)
+        async with self.semaphore:
+            return await self.client.put(url, content=data, headers=headers)
+
+    async def get_board(
+        self, key: str, peer_url: str, if_modified_since: datetime | None = None
+    ) -> httpx.Response:
+        url = urljoin(peer_url, f"/{key}")
+        headers = build_get_headers(if_modified_since)
+        async with self.semaphore:
+            return await self.client.get(url, headers=headers)
+
+    async def get_digest(self, peer_url: str, prefix: str = "") -> httpx.Response:
+        url = urljoin(peer_url, "/digest")
+        headers = build_get_headers()
+        async with self.semaphore:
+            return await self.client.get(url, params={"prefix": prefix}, headers=headers)
+
+    async def put_board_many(
+        self, board: Board, peer_urls: Iterable[str]
+    ) -> dict[str, httpx.Response | httpx.HTTPError]:
+        """
+        Publish a board to every peer concurrently.
+
+        Returns the response for each peer URL, or the error raised if the
+        request couldn't be completed.
+        """
+        peer_urls = list(peer_urls)
+        results = await asyncio.gather(
+            *(self.put_board(board, url) for url in peer_urls),
+            return_exceptions=True,
+        )
+        responses: dict[str, httpx.Response | httpx.HTTPError] = {}
+        for url, result in zip(peer_urls, results):
+            if isinstance(result, BaseException) and not isinstance(result, httpx.HTTPError):
+                raise result
+            responses[url] = result
+        return responses
+
+
+def put_board_many(
+    board: Board, peer_urls: Iterable[str], max_concurrency: int | None = None
+) -> dict[str, httpx.Response | httpx.HTTPError]:
+    """
+    Publish a board to many peers concurrently from synchronous code.
+    """
+
+    async def run():
+        async with AsyncClient(max_concurrency) as client:
+            return await client.put_board_many(board, peer_urls)
+
+    return asyncio.run(run())
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import gzip
+from collections.abc import Iterable
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# Preferred content-codings, best compression first
+ENCODINGS = ("br", "gzip")
+
+
+def compress(content: bytes, fast: bool = False) -> dict[str, bytes]:
+    """
+    Return the compressed variants of the content, keyed by content-coding.
+
+    Brotli is only used if the optional brotli package is installed. Variants
+    that don't come out smaller than the original are left out. Use fast for
+    large documents that are compressed often, like the newsstand page.
+    """
+    variants = {}
+    # mtime=0 keeps the output, and with it the ETag, stable for the same input
+    variants["gzip"] = gzip.compress(content, compresslevel=6 if fast else 9, mtime=0)
+    if brotli is not None:
+        variants["br"] = brotli.compress(content, mode=brotli.MODE_TEXT, quality=5 if fast else 11)
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(content)}
+
+
+def parse_accept_encoding(header: str) -> dict[str, float]:
+    """
+    Parse an Accept-Encoding header into a mapping of content-coding to q-value.
+    """
+    codings = {}
+    for item in header.split(","):
+        coding, *params = item.strip().split(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        codings[coding] = quality
+    return codings
+
+
+def choose_encoding(accept_encoding: str, available: Iterable[str]) -> str | None:
+    """
+    Pick the content-coding to send, or None to send the content as it is.
+    """
+    codings = parse_accept_encoding(accept_encoding)
+    wildcard = codings.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for encoding in ENCODINGS:
+        if encoding not in available:
+            continue
+        quality = codings.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
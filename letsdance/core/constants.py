@@ -2,7 +2,24 @@ BOARD_MAX_SIZE_BYTES = 2217
 BOARD_MAX_COUNT = 10_000_000
 BOARD_TTL_DAYS = 28
 
+# Hex characters of the key added at each level of the peer digest tree
+DIGEST_BUCKET_CHARS = 2
+# Buckets with this many boards or fewer list their boards instead
+DIGEST_LEAF_SIZE = 256
+
+PUBLISH_DELAY_SECONDS = 300
+PUBLISH_BACKOFF_SECONDS = 300
 PUBLISH_BACKOFF_MAX_DAYS = 7
+PUBLISH_CLAIM_SECONDS = 300
+
+PEER_HEALTH_ALPHA = 0.2
+PEER_LATENCY_REFERENCE_SECONDS = 0.5
+PEER_MIN_WEIGHT = 0.01
+PEER_BREAKER_THRESHOLD = 5
+PEER_BREAKER_COOLDOWN_SECONDS = 300
+PEER_BREAKER_MAX_COOLDOWN_SECONDS = 24 * 60 * 60
+# Most peers weighed for each sample, picked at random by the database first
+PEER_SAMPLE_CANDIDATES = 64
 
 TEST_KEY_PUBLIC = "fad415fbaa0339c4fd372d8287e50f67905321ccfd9c43fa4c20ac40afed1983"
 TEST_KEY_SECRET = "a7e4d1c8be858d683ab9cb15574bd0bc3a87e6c846cdaf848da498909cb574f7"
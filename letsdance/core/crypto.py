@@ -1,6 +1,13 @@
 from __future__ import annotations
 
+import functools
+import hashlib
+import itertools
+import os
 import re
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
 
 from cryptography.exceptions import InvalidSignature
 from cryptography.hazmat.primitives import serialization
@@ -10,11 +17,22 @@ from cryptography.hazmat.primitives.asymmetric.ed25519 import (
 )
 from django.utils import timezone
 
+from letsdance.core.utils import LRUCache
+
+# Parsed public keys, keyed by their hex representation
+PUBLIC_KEY_CACHE_SIZE = 4096
+
+# (key, signature, content digest) triples that have already passed verification
+VERIFIED_SIGNATURE_CACHE_SIZE = 65536
+
+verified_signatures = LRUCache(VERIFIED_SIGNATURE_CACHE_SIZE)
+
 
 def load_private_key(key: str) -> Ed25519PrivateKey:
     return Ed25519PrivateKey.from_private_bytes(bytes.fromhex(key))
 
 
+@functools.lru_cache(maxsize=PUBLIC_KEY_CACHE_SIZE)
 def load_public_key(key: str) -> Ed25519PublicKey:
     return Ed25519PublicKey.from_public_bytes(bytes.fromhex(key))
 
@@ -39,13 +57,87 @@ def dump_public_key(key: Ed25519PublicKey) -> str:
 
 
 def verify_signature(signature: str, key: str, data: bytes) -> bool:
-    public_key = load_public_key(key)
+    """
+    Check the signature of the data, skipping the curve math for content that
+    has already been verified (e.g. the same board pushed by several peers).
+    """
+    entry = (key, signature, hashlib.sha256(data).digest())
+    if verified_signatures.get(entry):
+        return True
+
     try:
-        public_key.verify(bytes.fromhex(signature), data)
-    except InvalidSignature:
+        load_public_key(key).verify(bytes.fromhex(signature), data)
+    except (InvalidSignature, ValueError):
+        # ValueError is a malformed key or signature, e.g. one that isn't hex
         return False
+
+    verified_signatures.set(entry, True)
+    return True
+
+
+def _verify_chunk(chunk: list[tuple[str, str, bytes]]) -> list[bool]:
+    return [verify_signature(signature, key, data) for signature, key, data in chunk]
+
+
+def verify_signatures(
+    items: Iterable[tuple[str, str, bytes]],
+    workers: int | None = None,
+    chunk_size: int = 256,
+    use_threads: bool = False,
+) -> Iterator[bool]:
+    """
+    Verify many (signature, key, data) triples in parallel.
+
+    The items are consumed lazily and split into chunks that are verified
+    across a pool of worker processes (or threads). Results are yielded in the
+    same order as the input, and only a few chunks per worker are held in
+    memory at a time so this can stream over an entire table.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for signature, key, data in items:
+            yield verify_signature(signature, key, data)
+        return
+
+    executor: Executor
+    if use_threads:
+        executor = ThreadPoolExecutor(max_workers=workers)
     else:
-        return True
+        executor = ProcessPoolExecutor(max_workers=workers)
+
+    iterator = iter(items)
+    pending: deque[Future[list[bool]]] = deque()
+    with executor:
+        while chunk := list(itertools.islice(iterator, chunk_size)):
+            pending.append(executor.submit(_verify_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def get_cache_stats() -> dict[str, dict[str, int]]:
+    """
+    Return the hit/miss counters for the public key and signature caches.
+    """
+    public_keys = load_public_key.cache_info()
+    return {
+        "public_keys": {
+            "hits": public_keys.hits,
+            "misses": public_keys.misses,
+            "size": public_keys.currsize,
+        },
+        "signatures": {
+            "hits": verified_signatures.hits,
+            "misses": verified_signatures.misses,
+            "size": len(verified_signatures),
+        },
+    }
+
+
+def clear_caches() -> None:
+    load_public_key.cache_clear()
+    verified_signatures.clear()
 
 
 public_key_pattern = re.compile(r"83e(0[1-9]|1[0-2])(\d\d)$")
@@ -72,3 +164,28 @@ def validate_public_key(key: str) -> bool:
     now_months = now.year * 12 + now.month
 
     return min_months <= now_months <= max_months
+
+
+def get_valid_public_key_suffixes() -> frozenset[bytes]:
+    """
+    Return the last three raw bytes of every public key that is currently valid.
+
+    A key ending in the hex pattern "83eMMYY" has "8" in the low nibble of its
+    fourth-to-last byte, followed by the bytes 0x3e, 0xMM and 0xYY. Checking the
+    raw bytes against this set avoids hex-encoding every candidate key.
+    """
+    now = timezone.now().date()
+    now_months = now.year * 12 + now.month
+
+    suffixes = set()
+    for months in range(now_months, now_months + 25):
+        year, month = divmod(months - 1, 12)
+        suffixes.add(bytes.fromhex(f"3e{month + 1:02d}{year % 100:02d}"))
+    return frozenset(suffixes)
+
+
+def is_valid_public_key_bytes(key: bytes, suffixes: frozenset[bytes]) -> bool:
+    """
+    Fast equivalent of validate_public_key() for raw key bytes.
+    """
+    return key[-4] & 0x0F == 0x08 and key[-3:] in suffixes
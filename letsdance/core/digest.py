@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import logging
+import re
+import socket
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+from letsdance.core.constants import DIGEST_BUCKET_CHARS, DIGEST_LEAF_SIZE
+from letsdance.core.models import Board, DigestBucket, Peer, hash_board
+
+logger = logging.getLogger(__name__)
+
+PREFIX_RE = re.compile(f"([0-9a-f]{{{DIGEST_BUCKET_CHARS}}}){{0,{64 // DIGEST_BUCKET_CHARS - 1}}}")
+
+
+def format_hash(value: int) -> str:
+    return f"{value & 0xFFFFFFFFFFFFFFFF:016x}"
+
+
+def get_digest(prefix: str = "") -> dict:
+    """
+    Summarize the stored boards whose key starts with the prefix, for a peer to compare.
+
+    The boards are split into buckets by the next few characters of their
+    key, each with the XOR of its board hashes, so two servers only need to
+    look deeper into the buckets that differ. Once a prefix holds few enough
+    boards the digest lists them as well, with their last-modified timestamps.
+
+    The top level is read from the maintained DigestBucket table, deeper
+    levels are computed from a range scan of the key index.
+    """
+    if not PREFIX_RE.fullmatch(prefix):
+        raise ValueError(f"Invalid digest prefix: {prefix!r}")
+
+    digest: dict = {"prefix": prefix}
+    if not prefix:
+        buckets = dict(DigestBucket.objects.exclude(value=0).values_list("prefix", "value"))
+        count = Board.objects.stored_count()
+        digest["count"] = count
+        digest["buckets"] = {key: format_hash(value) for key, value in sorted(buckets.items())}
+        if count <= DIGEST_LEAF_SIZE:
+            boards = Board.objects.values_list("key", "last_modified")
+            digest["boards"] = {key: int(lm.timestamp()) for key, lm in boards.order_by("key")}
+        return digest
+
+    end = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    boards = Board.objects.filter(key__gte=prefix, key__lt=end)
+    versions = list(boards.order_by("key").values_list("key", "last_modified"))
+    hashes: defaultdict[str, int] = defaultdict(int)
+    for key, last_modified in versions:
+        hashes[key[: len(prefix) + DIGEST_BUCKET_CHARS]] ^= hash_board(key, last_modified)
+
+    digest["count"] = len(versions)
+    digest["buckets"] = {key: format_hash(value) for key, value in hashes.items() if value}
+    if len(versions) <= DIGEST_LEAF_SIZE:
+        digest["boards"] = {key: int(last_modified.timestamp()) for key, last_modified in versions}
+    return digest
+
+
+class PeerAddresses:
+    """
+    The IP addresses of the peers in the realm, resolved from their URLs.
+
+    Lookups are cached for DIGEST_PEER_CACHE_SECONDS, so the digest endpoint
+    doesn't resolve every peer's hostname on each request.
+    """
+
+    def __init__(self):
+        self._addresses: frozenset[str] = frozenset()
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> frozenset[str]:
+        if time.monotonic() < self._expires:
+            return self._addresses
+        with self._lock:
+            if time.monotonic() >= self._expires:
+                self._addresses = self.resolve()
+                self._expires = time.monotonic() + settings.DIGEST_PEER_CACHE_SECONDS
+        return self._addresses
+
+    def resolve(self) -> frozenset[str]:
+        addresses = set()
+        for url in Peer.objects.values_list("url", flat=True):
+            host = urlsplit(url).hostname
+            if not host:
+                continue
+            try:
+                infos = socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)
+            except OSError as e:
+                logger.info(f"Unable to resolve peer {url}: {e}")
+                continue
+            addresses.update(str(info[4][0]) for info in infos)
+        return frozenset(addresses)
+
+    def clear(self) -> None:
+        self._expires = 0.0
+
+    def __contains__(self, address: str) -> bool:
+        return address in self.get()
+
+
+peer_addresses = PeerAddresses()
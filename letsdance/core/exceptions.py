@@ -1,9 +1,11 @@
 class Spring83Exception(Exception):
     status: int
+    headers: dict[str, str]
 
-    def __init__(self, *args, status: int | None = None):
+    def __init__(self, *args, status: int | None = None, headers: dict[str, str] | None = None):
         super().__init__(*args)
         if status is None:
             raise ValueError("Status code must be set for custom exception")
 
         self.status = status
+        self.headers = headers or {}
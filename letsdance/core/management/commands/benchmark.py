@@ -0,0 +1,112 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from letsdance.core.benchmarks import (
+    benchmarks,
+    compare_results,
+    load_results,
+    save_results,
+)
+
+
+class Command(BaseCommand):
+    help = "Measure the throughput of the server's hot paths against a temporary database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "names",
+            nargs="*",
+            help=f"Benchmarks to run ({', '.join(benchmarks)}), defaults to all of them.",
+        )
+        parser.add_argument(
+            "--duration",
+            default=2.0,
+            type=float,
+            help="Approximate number of seconds to spend on each measurement.",
+        )
+        parser.add_argument(
+            "--output",
+            help="Save the results to this JSON file.",
+        )
+        parser.add_argument(
+            "--compare",
+            help="Compare against the results in this JSON file and fail on regressions.",
+        )
+        parser.add_argument(
+            "--threshold",
+            default=0.2,
+            type=float,
+            help="Fraction of ops/s that can be lost before a result counts as a regression.",
+        )
+
+    def handle(self, *args, **options):
+        names = options["names"] or list(benchmarks)
+        for name in names:
+            if name not in benchmarks:
+                raise CommandError(f"Unknown benchmark: {name}")
+
+        baseline = None
+        if options["compare"]:
+            try:
+                baseline = load_results(options["compare"])
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Unable to load baseline: {e}")
+
+        # Keep the per-request log lines out of the results table
+        logging.disable(logging.WARNING)
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            results = []
+            self.stdout.write(
+                f"{'benchmark':<32} {'ops/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}"
+                f"{' change' if baseline is not None else ''}"
+            )
+            for name in names:
+                for result in benchmarks[name](options["duration"]):
+                    results.append(result)
+                    line = (
+                        f"{result.name:<32} "
+                        f"{result.ops_per_second:>10.1f} "
+                        f"{result.percentile(50) * 1000:>10.3f} "
+                        f"{result.percentile(95) * 1000:>10.3f} "
+                        f"{result.percentile(99) * 1000:>10.3f}"
+                    )
+                    if baseline is not None:
+                        comparison = compare_results(baseline, [result]).get(result.name)
+                        line += f" {comparison.change:>+6.0%}" if comparison else f" {'-':>6}"
+                    if result.notes:
+                        line += f"  {result.notes}"
+                    self.stdout.write(line)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            logging.disable(logging.NOTSET)
+
+        if options["output"]:
+            save_results(options["output"], results, options["duration"])
+            self.stdout.write(f"Saved results to {options['output']}")
+
+        if baseline is not None:
+            regressions = [
+                comparison
+                for comparison in compare_results(baseline, results).values()
+                if comparison.is_regression(options["threshold"])
+            ]
+            if regressions:
+                lines = [
+                    f"  {c.name}: {c.baseline:.1f} -> {c.current:.1f} ops/s ({c.change:+.0%})"
+                    for c in regressions
+                ]
+                raise CommandError(
+                    f"{len(regressions)} benchmark(s) regressed by more than "
+                    f"{options['threshold']:.0%}:\n" + "\n".join(lines)
+                )
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
@@ -1,36 +1,122 @@
+import multiprocessing
+import os
+import queue
 import time
 
-from django.core.management.base import BaseCommand
+from cryptography.hazmat.primitives import serialization
+from django.core.management.base import BaseCommand, CommandError
 
 from letsdance.core.crypto import (
     dump_private_key,
     dump_public_key,
     generate_private_key,
+    get_valid_public_key_suffixes,
+    is_valid_public_key_bytes,
+    load_private_key,
     validate_public_key,
 )
 
+# Number of keys each worker generates between checking in with the parent
+BATCH_SIZE = 2000
+
+
+def grind(suffixes, found, stop, attempts) -> None:
+    """
+    Generate keys until one of them has a valid suffix or another worker finds one.
+    """
+    while not stop.is_set():
+        for _ in range(BATCH_SIZE):
+            private_key = generate_private_key()
+            public_key = private_key.public_key().public_bytes(
+                encoding=serialization.Encoding.Raw,
+                format=serialization.PublicFormat.Raw,
+            )
+            if is_valid_public_key_bytes(public_key, suffixes):
+                found.put(dump_private_key(private_key))
+                stop.set()
+                return
+        with attempts.get_lock():
+            attempts.value += BATCH_SIZE
+
 
 class Command(BaseCommand):
     help = "Generate a new, valid Spring '83 keypair."
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of processes to search with, defaults to the number of CPUs.",
+        )
+        parser.add_argument(
+            "--report-interval",
+            type=float,
+            default=5.0,
+            help="Seconds between progress reports.",
+        )
+
     def handle(self, *args, **options):
-        self.stderr.write("Generating a valid ed25519 key, this may take a while...")
+        suffixes = get_valid_public_key_suffixes()
+
+        # One hex nibble plus three bytes need to match one of the suffixes
+        expected_tries = 16 * 2**24 // len(suffixes)
+
+        workers = options["workers"]
+        if workers < 1:
+            raise CommandError("--workers must be at least 1.")
+        self.stderr.write(
+            f"Generating a valid ed25519 key with {workers} worker(s), "
+            f"expecting ~{expected_tries:,} tries..."
+        )
+
+        found: multiprocessing.Queue = multiprocessing.Queue()
+        stop = multiprocessing.Event()
+        attempts = multiprocessing.Value("Q", 0)
+        processes = [
+            multiprocessing.Process(target=grind, args=(suffixes, found, stop, attempts))
+            for _ in range(workers)
+        ]
 
         start = time.time()
-        i = 0
-        while True:
-            if not i % 5000:
-                self.stderr.write(f"Iteration {i}...")
-            private_key = generate_private_key()
-            public_key = private_key.public_key()
-            public_key_hex = dump_public_key(public_key)
-            if validate_public_key(public_key_hex):
-                break
-            i += 1
+        for process in processes:
+            process.start()
 
-        private_key_hex = dump_private_key(private_key)
-        delta = int(time.time() - start)
+        try:
+            while True:
+                try:
+                    private_key_hex = found.get(timeout=options["report_interval"])
+                except queue.Empty:
+                    if not any(process.is_alive() for process in processes):
+                        # A worker that found a key exits right after queueing it
+                        try:
+                            private_key_hex = found.get(timeout=1)
+                        except queue.Empty:
+                            raise CommandError("Every worker exited without finding a key.")
+                        break
 
+                    elapsed = time.time() - start
+                    rate = attempts.value / elapsed
+                    eta = f"{expected_tries / rate:.0f}s" if rate else "unknown"
+                    self.stderr.write(
+                        f"Tried {attempts.value:,} keys ({rate:,.0f} keys/s), "
+                        f"expected time to find a key: {eta}"
+                    )
+                else:
+                    break
+        finally:
+            stop.set()
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+
+        private_key = load_private_key(private_key_hex)
+        public_key_hex = dump_public_key(private_key.public_key())
+        if not validate_public_key(public_key_hex):
+            raise CommandError(f"Generated an invalid public key: {public_key_hex}")
+
+        delta = int(time.time() - start)
         self.stdout.write(f"Generated keypair in {delta}s:")
         self.stdout.write(f"Public : {public_key_hex}")
         self.stdout.write(f"Secret : {private_key_hex}")
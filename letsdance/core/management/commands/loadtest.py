@@ -0,0 +1,136 @@
+import asyncio
+import random
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from letsdance.core.benchmarks import BenchmarkResult
+from letsdance.core.constants import TEST_KEY_PUBLIC
+
+
+class Command(BaseCommand):
+    help = "Hold many concurrent keep-alive connections open against a running server."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--server-url",
+            required=True,
+            help="URL of the server to test, e.g. http://127.0.0.1:8000",
+        )
+        parser.add_argument(
+            "--path",
+            default=f"/{TEST_KEY_PUBLIC}",
+            help="Path to request on each connection, defaults to the test board.",
+        )
+        parser.add_argument(
+            "--connections",
+            type=int,
+            default=1000,
+            help="Number of concurrent connections to open.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds each connection sits idle between requests.",
+        )
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=30.0,
+            help="Seconds to run the test for.",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=10.0,
+            help="Seconds to wait for a connection or a response before giving up.",
+        )
+
+    def handle(self, *args, **options):
+        url = urlsplit(options["server_url"])
+        if url.scheme != "http" or not url.hostname:
+            raise CommandError("Only plain http:// server URLs are supported.")
+
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.request = (
+            f"GET {options['path']} HTTP/1.1\r\n"
+            f"Host: {url.netloc}\r\n"
+            f"User-Agent: {settings.USER_AGENT}\r\n"
+            f"Spring-Version: 83\r\n"
+            f"Connection: keep-alive\r\n"
+            f"\r\n"
+        ).encode()
+
+        self.stdout.write(
+            f"Opening {options['connections']} connection(s) to {url.netloc} "
+            f"for {options['duration']}s..."
+        )
+        timings, errors, peak = asyncio.run(self.run(options))
+
+        if not timings:
+            raise CommandError(f"No successful requests ({errors} error(s)).")
+
+        result = BenchmarkResult("loadtest", timings)
+        self.stdout.write(f"Peak open connections : {peak}")
+        self.stdout.write(f"Requests              : {len(timings)}")
+        self.stdout.write(f"Errors                : {errors}")
+        self.stdout.write(f"Requests/s            : {len(timings) / options['duration']:.1f}")
+        for percent in [50, 95, 99]:
+            self.stdout.write(
+                f"p{percent} latency           : {result.percentile(percent) * 1000:.1f}ms"
+            )
+
+    async def run(self, options) -> tuple[list[float], int, int]:
+        timings: list[float] = []
+        errors = 0
+        open_connections = 0
+        peak = 0
+        deadline = time.monotonic() + options["duration"]
+        timeout = options["timeout"]
+
+        async def worker() -> None:
+            nonlocal errors, open_connections, peak
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), timeout
+                )
+            except (OSError, asyncio.TimeoutError):
+                errors += 1
+                return
+
+            open_connections += 1
+            peak = max(peak, open_connections)
+            try:
+                # Spread the requests out instead of having every connection fire at once
+                await asyncio.sleep(random.uniform(0, options["interval"]))
+                while time.monotonic() < deadline:
+                    start = time.perf_counter()
+                    writer.write(self.request)
+                    await asyncio.wait_for(self.read_response(reader), timeout)
+                    timings.append(time.perf_counter() - start)
+                    await asyncio.sleep(options["interval"])
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                errors += 1
+            finally:
+                open_connections -= 1
+                writer.close()
+
+        await asyncio.gather(*(worker() for _ in range(options["connections"])))
+        return timings, errors, peak
+
+    async def read_response(self, reader: asyncio.StreamReader) -> None:
+        headers = await reader.readuntil(b"\r\n\r\n")
+        status_line, *header_lines = headers.decode("latin-1").split("\r\n")
+        if not status_line.startswith("HTTP/1.1 2"):
+            raise ValueError(f"Unexpected response: {status_line}")
+
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            if name.lower() == "content-length":
+                await reader.readexactly(int(value))
+                return
+        raise ValueError("Response is missing a Content-Length header")
@@ -0,0 +1,65 @@
+import io
+import pstats
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from letsdance.core.profiling import list_dumps
+
+
+class Command(BaseCommand):
+    help = "Summarize the top functions across the request profiles saved by the profiler."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dir",
+            default=None,
+            help="Directory of saved profiles, defaults to PROFILE_DIR.",
+        )
+        parser.add_argument(
+            "--view",
+            default=None,
+            help="Only include requests to this view, e.g. board or index.",
+        )
+        parser.add_argument(
+            "--method",
+            default=None,
+            help="Only include requests with this HTTP method, e.g. PUT.",
+        )
+        parser.add_argument(
+            "--sort",
+            default="cumulative",
+            choices=["cumulative", "tottime", "ncalls"],
+            help="Order functions by total time including calls, own time or number of calls.",
+        )
+        parser.add_argument("--limit", default=25, type=int, help="Number of functions to show.")
+
+    def handle(self, *args, **options):
+        dumps = list_dumps(options["dir"] or settings.PROFILE_DIR)
+        if options["view"]:
+            dumps = [dump for dump in dumps if dump.view == options["view"]]
+        if options["method"]:
+            dumps = [dump for dump in dumps if dump.method == options["method"].upper()]
+        if not dumps:
+            raise CommandError("No saved profiles found.")
+
+        durations = sorted(dump.duration for dump in dumps)
+        median = durations[len(durations) // 2]
+        self.stdout.write(
+            f"{len(dumps)} profile(s), median {median * 1000:.1f}ms, "
+            f"slowest {durations[-1] * 1000:.1f}ms."
+        )
+        self.stdout.write("Slowest requests:")
+        for dump in sorted(dumps, key=lambda dump: dump.duration, reverse=True)[:5]:
+            key = f" {dump.key}" if dump.key else ""
+            self.stdout.write(
+                f"  {dump.duration * 1000:8.1f}ms  {dump.time:%Y-%m-%d %H:%M:%S}  "
+                f"{dump.method} {dump.view}{key}"
+            )
+        self.stdout.write("")
+
+        # pstats prints line by line, which the command's output wrapper would double space
+        output = io.StringIO()
+        stats = pstats.Stats(*(str(dump.path) for dump in dumps), stream=output)
+        stats.strip_dirs().sort_stats(options["sort"]).print_stats(options["limit"])
+        self.stdout.write(output.getvalue())
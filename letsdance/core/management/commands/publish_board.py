@@ -2,9 +2,8 @@ import argparse
 
 from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
-from requests.exceptions import ConnectionError
 
-from letsdance.core.client import put_board
+from letsdance.core.client import put_board_many
 from letsdance.core.constants import BOARD_MAX_SIZE_BYTES
 from letsdance.core.crypto import load_private_key
 from letsdance.core.models import Board
@@ -27,7 +26,8 @@ class Command(BaseCommand):
         parser.add_argument(
             "--server-url",
             required=True,
-            help="URL of the server to upload to.",
+            action="append",
+            help="URL of the server to upload to, may be given multiple times.",
         )
         parser.add_argument(
             "--content-file",
@@ -39,7 +39,7 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         last_modified = timezone.now()
         key = options["public_key"]
-        url = options["server_url"]
+        urls = options["server_url"]
 
         content = options["content_file"].read()
         content = f'<time datetime="{last_modified:%Y-%m-%dT%H:%M:%SZ}">\n' + content
@@ -54,15 +54,15 @@ class Command(BaseCommand):
 
         board = Board(
             key=key,
-            content=content,
+            content=encoded_content,
             signature=signature,
             last_modified=last_modified,
         )
-        self.stdout.write(f"Uploading board to {url}")
+        self.stdout.write(f"Uploading board to {', '.join(urls)}")
         self.stdout.write(content)
-        try:
-            response = put_board(board, url)
-        except ConnectionError as e:
-            self.stdout.write(str(e))
-        else:
-            self.stdout.write(f"Server response: {response.status_code} {response.content}")
+        responses = put_board_many(board, urls)
+        for url, response in responses.items():
+            if isinstance(response, Exception):
+                self.stdout.write(f"{url}: {response!r}")
+            else:
+                self.stdout.write(f"{url}: {response.status_code} {response.content!r}")
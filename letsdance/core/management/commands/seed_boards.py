@@ -1,27 +1,123 @@
-from django.core.management.base import BaseCommand
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from django.utils import timezone
+from faker import Faker
 
+from letsdance.core.compression import compress
 from letsdance.core.crypto import dump_public_key, generate_private_key
 from letsdance.core.models import Board
 from letsdance.core.utils import generate_fake_board_content
 
 
+def init_worker() -> None:
+    """
+    Set up a worker process, with its own random state.
+
+    Forked workers would otherwise all inherit the parent's random and Faker
+    state, and generate the same board content and timestamps.
+    """
+    django.setup()
+    random.seed()
+    Faker.seed(random.getrandbits(64))
+
+
+def generate_boards(count: int, start: datetime, end: datetime) -> list[Board]:
+    """
+    Generate signed boards with a last-modified time picked at random between start and end.
+    """
+    span = (end - start).total_seconds()
+    boards = []
+    for _ in range(count):
+        # The <time> tag only has second resolution
+        last_modified = start + timedelta(seconds=int(random.uniform(0, span)))
+        content = generate_fake_board_content(last_modified).encode()
+        private_key = generate_private_key()
+        board = Board(
+            key=dump_public_key(private_key.public_key()),
+            signature=private_key.sign(content).hex(),
+            last_modified=last_modified,
+        )
+        # Maximum compression is most of the cost of a board and buys little for fake data
+        board.set_content(content, compress(content, fast=True))
+        boards.append(board)
+    return boards
+
+
 class Command(BaseCommand):
     help = "Create fake boards for development/testing"
 
     def add_arguments(self, parser):
         parser.add_argument("--count", default=1, type=int)
+        parser.add_argument(
+            "--days",
+            default=0.0,
+            type=float,
+            help="Spread the last-modified times over this many days, defaults to now.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            default=1000,
+            type=int,
+            help="Number of boards generated by a worker and inserted per transaction.",
+        )
+        parser.add_argument(
+            "--workers",
+            default=None,
+            type=int,
+            help="Number of worker processes, defaults to the number of CPUs.",
+        )
 
     def handle(self, *args, **options):
-        for _ in range(options["count"]):
-            last_modified = timezone.now()
-            content = generate_fake_board_content(last_modified)
-            private_key = generate_private_key()
-            signature = private_key.sign(content.encode()).hex()
-            board = Board.objects.create(
-                key=dump_public_key(private_key.public_key()),
-                content=content,
-                signature=signature,
-                last_modified=last_modified,
-            )
-            self.stdout.write(f"Generated board: {board}")
+        count = options["count"]
+        batch_size = options["batch_size"]
+        workers = options["workers"] or os.cpu_count() or 1
+        if batch_size < 1 or workers < 1:
+            raise CommandError("--batch-size and --workers must be at least 1.")
+
+        end = timezone.now().replace(microsecond=0)
+        start = end - timedelta(days=options["days"])
+        batches = [min(batch_size, count - i) for i in range(0, count, batch_size)]
+
+        started = time.time()
+        created = 0
+        for boards in self.iter_batches(batches, workers, start, end):
+            with transaction.atomic():
+                Board.objects.bulk_create(boards)
+                Board.objects.track(added=[(board.key, board.last_modified) for board in boards])
+            created += len(boards)
+
+            if options["verbosity"] > 1:
+                for board in boards:
+                    self.stdout.write(f"Generated board: {board}")
+            elif len(batches) > 1:
+                self.stdout.write(f"Generated {created}/{count} board(s).")
+
+        delta = time.time() - started
+        rate = created / delta if delta else 0
+        self.stdout.write(f"Generated {created} board(s) in {delta:.1f}s ({rate:.0f}/s).")
+
+    def iter_batches(self, batches: list[int], workers: int, start: datetime, end: datetime):
+        """
+        Yield the generated batches in order, keeping only a few per worker in memory.
+        """
+        if workers == 1 or len(batches) == 1:
+            for size in batches:
+                yield generate_boards(size, start, end)
+            return
+
+        pending: deque[Future[list[Board]]] = deque()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+            for size in batches:
+                pending.append(executor.submit(generate_boards, size, start, end))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
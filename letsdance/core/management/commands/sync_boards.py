@@ -0,0 +1,62 @@
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from letsdance.core.models import FollowedKey, Peer
+from letsdance.core.sync import sync_boards
+
+
+class Command(BaseCommand):
+    help = "Pull boards from peer servers, storing any newer versions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "keys",
+            nargs="*",
+            help="Board keys to pull, defaults to every followed key.",
+        )
+        parser.add_argument(
+            "--follow",
+            action="store_true",
+            help="Also follow the given keys, so they're pulled by the scheduled sync.",
+        )
+        parser.add_argument(
+            "--server-url",
+            action="append",
+            help="Pull from this server instead of the realm's peers, may be given multiple times.",
+        )
+        parser.add_argument(
+            "--max-concurrency",
+            type=int,
+            default=None,
+            help="Maximum number of requests in flight at once.",
+        )
+
+    def handle(self, *args, **options):
+        keys = options["keys"]
+        key_field = FollowedKey._meta.get_field("key")
+        for key in keys:
+            try:
+                key_field.run_validators(key)
+            except ValidationError:
+                raise CommandError(f"Invalid board key: {key}")
+        if keys and options["follow"]:
+            FollowedKey.objects.bulk_create(
+                [FollowedKey(key=key) for key in keys], ignore_conflicts=True
+            )
+        if not keys:
+            keys = list(FollowedKey.objects.values_list("key", flat=True))
+        if not keys:
+            raise CommandError("No keys given and no keys are being followed.")
+
+        peers = None
+        if options["server_url"]:
+            peers = [Peer(url=url) for url in options["server_url"]]
+
+        start = time.time()
+        outcomes = sync_boards(keys, peers, options["max_concurrency"])
+        delta = time.time() - start
+
+        summary = ", ".join(f"{count} {outcome}" for outcome, count in sorted(outcomes.items()))
+        self.stdout.write(f"Synced {len(keys)} board(s) in {delta:.1f}s ({summary or 'no peers'}).")
@@ -0,0 +1,71 @@
+import time
+from collections import deque
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from letsdance.core.cache import board_cache
+from letsdance.core.crypto import verify_signatures
+from letsdance.core.models import Board
+
+
+class Command(BaseCommand):
+    help = "Re-verify the signatures of every board stored on the server."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Number of worker processes, defaults to the number of CPUs.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=256,
+            help="Number of boards sent to a worker at a time.",
+        )
+        parser.add_argument(
+            "--delete",
+            action="store_true",
+            help="Delete boards that fail verification.",
+        )
+
+    def handle(self, *args, **options):
+        boards = Board.objects.values_list("key", "signature", "content")
+        # Keys of the boards that have been handed to the workers, in order
+        keys: deque[str] = deque()
+
+        def iter_items():
+            for key, signature, content in boards.iterator(chunk_size=options["chunk_size"]):
+                keys.append(key)
+                yield signature, key, bytes(content)
+
+        start = time.time()
+        count = 0
+        invalid = []
+        results = verify_signatures(
+            iter_items(),
+            workers=options["workers"],
+            chunk_size=options["chunk_size"],
+        )
+        for valid in results:
+            key = keys.popleft()
+            count += 1
+            if not valid:
+                invalid.append(key)
+                self.stdout.write(f"Invalid signature: {key}")
+
+        delta = time.time() - start
+        rate = count / delta if delta else 0
+        self.stdout.write(f"Verified {count} board(s) in {delta:.1f}s ({rate:.0f}/s).")
+        self.stdout.write(f"Found {len(invalid)} board(s) with an invalid signature.")
+
+        if invalid and options["delete"]:
+            with transaction.atomic():
+                boards = Board.objects.filter(key__in=invalid)
+                removed = list(boards.values_list("key", "last_modified"))
+                deleted, _ = boards.delete()
+                Board.objects.track(removed=removed)
+            board_cache.delete_many(invalid)
+            self.stdout.write(f"Deleted {deleted} board(s).")
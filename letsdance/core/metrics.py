@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+import time
+from collections.abc import Callable, Iterator, Sequence
+
+from letsdance.core.models import Board
+
+# Upper bounds in seconds, from a cached GET up to a slow peer
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Shards:
+    """
+    A list of numbers that every thread writes its own copy of, summed when read.
+
+    A thread only ever writes to its own list, so recording a value doesn't
+    take a lock. The lock is only taken the first time a thread records
+    something, and when the values are read.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.local = threading.local()
+        self.shards: list[list[float]] = []
+        self._lock = threading.Lock()
+
+    def get(self) -> list[float]:
+        try:
+            return self.local.values
+        except AttributeError:
+            values = [0.0] * self.size
+            with self._lock:
+                self.shards.append(values)
+            self.local.values = values
+            return values
+
+    def sum(self) -> list[float]:
+        with self._lock:
+            shards = list(self.shards)
+        return [sum(column) for column in zip(*shards)] if shards else [0.0] * self.size
+
+
+class Metric:
+    """
+    A named metric, with a child for each combination of label values.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children: dict[tuple[str, ...], Shards] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return 1
+
+    def labels(self, *values: str) -> Shards:
+        shards = self.children.get(values)
+        if shards is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"Expected labels {self.labelnames}, got {values}.")
+            with self._lock:
+                shards = self.children.setdefault(values, Shards(self.size))
+        return shards
+
+    def format_labels(self, values: tuple[str, ...], extra: dict[str, str] | None = None) -> str:
+        pairs = list(zip(self.labelnames, values)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{escape(str(value))}"' for name, value in pairs) + "}"
+
+    def collect(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type}"
+        yield from self.collect()
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self.labels(*labels).get()[0] += amount
+
+    def collect(self) -> Iterator[str]:
+        for values, shards in sorted(self.children.items()):
+            yield f"{self.name}{self.format_labels(values)} {format_value(shards.sum()[0])}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    @property
+    def size(self) -> int:
+        # A count per bucket, one for +Inf, and the sum of every observation
+        return len(self.buckets) + 2
+
+    def observe(self, value: float, *labels: str) -> None:
+        values = self.labels(*labels).get()
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def time(self, *labels: str) -> Timer:
+        return Timer(self, labels)
+
+    def collect(self) -> Iterator[str]:
+        for values, shards in sorted(self.children.items()):
+            totals = shards.sum()
+            cumulative = 0.0
+            for bound, count in zip((*self.buckets, math.inf), totals):
+                cumulative += count
+                labels = self.format_labels(values, {"le": format_value(bound)})
+                yield f"{self.name}_bucket{labels} {format_value(cumulative)}"
+            labels = self.format_labels(values)
+            yield f"{self.name}_sum{labels} {format_value(totals[-1])}"
+            yield f"{self.name}_count{labels} {format_value(cumulative)}"
+
+
+class Timer:
+    """
+    Context manager that observes the time spent in its block.
+    """
+
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Gauge(Metric):
+    """
+    A value read from a callback when the metrics are collected.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, func: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.func = func
+
+    def collect(self) -> Iterator[str]:
+        yield f"{self.name} {format_value(self.func())}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered.")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))  # type: ignore
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames))  # type: ignore
+
+    def gauge(self, name: str, documentation: str, func: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, documentation, func))  # type: ignore
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+put_stage_seconds = registry.histogram(
+    "letsdance_put_stage_seconds",
+    "Time spent in each stage of validating and storing an uploaded board.",
+    ["stage"],
+)
+puts_total = registry.counter(
+    "letsdance_puts_total", "Board uploads by response status.", ["status"]
+)
+gets_total = registry.counter(
+    "letsdance_gets_total",
+    "Board requests by result, one of hit, miss, not_modified, not_found or test.",
+    ["result"],
+)
+index_render_seconds = registry.histogram(
+    "letsdance_index_render_seconds",
+    "Time spent rendering the newsstand, for the first page or an older one.",
+    ["page"],
+)
+publish_attempts_total = registry.counter(
+    "letsdance_publish_attempts_total",
+    "Attempts to publish a board to a peer, by result: success, rejected, retry or error.",
+    ["peer", "result"],
+)
+publish_seconds = registry.histogram(
+    "letsdance_publish_seconds", "Time taken to publish a board to a peer.", ["peer"]
+)
+boards_expired_total = registry.counter(
+    "letsdance_boards_expired_total", "Boards removed for not being updated within the TTL."
+)
+scheduler_events_total = registry.counter(
+    "letsdance_scheduler_events_total",
+    "Scheduled job runs by outcome: executed, error, missed or skipped (already running).",
+    ["job", "outcome"],
+)
+boards_stored = registry.gauge(
+    "letsdance_boards_stored",
+    "Boards stored, from the maintained counter.",
+    Board.objects.stored_count,
+)
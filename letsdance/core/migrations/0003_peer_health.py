@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_delivery"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="peer",
+            name="breaker_until",
+            field=models.DateTimeField(
+                blank=True, help_text="The peer is skipped until this time.", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="peer",
+            name="consecutive_failures",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="peer",
+            name="failure_rate",
+            field=models.FloatField(
+                default=0.0, help_text="Moving average of the fraction of failed attempts."
+            ),
+        ),
+        migrations.AddField(
+            model_name="peer",
+            name="last_success",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="peer",
+            name="latency",
+            field=models.FloatField(
+                blank=True, help_text="Moving average of the response time in seconds.", null=True
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:41
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_peer_health"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="board",
+            name="last_modified",
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
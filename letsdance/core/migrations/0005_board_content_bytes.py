@@ -0,0 +1,63 @@
+from django.db import migrations, models
+
+
+def encode_content(apps, schema_editor):
+    Board = apps.get_model("core", "Board")
+    boards = Board.objects.only("id", "content")
+    batch = []
+    for board in boards.iterator(chunk_size=1000):
+        board.content_bytes = board.content.encode()
+        batch.append(board)
+        if len(batch) >= 1000:
+            Board.objects.bulk_update(batch, ["content_bytes"])
+            batch = []
+    Board.objects.bulk_update(batch, ["content_bytes"])
+
+
+def decode_content(apps, schema_editor):
+    Board = apps.get_model("core", "Board")
+    boards = Board.objects.only("id", "content_bytes")
+    batch = []
+    for board in boards.iterator(chunk_size=1000):
+        board.content = bytes(board.content_bytes).decode(errors="replace")
+        batch.append(board)
+        if len(batch) >= 1000:
+            Board.objects.bulk_update(batch, ["content"])
+            batch = []
+    Board.objects.bulk_update(batch, ["content"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_board_last_modified_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="board",
+            name="content_bytes",
+            field=models.BinaryField(default=b"", editable=True),
+        ),
+        migrations.RunPython(encode_content, decode_content),
+        # Gives the column a default, so it can be added back when reversing
+        migrations.AlterField(
+            model_name="board",
+            name="content",
+            field=models.TextField(default=""),
+        ),
+        migrations.RemoveField(
+            model_name="board",
+            name="content",
+        ),
+        migrations.RenameField(
+            model_name="board",
+            old_name="content_bytes",
+            new_name="content",
+        ),
+        migrations.AlterField(
+            model_name="board",
+            name="content",
+            field=models.BinaryField(editable=True),
+        ),
+    ]
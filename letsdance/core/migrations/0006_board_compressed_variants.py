@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:49
+
+import gzip
+
+from django.db import migrations, models
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+def compress(content):
+    # A frozen copy of letsdance.core.compression.compress at the time of this migration
+    variants = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(content, mode=brotli.MODE_TEXT, quality=11)
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(content)}
+
+
+def compress_boards(apps, schema_editor):
+    Board = apps.get_model("core", "Board")
+    boards = Board.objects.only("id", "content")
+    batch = []
+    for board in boards.iterator(chunk_size=1000):
+        variants = compress(bytes(board.content))
+        board.content_gzip = variants.get("gzip", b"")
+        board.content_br = variants.get("br", b"")
+        batch.append(board)
+        if len(batch) >= 1000:
+            Board.objects.bulk_update(batch, ["content_gzip", "content_br"])
+            batch = []
+    Board.objects.bulk_update(batch, ["content_gzip", "content_br"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_board_content_bytes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="board",
+            name="content_br",
+            field=models.BinaryField(blank=True, default=b""),
+        ),
+        migrations.AddField(
+            model_name="board",
+            name="content_gzip",
+            field=models.BinaryField(blank=True, default=b""),
+        ),
+        migrations.RunPython(compress_boards, migrations.RunPython.noop),
+    ]
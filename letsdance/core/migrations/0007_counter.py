@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:58
+
+from django.db import migrations, models
+
+
+def count_boards(apps, schema_editor):
+    Board = apps.get_model("core", "Board")
+    Counter = apps.get_model("core", "Counter")
+    Counter.objects.create(name="boards", value=Board.objects.count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_board_compressed_variants"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Counter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("name", models.CharField(max_length=64, unique=True)),
+                ("value", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_boards, migrations.RunPython.noop),
+    ]
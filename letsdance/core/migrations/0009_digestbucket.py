@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:10
+
+import hashlib
+from collections import defaultdict
+
+from django.db import migrations, models
+
+# Frozen copies of the digest settings at the time of this migration
+PREFIX_CHARS = 2
+
+
+def hash_board(key, last_modified):
+    data = f"{key}:{int(last_modified.timestamp())}".encode()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big", signed=True)
+
+
+def fill_buckets(apps, schema_editor):
+    Board = apps.get_model("core", "Board")
+    DigestBucket = apps.get_model("core", "DigestBucket")
+    buckets = defaultdict(int)
+    for key, last_modified in Board.objects.values_list("key", "last_modified").iterator():
+        buckets[key[:PREFIX_CHARS]] ^= hash_board(key, last_modified)
+    DigestBucket.objects.bulk_create(
+        DigestBucket(prefix=prefix, value=value) for prefix, value in buckets.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_followedkey"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DigestBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("prefix", models.CharField(max_length=PREFIX_CHARS, unique=True)),
+                ("value", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_buckets, migrations.RunPython.noop),
+    ]
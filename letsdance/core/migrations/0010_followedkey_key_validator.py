@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:33
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_digestbucket"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="followedkey",
+            name="key",
+            field=models.CharField(
+                max_length=64,
+                unique=True,
+                validators=[django.core.validators.RegexValidator("^[0-9a-f]{64}$")],
+            ),
+        ),
+    ]
@@ -1,25 +1,126 @@
 from __future__ import annotations
 
+import hashlib
+import heapq
 import logging
+import math
+import random
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import datetime, timedelta
 
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
-from letsdance.core.constants import TEST_KEY_PUBLIC, TEST_KEY_SECRET
+from letsdance.core.compression import compress
+from letsdance.core.constants import (
+    BOARD_MAX_COUNT,
+    BOARD_TTL_DAYS,
+    DIGEST_BUCKET_CHARS,
+    PEER_BREAKER_COOLDOWN_SECONDS,
+    PEER_BREAKER_MAX_COOLDOWN_SECONDS,
+    PEER_BREAKER_THRESHOLD,
+    PEER_HEALTH_ALPHA,
+    PEER_LATENCY_REFERENCE_SECONDS,
+    PEER_MIN_WEIGHT,
+    PEER_SAMPLE_CANDIDATES,
+    TEST_KEY_PUBLIC,
+    TEST_KEY_SECRET,
+)
 from letsdance.core.crypto import load_private_key
 from letsdance.core.utils import generate_fake_board_content
 
 logger = logging.getLogger(__name__)
 
 
+def hash_board(key: str, last_modified: datetime) -> int:
+    """
+    Hash a version of a board for the peer digest, as a signed 64-bit integer.
+
+    The digest of a set of boards is the XOR of their hashes, so it doesn't
+    depend on order and can be updated one board at a time.
+    """
+    data = f"{key}:{int(last_modified.timestamp())}".encode()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big", signed=True)
+
+
+def get_expiry_cutoff(now: datetime | None = None) -> datetime:
+    """
+    Boards last modified before this time have outlived their TTL.
+    """
+    return (now or timezone.now()) - timedelta(days=BOARD_TTL_DAYS)
+
+
 class BoardManager(models.Manager):
+    def expired(self, now: datetime | None = None) -> models.QuerySet[Board]:
+        return self.filter(last_modified__lt=get_expiry_cutoff(now))
+
     def get_or_none(self, **kwargs) -> Board | None:
         try:
             return self.get(**kwargs)
         except self.model.DoesNotExist:
             return None
 
+    async def aget_or_none(self, **kwargs) -> Board | None:
+        try:
+            return await self.aget(**kwargs)
+        except self.model.DoesNotExist:
+            return None
+
+    def stored_count(self) -> int:
+        """
+        Return the number of stored boards from the maintained counter, without a COUNT(*).
+        """
+        return Counter.objects.get_value(Counter.BOARDS)
+
+    def fill_level(self) -> float:
+        """
+        Return the stored boards as a fraction of BOARD_MAX_COUNT.
+        """
+        return self.stored_count() / BOARD_MAX_COUNT
+
+    def delete_oldest(self, count: int, before: datetime | None = None) -> list[str]:
+        """
+        Delete up to count of the least recently modified boards, returning their keys.
+
+        Pass before to only consider boards last modified before that time.
+        The board counter is updated in the same transaction.
+        """
+        boards = self.all() if before is None else self.filter(last_modified__lt=before)
+        with transaction.atomic():
+            batch = list(
+                boards.order_by("last_modified").values_list("id", "key", "last_modified")[:count]
+            )
+            if not batch:
+                return []
+
+            ids, keys, _ = zip(*batch)
+            self.filter(id__in=ids).delete()
+            self.track(removed=[(key, last_modified) for _, key, last_modified in batch])
+        return list(keys)
+
+    def track(
+        self,
+        added: Iterable[tuple[str, datetime]] = (),
+        removed: Iterable[tuple[str, datetime]] = (),
+    ) -> None:
+        """
+        Update the board counter and digest buckets for (key, last_modified) versions.
+
+        Call this in the same transaction as the change. An updated board is
+        removed with its old last-modified time and added with the new one.
+        """
+        added, removed = list(added), list(removed)
+        if len(added) != len(removed):
+            Counter.objects.add(Counter.BOARDS, len(added) - len(removed))
+
+        deltas: defaultdict[str, int] = defaultdict(int)
+        for key, last_modified in added + removed:
+            deltas[key[:DIGEST_BUCKET_CHARS]] ^= hash_board(key, last_modified)
+        for prefix, delta in deltas.items():
+            DigestBucket.objects.toggle(prefix, delta)
+
 
 class Board(models.Model):
 
@@ -29,34 +130,288 @@ class Board(models.Model):
         db_index=True,
         validators=[RegexValidator(f"[0-9a-f]{64}")],
     )
-    content = models.TextField()
+    content = models.BinaryField(editable=True)
     signature = models.CharField(
         max_length=128,
         validators=[RegexValidator(f"[0-9a-f]{128}")],
     )
-    last_modified = models.DateTimeField(default=timezone.now)
+    last_modified = models.DateTimeField(default=timezone.now, db_index=True)
+
+    # Compressed copies of the content, empty when not worth sending
+    content_gzip = models.BinaryField(default=b"", blank=True)
+    content_br = models.BinaryField(default=b"", blank=True)
 
     objects = BoardManager()
 
     def __str__(self):
         return self.key
 
+    @property
+    def text(self) -> str:
+        """
+        The board HTML decoded for display, boards are always stored as raw bytes.
+        """
+        return bytes(self.content).decode(errors="replace")
+
+    @property
+    def is_expired(self) -> bool:
+        return self.last_modified < get_expiry_cutoff()
+
+    @property
+    def variants(self) -> dict[str, bytes]:
+        """
+        The precomputed compressed copies of the content, keyed by content-coding.
+        """
+        variants = {"gzip": bytes(self.content_gzip), "br": bytes(self.content_br)}
+        return {encoding: data for encoding, data in variants.items() if data}
+
+    def set_content(self, content: bytes, variants: dict[str, bytes] | None = None) -> None:
+        """
+        Replace the content of the board along with its compressed variants.
+        """
+        if variants is None:
+            variants = compress(content)
+        self.content = content
+        self.content_gzip = variants.get("gzip", b"")
+        self.content_br = variants.get("br", b"")
+
     @classmethod
     def generate_board(cls) -> Board:
-        last_modified = timezone.now()
-        content = generate_fake_board_content(last_modified)
+        # The <time> tag only has second resolution
+        last_modified = timezone.now().replace(microsecond=0)
+        content = generate_fake_board_content(last_modified).encode()
         private_key = load_private_key(TEST_KEY_SECRET)
-        signature = private_key.sign(content.encode()).hex()
-        return cls(
-            key=TEST_KEY_PUBLIC,
-            content=content,
-            signature=signature,
-            last_modified=last_modified,
+        signature = private_key.sign(content).hex()
+        board = cls(key=TEST_KEY_PUBLIC, signature=signature, last_modified=last_modified)
+        board.set_content(content)
+        return board
+
+
+class CounterManager(models.Manager):
+    def get_value(self, name: str) -> int:
+        return self.filter(name=name).values_list("value", flat=True).first() or 0
+
+    def add(self, name: str, delta: int) -> None:
+        """
+        Atomically add delta to the named counter, creating it if needed.
+        """
+        if not self.filter(name=name).update(value=models.F("value") + delta):
+            self.create(name=name, value=delta)
+
+
+class Counter(models.Model):
+    """
+    A named running total, kept up to date alongside the rows it counts.
+    """
+
+    BOARDS = "boards"
+
+    name = models.CharField(max_length=64, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    objects = CounterManager()
+
+    def __str__(self):
+        return self.name
+
+
+class DigestBucketManager(models.Manager):
+    def toggle(self, prefix: str, value: int) -> None:
+        """
+        XOR a board hash into or out of the bucket, creating it if needed.
+        """
+        if not self.filter(prefix=prefix).update(value=models.F("value").bitxor(value)):
+            self.create(prefix=prefix, value=value)
+
+
+class DigestBucket(models.Model):
+    """
+    The XOR of the hashes of every stored board whose key starts with the prefix.
+
+    These are the top level of the digest that peers compare, kept up to
+    date alongside the boards so it never has to be computed from the table.
+    """
+
+    prefix = models.CharField(max_length=DIGEST_BUCKET_CHARS, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    objects = DigestBucketManager()
+
+    def __str__(self):
+        return self.prefix
+
+
+class PeerManager(models.Manager):
+    def available(self, now: datetime | None = None) -> models.QuerySet[Peer]:
+        """
+        Return the peers whose circuit breaker isn't open.
+        """
+        now = now or timezone.now()
+        return self.filter(models.Q(breaker_until__isnull=True) | models.Q(breaker_until__lte=now))
+
+    def sample(self, count: int, fraction: float = 1.0) -> list[Peer]:
+        """
+        Pick up to count available peers at random, favouring fast and healthy ones.
+
+        In a large realm the database first picks PEER_SAMPLE_CANDIDATES of the
+        available peers uniformly at random, so only those are loaded and
+        weighed. The database still visits every available peer to do that,
+        but that's a top-N sort in SQLite rather than a model per peer.
+
+        At most the given fraction of the candidates are picked, rounded up.
+        Uses weighted sampling without replacement (Efraimidis-Spirakis). Every
+        peer gets the key u ** (1 / weight) for a uniform random u, and the
+        peers with the largest keys are chosen.
+        """
+        # A single query for just the fields needed to weigh the peers and send to them
+        candidates = self.available().only(
+            "id", "url", "latency", "failure_rate", "consecutive_failures"
         )
+        peers = list(candidates.order_by("?")[:PEER_SAMPLE_CANDIDATES])
+        return weighted_sample(peers, min(count, math.ceil(len(peers) * fraction)))
+
+    def record_attempts(self, attempts: Iterable[tuple[int, bool, float, datetime]]) -> None:
+        """
+        Apply the (peer id, success, latency, time) outcomes of a run to the stored peers.
+
+        The peers are read again inside the transaction, so runs that overlap,
+        like a sync and an outbox drain, add to each other's updates instead of
+        the last one to finish overwriting the rest.
+        """
+        attempts = list(attempts)
+        if not attempts:
+            return
+        with transaction.atomic():
+            peers = self.select_for_update().in_bulk({peer_id for peer_id, *_ in attempts})
+            for peer_id, success, latency, now in attempts:
+                if peer := peers.get(peer_id):
+                    peer.record_attempt(success, latency, now)
+            self.bulk_update(
+                peers.values(),
+                [
+                    "latency",
+                    "failure_rate",
+                    "consecutive_failures",
+                    "last_success",
+                    "breaker_until",
+                ],
+            )
+
+
+def weighted_sample(peers: Iterable[Peer], count: int) -> list[Peer]:
+    """
+    Pick up to count of the peers at random, weighted by Peer.weight.
+    """
+    return heapq.nlargest(count, peers, key=lambda peer: random.random() ** (1 / peer.weight))
 
 
 class Peer(models.Model):
     url = models.URLField(verbose_name="URL", unique=True, db_index=True)
 
+    # Health, updated after every attempt to publish a board to the peer
+    latency = models.FloatField(
+        null=True, blank=True, help_text="Moving average of the response time in seconds."
+    )
+    failure_rate = models.FloatField(
+        default=0.0, help_text="Moving average of the fraction of failed attempts."
+    )
+    consecutive_failures = models.PositiveIntegerField(default=0)
+    last_success = models.DateTimeField(null=True, blank=True)
+    breaker_until = models.DateTimeField(
+        null=True, blank=True, help_text="The peer is skipped until this time."
+    )
+
+    objects = PeerManager()
+
     def __str__(self):
         return self.url
+
+    @property
+    def weight(self) -> float:
+        """
+        Relative likelihood of the peer being picked for a broadcast.
+        """
+        latency = PEER_LATENCY_REFERENCE_SECONDS if self.latency is None else self.latency
+        speed = PEER_LATENCY_REFERENCE_SECONDS / (PEER_LATENCY_REFERENCE_SECONDS + latency)
+        weight = (1 - self.failure_rate) * speed
+        if self.consecutive_failures >= PEER_BREAKER_THRESHOLD:
+            # Half-open, the breaker has cooled down and the peer is on probation
+            weight *= 0.1
+        return max(weight, PEER_MIN_WEIGHT)
+
+    @property
+    def breaker_state(self) -> str:
+        if self.consecutive_failures < PEER_BREAKER_THRESHOLD:
+            return "closed"
+        if self.breaker_until and self.breaker_until > timezone.now():
+            return "open"
+        return "half-open"
+
+    def record_attempt(self, success: bool, latency: float, now: datetime | None = None) -> None:
+        """
+        Update the health of the peer after an attempt to contact it.
+        """
+        now = now or timezone.now()
+        alpha = PEER_HEALTH_ALPHA
+        self.failure_rate = alpha * (not success) + (1 - alpha) * self.failure_rate
+        if success:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency = alpha * latency + (1 - alpha) * self.latency
+            self.consecutive_failures = 0
+            self.last_success = now
+            self.breaker_until = None
+            return
+
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= PEER_BREAKER_THRESHOLD:
+            # Every failure past the threshold doubles the time until the next try
+            exponent = min(self.consecutive_failures - PEER_BREAKER_THRESHOLD, 16)
+            cooldown = min(
+                PEER_BREAKER_COOLDOWN_SECONDS * 2**exponent,
+                PEER_BREAKER_MAX_COOLDOWN_SECONDS,
+            )
+            self.breaker_until = now + timedelta(seconds=cooldown)
+
+
+class FollowedKey(models.Model):
+    """
+    A board key that is pulled from peers on a schedule, instead of waiting for a push.
+    """
+
+    key = models.CharField(
+        max_length=64,
+        unique=True,
+        validators=[RegexValidator("^[0-9a-f]{64}$")],
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.key
+
+
+class Delivery(models.Model):
+    """
+    A board that is waiting to be published to a peer.
+
+    Rows are removed once the peer has accepted the board (or rejected it for
+    good), failed attempts are rescheduled with exponential backoff.
+    """
+
+    key = models.CharField(max_length=64, db_index=True)
+    peer = models.ForeignKey(Peer, on_delete=models.CASCADE, related_name="deliveries")
+    next_attempt = models.DateTimeField(default=timezone.now, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    # Set while a drainer is sending the board, so a concurrent broadcast can
+    # tell that the row was re-queued underneath it.
+    claim = models.CharField(max_length=32, blank=True, default="")
+
+    class Meta:
+        verbose_name_plural = "deliveries"
+        constraints = [
+            models.UniqueConstraint(fields=["key", "peer"], name="unique_delivery"),
+        ]
+
+    def __str__(self):
+        return f"{self.key} -> {self.peer}"
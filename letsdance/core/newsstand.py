@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import hashlib
+import time
+import uuid
+from collections.abc import Iterable, Iterator, Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+from django.utils.timesince import timesince
+
+from letsdance.core.compression import compress
+from letsdance.core.models import Board, get_expiry_cutoff
+from letsdance.core.utils import LRUCache
+
+# Stand-in for the parts of the page that are filled in per request
+MARKER = f"<!--{uuid.uuid4().hex}-->"
+
+# Number of boards rendered between each chunk written to a streamed page
+STREAM_CHUNK_SIZE = 25
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+Cursor = tuple[datetime, int]
+
+
+def format_cursor(last_modified: datetime, id: int) -> str:
+    """
+    Encode the position of a board in the newsstand, for the "before" query parameter.
+    """
+    return f"{(last_modified - EPOCH) // timedelta(microseconds=1)}-{id}"
+
+
+def parse_cursor(value: str) -> Cursor:
+    """
+    Decode a "before" query parameter, raising ValueError if it's malformed.
+    """
+    timestamp, _, id = value.partition("-")
+    return EPOCH + timedelta(microseconds=int(timestamp)), int(id)
+
+
+@dataclass(frozen=True)
+class Page:
+    """
+    A fully rendered newsstand page with its compressed variants.
+    """
+
+    content: bytes
+    variants: dict[str, bytes]
+    etag: str
+
+
+class Newsstand:
+    """
+    The newsstand page, assembled from per-board HTML fragments.
+
+    Escaping a board into an iframe srcdoc is the expensive part of rendering
+    the page, so each fragment is rendered once per board version and reused
+    until the board is updated or expired. The only thing that changes between
+    requests is the "time since" label, which is spliced in during assembly.
+
+    The assembled and compressed first page is kept until the list of boards
+    changes or the minute rolls over, since the labels only have minute
+    resolution. Older pages are reached with a keyset cursor on
+    (last_modified, id), which walks the last_modified index instead of
+    sorting or skipping over rows.
+    """
+
+    def __init__(self, size: int, max_bytes: int):
+        self.size = size
+        self.fragments = LRUCache(max_bytes, sizeof=lambda value: len(value[1]) + len(value[2]))
+        self._layout: tuple[str, str] | None = None
+        self._page: tuple[object, Page] | None = None
+
+    def get_layout(self) -> tuple[str, str]:
+        """
+        Return the page HTML before and after the list of boards.
+        """
+        if self._layout is None:
+            content = render_to_string("newsstand.html", {"boards": mark_safe(MARKER)})
+            head, tail = content.split(MARKER, 1)
+            self._layout = head, tail
+        return self._layout
+
+    def render_fragment(self, board: Board) -> tuple[str, str]:
+        """
+        Render the HTML for a single board and store it in the fragment cache.
+        """
+        content = render_to_string(
+            "newsstand_board.html", {"board": board, "since": mark_safe(MARKER)}
+        )
+        before, after = content.split(MARKER, 1)
+        self.fragments.set(board.key, (board.last_modified, before, after))
+        return before, after
+
+    def update(self, board: Board) -> None:
+        self.render_fragment(board)
+        self._page = None
+
+    def discard(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self.fragments.delete(key)
+        self._page = None
+
+    def clear(self) -> None:
+        self.fragments.clear()
+        self._layout = None
+        self._page = None
+
+    def get_entries(self, before: Cursor | None = None) -> list[tuple[int, str, datetime]]:
+        """
+        Return the id, key and last modified time of the boards to show, newest first.
+
+        Pass the cursor of the last board on a page to get the page after it.
+        """
+        boards = Board.objects.filter(last_modified__gte=get_expiry_cutoff())
+        if before is not None:
+            last_modified, id = before
+            # A single range on last_modified, an OR of two ranges would make
+            # SQLite sort every older row instead of walking the index in order
+            boards = boards.filter(last_modified__lte=last_modified).exclude(
+                last_modified=last_modified, id__gte=id
+            )
+        return list(
+            boards.order_by("-last_modified", "-id").values_list("id", "key", "last_modified")[
+                : self.size
+            ]
+        )
+
+    def render_page(self) -> Page:
+        """
+        Return the encoded first page, re-rendering and compressing it only when needed.
+        """
+        entries = self.get_entries()
+        version = (int(time.time() // 60), entries)
+        cached = self._page
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        content = self.render(entries).encode()
+        page = Page(
+            content=content,
+            variants=compress(content, fast=True),
+            etag=f'"{hashlib.sha256(content).hexdigest()[:32]}"',
+        )
+        self._page = (version, page)
+        return page
+
+    def render(self, entries: list[tuple[int, str, datetime]] | None = None) -> str:
+        """
+        Assemble a newsstand page, defaulting to the most recently modified boards.
+        """
+        if entries is None:
+            entries = self.get_entries()
+        return "".join(self.iter_render(entries))
+
+    def iter_render(self, entries: list[tuple[int, str, datetime]]) -> Iterator[str]:
+        """
+        Yield the newsstand page in chunks of a few boards at a time.
+
+        Fragments that aren't cached are rendered chunk by chunk, so the start
+        of the page can be sent before the rest has been loaded.
+        """
+        head, tail = self.get_layout()
+        yield head
+        for start in range(0, len(entries), STREAM_CHUNK_SIZE):
+            yield self.render_entries(entries[start : start + STREAM_CHUNK_SIZE])
+
+        if len(entries) == self.size:
+            id, _, last_modified = entries[-1]
+            yield format_html(
+                '<a class="older" href="?before={}">Older boards &rarr;</a>',
+                format_cursor(last_modified, id),
+            )
+        yield tail
+
+    def render_entries(self, entries: Sequence[tuple[int, str, datetime]]) -> str:
+        fragments = {}
+        missing = []
+        for _, key, last_modified in entries:
+            cached = self.fragments.get(key)
+            if cached and cached[0] == last_modified:
+                fragments[key] = cached[1:]
+            else:
+                missing.append(key)
+
+        if missing:
+            # Leave out the compressed variants and signature, only the content is shown
+            boards = Board.objects.filter(key__in=missing).only("key", "content", "last_modified")
+            for board in boards:
+                fragments[board.key] = self.render_fragment(board)
+
+        parts = []
+        for _, key, last_modified in entries:
+            if key in fragments:
+                before, after = fragments[key]
+                parts.extend([before, timesince(last_modified), after])
+        return "".join(parts)
+
+
+newsstand = Newsstand(settings.NEWSSTAND_PAGE_SIZE, settings.NEWSSTAND_CACHE_MAX_BYTES)
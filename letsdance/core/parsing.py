@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import html
+import re
+from datetime import datetime, timezone
+
+# Whitespace as HTML defines it, unlike \s it doesn't include "\v" or non-ASCII spaces
+WS = r"\t\n\f\r "
+
+# Everything between a tag name and the closing ">", as attributes are split up
+# by the HTML5 tokenizer that lxml uses. Quotes only group text when they
+# follow the "=" after an attribute name, an "=" where a name should start is
+# part of the name, and a "/" not followed by ">" separates attributes like
+# whitespace does. Any character can be matched by one of the alternatives,
+# so together with the closing (?:>|\Z) the pattern never fails.
+ATTRIBUTES = rf"""(?:
+    [{WS}/]+
+  | [^{WS}/>][^{WS}/>=]*(?:[{WS}]*=[{WS}]*(?:"[^"]*(?:"|\Z)|'[^']*(?:'|\Z)|[^{WS}>]*))?
+)*"""
+
+# Elements whose content is raw text, the same set that libxml2 treats this way
+RAW_TEXT_ELEMENTS = {
+    "script",
+    "style",
+    "title",
+    "textarea",
+    "iframe",
+    "xmp",
+    "noembed",
+    "noframes",
+    "plaintext",
+}
+
+SPECIAL_ELEMENTS = "|".join(["time", *sorted(RAW_TEXT_ELEMENTS)])
+
+# Skips over text, comments and all other tags in a single match, stopping at
+# the next <time> tag or raw text element (or the end of the document). Like
+# ATTRIBUTES, the skipped part can't fail to match, so there's no backtracking.
+# An end tag that doesn't start with a letter, like "</ ", is a bogus comment
+# that runs to the next ">". Case-insensitive matching is limited to element
+# names since it is much slower than matching explicit character classes.
+SCAN_PATTERN = re.compile(
+    rf"""
+    (?:
+        [^<]+
+      | </[a-zA-Z][^>]*(?:>|\Z)
+      | </[^a-zA-Z>][^>]*(?:>|\Z)
+      | <(?!(?i:{SPECIAL_ELEMENTS})(?![^{WS}/>]))[a-zA-Z][^{WS}/>]*{ATTRIBUTES}(?:>|\Z)
+      | <!--(?:-?>|.*?--!?>|.*\Z)
+      | <[!?][^>]*(?:>|\Z)
+      | <(?![a-zA-Z!?])
+    )*
+    (?:<(?P<name>(?i:{SPECIAL_ELEMENTS}))(?![^{WS}/>])(?P<attributes>{ATTRIBUTES})(?P<end>>|\Z))?
+    """,
+    re.DOTALL | re.VERBOSE,
+)
+
+END_TAG_PATTERNS = {
+    name: re.compile(rf"</{name}(?![^{WS}/>])[^>]*>", re.IGNORECASE) for name in RAW_TEXT_ELEMENTS
+}
+
+ATTRIBUTE_PATTERN = re.compile(
+    rf"""
+    [{WS}/]+
+    | (?P<name>[^{WS}/>][^{WS}/>=]*)
+      (?:[{WS}]*=[{WS}]*(?P<value>"[^"]*"|'[^']*'|[^{WS}>]*))?
+    """,
+    re.VERBOSE,
+)
+
+
+TIMESTAMP_PATTERN = re.compile(r"(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)Z", re.ASCII)
+
+
+def get_attribute(attributes: str, name: str) -> str | None:
+    """
+    Return the first value of the named attribute from the inside of an HTML tag.
+    """
+    pos = 0
+    while pos < len(attributes):
+        match = ATTRIBUTE_PATTERN.match(attributes, pos)
+        assert match is not None
+        pos = match.end()
+        if match["name"] is None or match["name"].lower() != name:
+            continue
+
+        value = match["value"] or ""
+        if value[:1] in ('"', "'"):
+            value = value[1:-1]
+        if "\r" in value:
+            # Line breaks are normalized to "\n" before HTML is parsed
+            value = value.replace("\r\n", "\n").replace("\r", "\n")
+        return html.unescape(value)
+    return None
+
+
+def find_time_tags(content: str, limit: int | None = None) -> list[str | None]:
+    """
+    Return the datetime attribute of every <time> tag in the board HTML, in order.
+
+    This scans the HTML once without building a document tree, skipping
+    comments and raw text elements like <script> the same way lxml does. A tag
+    without a datetime attribute is returned as None. If a limit is given,
+    scanning stops after that many tags have been found.
+    """
+    if "\x00" in content:
+        # lxml drops NUL characters wherever they are
+        content = content.replace("\x00", "")
+
+    tags: list[str | None] = []
+    pos = 0
+    while pos < len(content):
+        match = SCAN_PATTERN.match(content, pos)
+        assert match is not None
+        if match["name"] is None or not match["end"]:
+            # Either the end of the document or an unterminated tag, which lxml discards
+            break
+
+        pos = match.end()
+        name = match["name"].lower()
+        if name == "time":
+            tags.append(get_attribute(match["attributes"], "datetime"))
+            if limit is not None and len(tags) >= limit:
+                break
+        elif name == "plaintext":
+            break
+        else:
+            end_tag = END_TAG_PATTERNS[name].search(content, pos)
+            if end_tag is None:
+                break
+            pos = end_tag.end()
+
+    return tags
+
+
+def parse_timestamp(value: str) -> datetime | None:
+    """
+    Parse a UTC timestamp in the format YYYY-MM-DDTHH:MM:SSZ.
+
+    Well-formed timestamps are sliced apart directly, anything else falls back
+    to strptime() so the accepted inputs are exactly the same.
+    """
+    if match := TIMESTAMP_PATTERN.fullmatch(value):
+        try:
+            return datetime(*map(int, match.groups()), tzinfo=timezone.utc)  # type: ignore
+        except ValueError:
+            pass
+
+    try:
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import cProfile
+import logging
+import os
+import random
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpRequest, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+DUMP_RE = re.compile(
+    r"(?P<time>\d+)-(?P<method>[A-Z]+)-(?P<view>[\w.:]+)-(?P<key>[0-9a-f]+|none)-"
+    r"(?P<ms>\d+)ms\.prof"
+)
+
+
+@dataclass(frozen=True)
+class Dump:
+    """
+    A saved profile, described by its file name.
+    """
+
+    path: Path
+    time: datetime
+    method: str
+    view: str
+    key: str | None
+    duration: float
+
+    @classmethod
+    def from_path(cls, path: Path) -> Dump | None:
+        match = DUMP_RE.fullmatch(path.name)
+        if match is None:
+            return None
+        return cls(
+            path=path,
+            time=datetime.fromtimestamp(int(match["time"]) / 1000),
+            method=match["method"],
+            view=match["view"],
+            key=None if match["key"] == "none" else match["key"],
+            duration=int(match["ms"]) / 1000,
+        )
+
+
+def list_dumps(directory: str | Path) -> list[Dump]:
+    """
+    Return the saved profiles in a directory, oldest first.
+    """
+    try:
+        paths = list(Path(directory).iterdir())
+    except FileNotFoundError:
+        return []
+    dumps = [dump for path in paths if (dump := Dump.from_path(path))]
+    return sorted(dumps, key=lambda dump: dump.path.name)
+
+
+def save_dump(
+    profile: cProfile.Profile, request: HttpRequest, duration: float, directory: str | Path
+) -> Path:
+    """
+    Write a profile to the directory, then delete the oldest beyond PROFILE_MAX_DUMPS.
+    """
+    match = request.resolver_match
+    view = re.sub(r"[^\w.:]", "_", match.view_name) if match and match.view_name else "unknown"
+    key = match.kwargs.get("key") if match else None
+    name = f"{time.time_ns() // 1_000_000}-{request.method}-{view}-{key or 'none'}"
+    name += f"-{round(duration * 1000)}ms.prof"
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / name
+    # Written under a temporary name, so a half-written file is never summarized
+    temp_path = directory / f".{name}.tmp"
+    profile.dump_stats(temp_path)
+    os.replace(temp_path, path)
+
+    for dump in list_dumps(directory)[: -settings.PROFILE_MAX_DUMPS]:
+        dump.path.unlink(missing_ok=True)
+    return path
+
+
+class ProfilerMiddleware:
+    """
+    Profile a random sample of requests with cProfile, keeping the slow ones.
+
+    A PROFILE_SAMPLE_RATE fraction of requests are profiled, and those that
+    took at least PROFILE_SLOW_SECONDS are saved to PROFILE_DIR, a ring of
+    the last PROFILE_MAX_DUMPS profiles. Set the sample rate to 1 to catch
+    every slow request, at the cost of profiling all of them.
+
+    The profiler only sees the thread handling the request. Under ASGI that
+    is the event loop, so work handed off with sync_to_async, like verifying
+    signatures, shows up as waiting, and other requests handled at the same
+    time are mixed in. The PUT stage timings in the metrics break that down.
+
+    When PROFILE_ENABLED is off, Django leaves this out of the middleware
+    chain entirely.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILE_ENABLED:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+        # Only one profiler can be enabled on a thread, and async requests share one
+        self.profiling = False
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest):
+        if self.is_async:
+            return self.__acall__(request)
+
+        if random.random() >= settings.PROFILE_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            return self.get_response(request)
+        finally:
+            profile.disable()
+            self.finish(profile, request, time.perf_counter() - start)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        if self.profiling or random.random() >= settings.PROFILE_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        self.profiling = True
+        profile.enable()
+        try:
+            return await self.get_response(request)
+        finally:
+            profile.disable()
+            self.profiling = False
+            await sync_to_async(self.finish, thread_sensitive=False)(
+                profile, request, time.perf_counter() - start
+            )
+
+    def finish(self, profile: cProfile.Profile, request: HttpRequest, duration: float) -> None:
+        if duration < settings.PROFILE_SLOW_SECONDS:
+            return
+        try:
+            path = save_dump(profile, request, duration, settings.PROFILE_DIR)
+        except OSError as e:
+            logger.warning(f"Unable to save profile: {e}")
+            return
+        logger.info(f"Profiled {request.method} {request.path} in {duration:.3f}s: {path.name}")
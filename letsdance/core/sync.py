@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import Counter
+from collections.abc import Iterable
+from datetime import datetime
+
+import httpx
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from letsdance.core.client import AsyncClient
+from letsdance.core.digest import get_digest
+from letsdance.core.exceptions import Spring83Exception
+from letsdance.core.models import Board, Peer, get_expiry_cutoff, weighted_sample
+from letsdance.core.tasks import push_boards
+from letsdance.core.utils import TokenBucket
+from letsdance.core.views import BoardView
+
+logger = logging.getLogger(__name__)
+
+
+class BoardSync:
+    """
+    Pull boards from peers with conditional GETs.
+
+    Each key is asked of a few peers in turn, picked at random and weighted
+    by health, until one of them has a newer version. Boards that haven't
+    changed since the stored version only cost a 304. Requests to each peer
+    are rate limited with a token bucket, and the client caps the number of
+    requests in flight overall.
+    """
+
+    def __init__(
+        self,
+        client: AsyncClient,
+        peers: list[Peer],
+        peers_per_key: int | None = None,
+        rate: float | None = None,
+        burst: int | None = None,
+    ):
+        self.client = client
+        self.peers = peers
+        self.peers_per_key = peers_per_key or settings.SYNC_PEERS_PER_KEY
+        rate = rate or settings.SYNC_PEER_RATE
+        burst = burst or settings.SYNC_PEER_BURST
+        self.buckets = {peer.url: TokenBucket(rate, burst) for peer in peers}
+        self.view = BoardView()
+        # Outcomes for the saved peers, to be stored with Peer.objects.record_attempts
+        self.attempts: list[tuple[int, bool, float, datetime]] = []
+
+    def record_attempt(self, peer: Peer, success: bool, start: float) -> None:
+        now = timezone.now()
+        latency = time.perf_counter() - start
+        # The instance is updated too, so the rest of the run is weighted by it
+        peer.record_attempt(success, latency, now)
+        if peer.pk is not None:
+            self.attempts.append((peer.pk, success, latency, now))
+
+    async def throttle(self, peer: Peer) -> None:
+        while delay := self.buckets[peer.url].consume():
+            await asyncio.sleep(delay)
+
+    async def sync(self, keys: Iterable[str]) -> Counter[str]:
+        """
+        Sync every key concurrently, returning the number of keys for each outcome.
+        """
+        keys = list(keys)
+        stored = await sync_to_async(self.get_last_modified)(keys)
+        outcomes = await asyncio.gather(*(self.sync_key(key, stored.get(key)) for key in keys))
+        return Counter(outcomes)
+
+    def get_last_modified(self, keys: list[str]) -> dict[str, datetime]:
+        return dict(Board.objects.filter(key__in=keys).values_list("key", "last_modified"))
+
+    async def sync_key(self, key: str, last_modified: datetime | None) -> str:
+        """
+        Fetch a single board, returning "updated", "unchanged", "missing" or "failed".
+        """
+        outcome = "missing"
+        for peer in weighted_sample(self.peers, self.peers_per_key):
+            result = await self.fetch(peer, key, last_modified)
+            if result in ("updated", "unchanged"):
+                return result
+            if result == "failed":
+                outcome = result
+        return outcome
+
+    async def fetch(self, peer: Peer, key: str, last_modified: datetime | None) -> str:
+        """
+        Fetch a board from one peer, returning "updated", "unchanged", "missing" or "failed".
+        """
+        await self.throttle(peer)
+        start = time.perf_counter()
+        try:
+            response = await self.client.get_board(key, peer.url, last_modified)
+        except httpx.HTTPError as e:
+            logger.info(f"Error fetching board {key} from {peer.url}: {e!r}")
+            self.record_attempt(peer, False, start)
+            return "failed"
+
+        self.record_attempt(peer, response.status_code < 500, start)
+        if response.status_code == 304:
+            return "unchanged"
+        if response.status_code != 200:
+            return "missing"
+
+        try:
+            await self.view.store_board(
+                key, response.content, response.headers.get("Spring-Signature")
+            )
+        except Spring83Exception as e:
+            if e.status == 409:
+                # The peer doesn't support conditional GETs, we already have this version
+                return "unchanged"
+            logger.info(f"Rejected board {key} from {peer.url}: {e}")
+            return "failed"
+
+        logger.info(f"Pulled board {key} from {peer.url}.")
+        return "updated"
+
+    async def reconcile(self, peer: Peer) -> Counter[str]:
+        """
+        Bring the stored boards in line with a peer's by comparing digests.
+
+        Only the buckets whose hashes differ are walked down to the boards, so
+        two servers that mostly agree exchange a handful of small requests.
+        Boards the peer has a newer version of are pulled, and boards it's
+        missing or behind on are queued in the outbox to be pushed to it.
+        """
+        outcomes: Counter[str] = Counter()
+        try:
+            pull, push = await self.compare(peer, "")
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            logger.info(f"Error reconciling with {peer.url}: {e!r}")
+            outcomes["failed"] += 1
+            return outcomes
+
+        stored = await sync_to_async(self.get_last_modified)(pull)
+        results = await asyncio.gather(*(self.fetch(peer, key, stored.get(key)) for key in pull))
+        outcomes.update(results)
+        if push:
+            outcomes["pushed"] = await sync_to_async(push_boards)(push, peer)
+        return outcomes
+
+    async def compare(self, peer: Peer, prefix: str) -> tuple[list[str], list[str]]:
+        """
+        Walk the digests under a prefix, returning the keys to pull from and push to the peer.
+        """
+        await self.throttle(peer)
+        start = time.perf_counter()
+        try:
+            response = await self.client.get_digest(peer.url, prefix)
+            response.raise_for_status()
+        except httpx.HTTPError:
+            self.record_attempt(peer, False, start)
+            raise
+        self.record_attempt(peer, True, start)
+        remote = response.json()
+        local = await sync_to_async(get_digest)(prefix)
+
+        if "boards" in remote and "boards" in local:
+            return compare_boards(local["boards"], remote["boards"])
+
+        buckets = local["buckets"].keys() | remote["buckets"].keys()
+        differing = [
+            bucket
+            for bucket in sorted(buckets)
+            if local["buckets"].get(bucket) != remote["buckets"].get(bucket)
+        ]
+        results = await asyncio.gather(*(self.compare(peer, bucket) for bucket in differing))
+        pull = [key for keys, _ in results for key in keys]
+        push = [key for _, keys in results for key in keys]
+        return pull, push
+
+
+def compare_boards(local: dict[str, int], remote: dict[str, int]) -> tuple[list[str], list[str]]:
+    """
+    Compare two listings of key to last-modified timestamp.
+
+    Returns the keys the remote side has newer versions of, and the keys the
+    local side has newer versions of. Boards past the expiry cutoff are left
+    out, neither side should be storing them for much longer.
+    """
+    cutoff = get_expiry_cutoff().timestamp()
+    pull = [
+        key for key, ts in remote.items() if ts >= cutoff and ts > local.get(key, float("-inf"))
+    ]
+    push = [
+        key for key, ts in local.items() if ts >= cutoff and ts > remote.get(key, float("-inf"))
+    ]
+    return pull, push
+
+
+def sync_boards(
+    keys: Iterable[str],
+    peers: list[Peer] | None = None,
+    max_concurrency: int | None = None,
+) -> Counter[str]:
+    """
+    Pull the given boards from peers, defaulting to every available peer in the realm.
+
+    The health of saved peers is updated from the outcome of every request.
+    """
+    if peers is None:
+        peers = list(Peer.objects.available())
+    if not peers:
+        return Counter()
+
+    async def run():
+        async with AsyncClient(max_concurrency) as client:
+            board_sync = BoardSync(client, peers)
+            return await board_sync.sync(keys), board_sync.attempts
+
+    # Unlike asyncio.run, this keeps the database work on the calling thread
+    outcomes, attempts = async_to_sync(run)()
+    Peer.objects.record_attempts(attempts)
+    return outcomes
+
+
+def reconcile(peers: list[Peer], max_concurrency: int | None = None) -> Counter[str]:
+    """
+    Reconcile the stored boards with each of the peers in turn.
+
+    The health of saved peers is updated from the outcome of every request.
+    """
+    if not peers:
+        return Counter()
+
+    async def run():
+        outcomes: Counter[str] = Counter()
+        async with AsyncClient(max_concurrency) as client:
+            board_sync = BoardSync(client, peers)
+            for peer in peers:
+                outcomes.update(await board_sync.reconcile(peer))
+        return outcomes, board_sync.attempts
+
+    outcomes, attempts = async_to_sync(run)()
+    Peer.objects.record_attempts(attempts)
+    return outcomes
@@ -1,78 +1,340 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import functools
 import logging
+import operator
 import random
+import time
 from datetime import timedelta
+from uuid import uuid4
 
+import httpx
+from apscheduler.events import (
+    EVENT_JOB_ERROR,
+    EVENT_JOB_EXECUTED,
+    EVENT_JOB_MAX_INSTANCES,
+    EVENT_JOB_MISSED,
+    EVENT_JOB_SUBMITTED,
+    JobEvent,
+)
 from apscheduler.schedulers.background import BackgroundScheduler
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
-from requests.exceptions import ConnectionError, HTTPError
 
-from letsdance.core.client import put_board
-from letsdance.core.constants import BOARD_TTL_DAYS, PUBLISH_BACKOFF_MAX_DAYS
-from letsdance.core.models import Board, Peer
+from letsdance.core import metrics
+from letsdance.core.cache import board_cache
+from letsdance.core.client import AsyncClient
+from letsdance.core.constants import (
+    PUBLISH_BACKOFF_MAX_DAYS,
+    PUBLISH_BACKOFF_SECONDS,
+    PUBLISH_CLAIM_SECONDS,
+    PUBLISH_DELAY_SECONDS,
+)
+from letsdance.core.models import Board, Delivery, FollowedKey, Peer, get_expiry_cutoff
+from letsdance.core.newsstand import newsstand
 
 logger = logging.getLogger(__name__)
 
 scheduler = BackgroundScheduler()
 
+JOB_OUTCOMES = {
+    EVENT_JOB_SUBMITTED: "submitted",
+    EVENT_JOB_EXECUTED: "executed",
+    EVENT_JOB_ERROR: "error",
+    EVENT_JOB_MISSED: "missed",
+    EVENT_JOB_MAX_INSTANCES: "skipped",
+}
+
+
+def record_job_event(event: JobEvent) -> None:
+    metrics.scheduler_events_total.inc(event.job_id, JOB_OUTCOMES[event.code])
+
+
+def count_running_jobs() -> float:
+    """
+    Return the number of job runs that have been submitted but haven't finished.
+    """
+    totals: collections.Counter[str] = collections.Counter()
+    for (_, outcome), shards in list(metrics.scheduler_events_total.children.items()):
+        totals[outcome] += shards.sum()[0]
+    return totals["submitted"] - totals["executed"] - totals["error"]
+
+
+scheduler.add_listener(record_job_event, functools.reduce(operator.or_, JOB_OUTCOMES))
+metrics.registry.gauge(
+    "letsdance_scheduler_jobs", "Jobs scheduled to run.", lambda: len(scheduler.get_jobs())
+)
+metrics.registry.gauge(
+    "letsdance_scheduler_jobs_running", "Scheduled job runs in progress.", count_running_jobs
+)
 
-@scheduler.scheduled_job("interval", hours=1)
-def expire_old_boards():
+
+@scheduler.scheduled_job("interval", minutes=5, max_instances=1, coalesce=True)
+def expire_old_boards(batch_size: int | None = None, pause: float | None = None) -> int:
     """
     Expire any boards that haven't been updated in a while.
+
+    Boards are deleted oldest first in small batches, sleeping in between so
+    that the write lock is never held for long and PUTs can interleave.
+    Returns the number of boards removed.
     """
+    batch_size = batch_size or settings.BOARD_EXPIRY_BATCH_SIZE
+    pause = settings.BOARD_EXPIRY_PAUSE if pause is None else pause
+
     logger.info("Checking for old boards to expire.")
-    min_age = timezone.now() - timedelta(days=BOARD_TTL_DAYS)
-    count, _ = Board.objects.filter(last_modified__lt=min_age).delete()
-    logger.info(f"Removed {count} boards due to TTL timeout.")
+    cutoff = get_expiry_cutoff()
+    total = 0
+    while True:
+        start = time.perf_counter()
+        keys = Board.objects.delete_oldest(batch_size, before=cutoff)
+        if not keys:
+            break
+
+        board_cache.delete_many(keys)
+        newsstand.discard(keys)
+        total += len(keys)
+        metrics.boards_expired_total.inc(amount=len(keys))
+
+        elapsed = (time.perf_counter() - start) * 1000
+        logger.info(f"Removed {len(keys)} boards due to TTL timeout in {elapsed:.1f}ms.")
+        if len(keys) < batch_size:
+            break
+        time.sleep(pause)
 
+    logger.info(f"Removed {total} boards due to TTL timeout.")
+    return total
 
-def broadcast_board(key: str) -> None:
+
+def broadcast_board(key: str, eta: int = PUBLISH_DELAY_SECONDS) -> int:
     """
-    Broadcast an uploaded board to peers in the server's realm.
+    Queue an uploaded board to be sent to peers in the server's realm.
+
+    Returns the number of deliveries that were added to the outbox.
     """
-    board = Board.objects.get(key=key)
+    if Delivery.objects.filter(key=key, attempts=0, claim="").exists():
+        # A broadcast is already waiting in the outbox, it will send the latest version
+        return 0
 
-    peer_count = min(round(Peer.objects.all().count() * 0.5), 5)
-    peers = Peer.objects.all().order_by("?")[:peer_count]
-    logger.info(f"Sharing board {key} with {len(peers)} peer(s).")
-    for peer in peers:
-        job_id = f"publish:{key}"
-        scheduler.add_job(
-            publish_board,
-            args=[board, peer.url],
-            id=job_id,
-            replace_existing=True,
-            trigger="date",
-        )
-        logger.info(f"Scheduled job {job_id} with eta 0s.")
+    # Half of the available peers, up to five
+    peers = Peer.objects.sample(5, fraction=0.5)
+    next_attempt = timezone.now() + timedelta(seconds=eta)
+    deliveries = [Delivery(key=key, peer=peer, next_attempt=next_attempt) for peer in peers]
+    Delivery.objects.bulk_create(
+        deliveries,
+        update_conflicts=True,
+        unique_fields=["key", "peer"],
+        update_fields=["next_attempt", "attempts", "claim"],
+    )
+    logger.info(f"Queued board {key} for {len(deliveries)} peer(s) with eta {eta}s.")
+    return len(deliveries)
 
 
-def publish_board(board: Board, url: str, backoff: int = 300):
+def push_boards(keys: list[str], peer: Peer) -> int:
     """
-    Attempt to publish a board to a peer with exponential backoff.
+    Queue boards to be sent to a single peer as soon as the outbox is next drained.
+
+    Returns the number of deliveries that were added to the outbox.
+    """
+    now = timezone.now()
+    deliveries = [Delivery(key=key, peer=peer, next_attempt=now) for key in keys]
+    Delivery.objects.bulk_create(
+        deliveries,
+        update_conflicts=True,
+        unique_fields=["key", "peer"],
+        update_fields=["next_attempt", "attempts", "claim"],
+    )
+    logger.info(f"Queued {len(deliveries)} board(s) for peer {peer}.")
+    return len(deliveries)
+
+
+def get_backoff(attempts: int) -> int | None:
+    """
+    Return the delay in seconds before the next attempt, or None to give up.
+    """
+    backoff = PUBLISH_BACKOFF_SECONDS * 2 ** (attempts - 1)
+    if backoff >= PUBLISH_BACKOFF_MAX_DAYS * 24 * 60 * 60:
+        return None
+    return int(backoff + backoff * random.random())
+
+
+def claim_deliveries(batch_size: int) -> list[Delivery]:
+    """
+    Claim a batch of deliveries from the outbox that are due to be sent.
+
+    Claimed rows are pushed back by PUBLISH_CLAIM_SECONDS, so if the process
+    dies before recording the outcome they will be picked up again later.
+    """
+    now = timezone.now()
+    claim = uuid4().hex
+    due = Delivery.objects.filter(next_attempt__lte=now).order_by("next_attempt")
+    Delivery.objects.filter(id__in=due.values("id")[:batch_size]).update(
+        claim=claim,
+        next_attempt=now + timedelta(seconds=PUBLISH_CLAIM_SECONDS),
+    )
+    return list(Delivery.objects.filter(claim=claim).select_related("peer"))
+
+
+async def publish_board(client: AsyncClient, board: Board, url: str) -> tuple[bool, float]:
+    """
+    Attempt to publish a board to a peer.
+
+    Returns whether the attempt should be retried, and how long it took.
     """
     logger.info(f"Publishing board {board} to peer {url}.")
+    start = time.perf_counter()
     try:
-        response = put_board(board, url)
-    except (HTTPError, ConnectionError) as e:
-        logger.info(f"Error publishing board: {e}")
-        retry = True
-    else:
-        logger.info(f"Response code received: {response.status_code}")
-        # Only retry for 5xx server errors
-        retry = 500 <= response.status_code <= 600
+        response = await client.put_board(board, url)
+    except httpx.HTTPError as e:
+        logger.info(f"Error publishing board: {e!r}")
+        elapsed = time.perf_counter() - start
+        metrics.publish_attempts_total.inc(url, "error")
+        metrics.publish_seconds.observe(elapsed, url)
+        return True, elapsed
 
+    logger.info(f"Response code received: {response.status_code}")
+    # Only retry for 5xx server errors, and when the peer is rate limiting us
+    retry = response.status_code == 429 or 500 <= response.status_code <= 600
+    elapsed = time.perf_counter() - start
     if retry:
-        backoff = int(backoff + backoff * random.random())
-        job_id = f"publish:{board.key}"
-        if backoff < PUBLISH_BACKOFF_MAX_DAYS * 24 * 60 * 60:
-            scheduler.add_job(
-                publish_board,
-                args=[board, url, backoff],
-                id=job_id,
-                trigger="date",
-                run_date=timezone.now() + timedelta(seconds=backoff),
+        result = "retry"
+    elif response.status_code < 400:
+        result = "success"
+    else:
+        result = "rejected"
+    metrics.publish_attempts_total.inc(url, result)
+    metrics.publish_seconds.observe(elapsed, url)
+    return retry, elapsed
+
+
+def publish_deliveries(deliveries: list[Delivery]) -> None:
+    """
+    Send a batch of claimed deliveries concurrently and record the outcomes.
+    """
+    now = timezone.now()
+    boards = Board.objects.in_bulk({delivery.key for delivery in deliveries}, field_name="key")
+
+    # Peers with an open circuit breaker are skipped until it closes
+    deferred = [d for d in deliveries if d.peer.breaker_until and d.peer.breaker_until > now]
+    deferred_ids = {delivery.id for delivery in deferred}
+    # Boards may have expired or been deleted since they were queued
+    sendable = [d for d in deliveries if d.key in boards and d.id not in deferred_ids]
+
+    async def run():
+        async with AsyncClient() as client:
+            return await asyncio.gather(
+                *(publish_board(client, boards[d.key], d.peer.url) for d in sendable)
+            )
+
+    results = asyncio.run(run()) if sendable else []
+
+    finished = {delivery.id for delivery in deliveries}
+    now = timezone.now()
+    with transaction.atomic():
+        for delivery in deferred:
+            finished.discard(delivery.id)
+            Delivery.objects.filter(id=delivery.id, claim=delivery.claim).update(
+                next_attempt=delivery.peer.breaker_until,
+                claim="",
+            )
+
+        Peer.objects.record_attempts(
+            (delivery.peer_id, not retry, elapsed, now)
+            for delivery, (retry, elapsed) in zip(sendable, results)
+        )
+
+        for delivery, (retry, _) in zip(sendable, results):
+            if not retry:
+                continue
+
+            backoff = get_backoff(delivery.attempts + 1)
+            if backoff is None:
+                logger.info(f"Backoff limit exceeded, giving up on delivery {delivery}.")
+                continue
+
+            finished.discard(delivery.id)
+            # Filtering on the claim leaves rows alone that were re-queued in the meantime
+            Delivery.objects.filter(id=delivery.id, claim=delivery.claim).update(
+                attempts=delivery.attempts + 1,
+                next_attempt=now + timedelta(seconds=backoff),
+                claim="",
             )
-            logger.info(f"Scheduled job {job_id} with eta {backoff}s.")
-        else:
-            logger.info(f"Backoff limit exceeded, giving up on job {job_id}")
+            logger.info(f"Retrying delivery {delivery} in {backoff}s.")
+
+        claims = {delivery.claim for delivery in deliveries}
+        Delivery.objects.filter(id__in=finished, claim__in=claims).delete()
+
+
+@scheduler.scheduled_job(
+    "interval",
+    seconds=settings.OUTBOX_DRAIN_INTERVAL,
+    max_instances=1,
+    coalesce=True,
+)
+def drain_outbox(batch_size: int | None = None) -> int:
+    """
+    Publish every board in the outbox that's due, one batch at a time.
+
+    Returns the number of deliveries that were attempted.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    count = 0
+    while deliveries := claim_deliveries(batch_size):
+        publish_deliveries(deliveries)
+        count += len(deliveries)
+        if len(deliveries) < batch_size:
+            break
+
+    if count:
+        logger.info(f"Attempted {count} delivery(s) from the outbox.")
+    return count
+
+
+@scheduler.scheduled_job(
+    "interval",
+    seconds=settings.SYNC_INTERVAL,
+    max_instances=1,
+    coalesce=True,
+)
+def sync_followed_boards() -> int:
+    """
+    Pull the latest version of every followed board from peers.
+
+    Returns the number of boards that were updated.
+    """
+    # Imported here because storing a board goes through the views, which import this module
+    from letsdance.core.sync import sync_boards
+
+    keys = list(FollowedKey.objects.values_list("key", flat=True))
+    if not keys:
+        return 0
+
+    outcomes = sync_boards(keys)
+    logger.info(f"Synced {len(keys)} followed board(s): {dict(outcomes)}.")
+    return outcomes["updated"]
+
+
+@scheduler.scheduled_job(
+    "interval",
+    seconds=settings.RECONCILE_INTERVAL,
+    max_instances=1,
+    coalesce=True,
+)
+def reconcile_peers(peer_count: int | None = None) -> int:
+    """
+    Reconcile the stored boards with a few peers, picked at random and weighted by health.
+
+    Returns the number of boards that were pulled or queued to be pushed.
+    """
+    # Imported here because storing a board goes through the views, which import this module
+    from letsdance.core.sync import reconcile
+
+    peers = Peer.objects.sample(peer_count or settings.RECONCILE_PEERS)
+    if not peers:
+        return 0
+
+    outcomes = reconcile(peers)
+    logger.info(f"Reconciled with {len(peers)} peer(s): {dict(outcomes)}.")
+    return outcomes["updated"] + outcomes["pushed"]
@@ -16,13 +16,16 @@ class UniqueFaker(factory.Faker):
 
 class BoardFactory(DjangoModelFactory):
 
-    content = Faker("text")
+    content = factory.LazyAttribute(lambda board: board.text.encode())
     key = UniqueFaker("hexify", text=f"{'^'*58}ed{now.year}")
     signature = Faker("hexify", text="^" * 128)
 
     class Meta:
         model = Board
 
+    class Params:
+        text = Faker("text")
+
 
 class PeerFactory(DjangoModelFactory):
 
@@ -0,0 +1,93 @@
+import asyncio
+import importlib
+from unittest import mock
+
+from letsdance.core.asgi import BodySizeLimit
+from letsdance.core.constants import TEST_KEY_PUBLIC
+
+
+def call(scope: dict, chunks: list[bytes]) -> tuple[list[dict], list[bytes]]:
+    """
+    Send a request through BodySizeLimit, returning the messages sent and the body the app read.
+    """
+    received: list[bytes] = []
+    sent: list[dict] = []
+
+    async def app(scope, receive, send):
+        while True:
+            message = await receive()
+            received.append(message["body"])
+            if not message["more_body"]:
+                break
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    async def receive():
+        body = chunks.pop(0)
+        return {"type": "http.request", "body": body, "more_body": bool(chunks)}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(BodySizeLimit(app, max_bytes=10)(scope, receive, send))
+    return sent, received
+
+
+def test_body_size_limit():
+    """
+    PUT bodies over the limit should get a 413 before reaching the app, others pass through.
+    """
+    scope = {"type": "http", "method": "PUT", "headers": []}
+
+    sent, received = call(scope, [b"12345", b"12345"])
+    assert sent[0]["status"] == 200
+    assert received == [b"12345", b"12345"]
+
+    # A chunked body is cut off as soon as it goes over
+    chunks = [b"12345", b"123456", b"never read"]
+    sent, received = call(scope, chunks)
+    assert sent[0]["status"] == 413
+    assert (b"spring-version", b"83") in sent[0]["headers"]
+    assert received == []
+    assert chunks == [b"never read"]
+
+    # So is one that says it's too large, without reading any of it
+    scope["headers"] = [(b"content-length", b"11")]
+    chunks = [b"1"]
+    sent, received = call(scope, chunks)
+    assert sent[0]["status"] == 413
+    assert chunks == [b"1"]
+
+    # Only uploads are limited
+    sent, received = call({**scope, "method": "POST"}, [b"x" * 20])
+    assert sent[0]["status"] == 200
+
+
+@mock.patch("letsdance.core.tasks.scheduler.add_job")
+@mock.patch("letsdance.core.tasks.scheduler.start")
+def test_application(start, add_job):
+    """
+    The ASGI entry point should serve boards and start the background jobs.
+    """
+    application = importlib.import_module("letsdance.asgi").application
+    start.assert_called_once()
+    add_job.assert_called_once()
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": f"/{TEST_KEY_PUBLIC}",
+        "query_string": b"",
+        "headers": [],
+    }
+    sent: list[dict] = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    assert sent[0]["status"] == 200
+    assert (b"Spring-Version", b"83") in sent[0]["headers"]
+    assert b"<time" in sent[1]["body"]
@@ -0,0 +1,143 @@
+import asyncio
+import copy
+from unittest import mock
+
+import pytest
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.db import OperationalError, connections
+from django.db.backends.sqlite3 import base
+
+from letsdance.core.backends.sqlite3.base import DatabaseWrapper
+from letsdance.core.models import Board
+
+
+@pytest.fixture
+def settings_dict(tmp_path):
+    return {
+        **connections["default"].settings_dict,
+        **copy.deepcopy(settings.DATABASE_PROFILES["production"]),
+        "NAME": str(tmp_path / "db.sqlite3"),
+    }
+
+
+def test_pragmas(settings_dict):
+    """
+    The configured pragmas should be applied to every new connection.
+    """
+    wrapper = DatabaseWrapper(settings_dict)
+    try:
+        with wrapper.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            assert cursor.fetchone() == ("wal",)
+            cursor.execute("PRAGMA synchronous")
+            assert cursor.fetchone() == (1,)
+            cursor.execute("PRAGMA busy_timeout")
+            assert cursor.fetchone() == (5000,)
+    finally:
+        wrapper.close()
+
+
+def test_immediate_transactions(settings_dict):
+    """
+    Transactions should hold the write lock from the start.
+    """
+    settings_dict["OPTIONS"]["pragmas"]["busy_timeout"] = 10
+    first = DatabaseWrapper(settings_dict)
+    second = DatabaseWrapper(settings_dict)
+    try:
+        first.ensure_connection()
+        first._start_transaction_under_autocommit()
+        with pytest.raises(OperationalError, match="database is locked"):
+            second.ensure_connection()
+            second._start_transaction_under_autocommit()
+    finally:
+        first.close()
+        second.close()
+
+
+def test_pooled_connections(settings_dict):
+    """
+    Closed connections should go back to the pool and be handed out again.
+    """
+    first = DatabaseWrapper(settings_dict)
+    first.ensure_connection()
+    connection = first.connection
+    first.close()
+
+    second = DatabaseWrapper(settings_dict)
+    try:
+        second.ensure_connection()
+        assert second.connection is connection
+        with second.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            assert cursor.fetchone() == (5000,)
+    finally:
+        second.close()
+
+
+def test_pooled_connections_rolled_back(settings_dict):
+    """
+    A connection closed in the middle of a transaction shouldn't carry it over.
+    """
+    first = DatabaseWrapper(settings_dict)
+    with first.cursor() as cursor:
+        cursor.execute("CREATE TABLE test (id INTEGER)")
+    first._start_transaction_under_autocommit()
+    with first.cursor() as cursor:
+        cursor.execute("INSERT INTO test VALUES (1)")
+    first.close()
+
+    second = DatabaseWrapper(settings_dict)
+    try:
+        with second.cursor() as cursor:
+            assert not second.connection.in_transaction
+            cursor.execute("SELECT COUNT(*) FROM test")
+            assert cursor.fetchone() == (0,)
+    finally:
+        second.close()
+
+
+@pytest.mark.django_db
+def test_asgi_reuses_connections(settings_dict):
+    """
+    Requests served through the ASGI application should share pooled connections.
+
+    Every ASGI request runs its database queries in a thread of its own, so
+    Django's per-thread persistent connections would open one per request.
+    """
+    with DatabaseWrapper(settings_dict).schema_editor() as editor:
+        editor.create_model(Board)
+
+    application = get_asgi_application()
+    key = "ab" * 32
+
+    async def request() -> int:
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": f"/{key}",
+            "query_string": b"",
+            "headers": [],
+        }
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        await application(scope, receive, send)
+        return sent[0]["status"]
+
+    new_connection = base.DatabaseWrapper.get_new_connection
+    with (
+        mock.patch.dict(connections.settings, {"default": settings_dict}),
+        mock.patch.object(
+            base.DatabaseWrapper, "get_new_connection", autospec=True, side_effect=new_connection
+        ) as get_new_connection,
+    ):
+        for _ in range(20):
+            assert asyncio.run(request()) == 404
+    assert get_new_connection.call_count == 1
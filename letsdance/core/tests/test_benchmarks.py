@@ -0,0 +1,57 @@
+import pytest
+
+from letsdance.core.benchmarks import (
+    BenchmarkResult,
+    bench_dates,
+    compare_results,
+    load_results,
+    save_results,
+)
+
+
+def test_percentile():
+    """
+    Percentiles should use the nearest-rank method.
+    """
+    result = BenchmarkResult("test", [float(i) for i in range(1, 101)])
+    assert result.percentile(50) == 50.0
+    assert result.percentile(95) == 95.0
+    assert result.percentile(100) == 100.0
+    assert result.ops_per_second == pytest.approx(100 / 5050)
+
+
+def test_save_and_compare(tmp_path):
+    """
+    A saved run should be usable as the baseline for the next one.
+    """
+    path = tmp_path / "baseline.json"
+    save_results(path, bench_dates(0.01), duration=0.01)
+    baseline = load_results(path)
+    assert set(baseline) == {"date_to_header", "date_from_header"}
+    assert baseline["date_to_header"]["iterations"] >= 5
+
+    comparisons = compare_results(baseline, bench_dates(0.01))
+    assert set(comparisons) == set(baseline)
+
+
+def test_compare_regression():
+    """
+    Only results that lost more than the threshold should count as regressions.
+    """
+    baseline = {
+        "fast": {"ops_per_second": 100.0},
+        "slow": {"ops_per_second": 100.0},
+        "failed": {"ops_per_second": 100.0},
+    }
+    results = [
+        BenchmarkResult("fast", [0.01] * 100),
+        BenchmarkResult("slow", [0.02] * 100),
+        BenchmarkResult("failed", [float("nan")]),
+        BenchmarkResult("new", [0.01] * 100),
+    ]
+    comparisons = compare_results(baseline, results)
+    assert set(comparisons) == {"fast", "slow"}
+    assert comparisons["slow"].change == pytest.approx(-0.5)
+    assert not comparisons["fast"].is_regression(0.2)
+    assert comparisons["slow"].is_regression(0.2)
+    assert not comparisons["slow"].is_regression(0.6)
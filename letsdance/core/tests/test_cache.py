@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from letsdance.core.cache import BoardCache, board_cache
+from letsdance.core.tasks import expire_old_boards
+from letsdance.core.tests.factories import BoardFactory
+from letsdance.core.utils import LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    """
+    The oldest unused entry should be evicted once the cache is full.
+    """
+    cache = LRUCache(2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    cache.set("c", 3)
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+
+
+def test_lru_cache_bounded_by_size():
+    """
+    The cache should stay within its size budget when values have different sizes.
+    """
+    cache = LRUCache(10, sizeof=len)
+    cache.set("a", "xxxx")
+    cache.set("b", "xxxx")
+    cache.set("c", "xxxx")
+    assert cache.size == 8
+    assert "a" not in cache
+
+    # Values larger than the whole cache are never stored
+    cache.set("d", "x" * 11)
+    assert "d" not in cache
+
+
+def test_board_cache_warm():
+    """
+    Warming the cache should preload the most recently modified boards.
+    """
+    old = BoardFactory(last_modified=timezone.now() - timedelta(days=1))
+    new = BoardFactory(last_modified=timezone.now())
+
+    cache = BoardCache(1024 * 1024)
+    assert cache.warm(1) == 1
+    assert cache.get(new.key) is not None
+    assert cache.get(old.key) is None
+
+
+def test_board_cache_ttl(settings):
+    """
+    Local entries should stop being served once they're older than the TTL.
+    """
+    board = BoardFactory()
+
+    cache = BoardCache(1024 * 1024)
+    cache.set(board)
+    assert cache.get(board.key) is not None
+
+    settings.BOARD_CACHE_TTL_SECONDS = 0
+    cache.set(board)
+    assert cache.get(board.key) is None
+    assert len(cache.local) == 0
+
+
+def test_board_cache_shared(settings):
+    """
+    Boards should be stored in the django cache when an alias is configured.
+    """
+    board = BoardFactory()
+
+    cache = BoardCache(1024 * 1024, alias="default")
+    cache.set(board)
+    assert len(cache.local) == 0
+
+    cached_board = cache.get(board.key)
+    assert cached_board is not None
+    assert cached_board.content == board.content
+
+    cache.delete(board.key)
+    assert cache.get(board.key) is None
+
+
+def test_expire_old_boards_invalidates_cache():
+    """
+    Expired boards should also be removed from the cache.
+    """
+    board = BoardFactory(last_modified=timezone.now() - timedelta(days=100))
+    board_cache.set(board)
+
+    expire_old_boards()
+    assert board_cache.get(board.key) is None
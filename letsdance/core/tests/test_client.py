@@ -0,0 +1,101 @@
+import asyncio
+from unittest import mock
+
+import httpx
+from django.test import override_settings
+from django.utils import timezone
+
+from letsdance.core import client
+from letsdance.core.client import AsyncClient
+from letsdance.core.models import Board
+
+
+def make_board() -> Board:
+    return Board(
+        key="ab" * 32,
+        content=b"<time datetime='2022-07-01T00:00:00Z'>",
+        signature="cd" * 64,
+        last_modified=timezone.now(),
+    )
+
+
+def test_session_shared():
+    """
+    Every request should go through the same pooled session.
+    """
+    client.close_session()
+    session = client.get_session()
+    assert client.get_session() is session
+
+    adapter = session.get_adapter("https://example.com")
+    assert adapter._pool_maxsize == client.settings.PEER_POOL_MAXSIZE  # type: ignore
+    client.close_session()
+    assert client.get_session() is not session
+
+
+@override_settings(PEER_CONNECT_TIMEOUT=1.5, PEER_READ_TIMEOUT=7.0)
+def test_get_board():
+    """
+    Fetching a board should send a GET with the configured timeouts.
+    """
+    session = client.get_session()
+    with mock.patch.object(session, "get") as get:
+        client.get_board("ab" * 32, "https://example.com/path")
+
+    get.assert_called_once()
+    args, kwargs = get.call_args
+    assert args == (f"https://example.com/{'ab' * 32}",)
+    assert kwargs["timeout"] == (1.5, 7.0)
+    assert kwargs["headers"]["Spring-Version"] == "83"
+
+
+def test_put_board_many():
+    """
+    A board should be sent to every peer, with errors returned per peer.
+    """
+    board = make_board()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "down.example.com":
+            raise httpx.ConnectError("Connection refused", request=request)
+        assert request.method == "PUT"
+        assert request.headers["Spring-Signature"] == board.signature
+        assert request.content == board.content
+        return httpx.Response(204)
+
+    async def run():
+        async with AsyncClient(transport=httpx.MockTransport(handler)) as async_client:
+            return await async_client.put_board_many(
+                board, ["https://up.example.com", "https://down.example.com"]
+            )
+
+    responses = asyncio.run(run())
+    assert responses["https://up.example.com"].status_code == 204  # type: ignore
+    assert isinstance(responses["https://down.example.com"], httpx.ConnectError)
+
+
+def test_put_board_many_concurrency_limit():
+    """
+    No more than max_concurrency requests should be in flight at once.
+    """
+    board = make_board()
+    in_flight = 0
+    max_in_flight = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(in_flight, max_in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(204)
+
+    async def run():
+        transport = httpx.MockTransport(handler)
+        async with AsyncClient(max_concurrency=3, transport=transport) as async_client:
+            urls = [f"https://peer{i}.example.com" for i in range(20)]
+            return await async_client.put_board_many(board, urls)
+
+    responses = asyncio.run(run())
+    assert len(responses) == 20
+    assert max_in_flight == 3
@@ -0,0 +1,109 @@
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from letsdance.core.crypto import verify_signature
+from letsdance.core.models import Board
+from letsdance.core.parsing import find_time_tags
+
+
+class TestSeedBoards(TestCase):
+    def test_bulk(self):
+        """
+        Boards should be inserted in batches, signed and spread over the date range.
+        """
+        stdout = StringIO()
+        start = timezone.now() - timedelta(days=7, seconds=1)
+        call_command("seed_boards", count=5, days=7, batch_size=2, workers=1, stdout=stdout)
+
+        assert "Generated 5 board(s)" in stdout.getvalue()
+        boards = Board.objects.all()
+        assert boards.count() == 5
+        assert Board.objects.stored_count() == 5
+        for board in boards:
+            assert start <= board.last_modified <= timezone.now()
+            assert verify_signature(board.signature, board.key, bytes(board.content))
+            assert find_time_tags(board.text) == [f"{board.last_modified:%Y-%m-%dT%H:%M:%SZ}"]
+            assert board.content_gzip
+
+    def test_workers_differ(self):
+        """
+        Each worker process should generate its own content, not copies of another's.
+        """
+        call_command("seed_boards", count=8, batch_size=1, workers=2, stdout=StringIO())
+        contents = [bytes(content) for content in Board.objects.values_list("content", flat=True)]
+        assert len(set(contents)) == 8
+
+
+def give_up(*args) -> None:
+    pass
+
+
+class TestGenerateKeypair(TestCase):
+    def test_no_workers(self):
+        """
+        Searching with no workers would never finish, so it should be refused.
+        """
+        with self.assertRaises(CommandError):
+            call_command("generate_keypair", workers=0, stderr=StringIO())
+
+    @mock.patch("letsdance.core.management.commands.generate_keypair.grind", give_up)
+    def test_workers_died(self):
+        """
+        The command should fail, not wait forever, once every worker has exited.
+        """
+        with self.assertRaisesMessage(CommandError, "without finding a key"):
+            call_command("generate_keypair", workers=2, report_interval=0.05, stderr=StringIO())
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"Hello World!"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestLoadtest(TestCase):
+    def test_loadtest(self):
+        """
+        Every connection should be held open and make repeated requests.
+        """
+        server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+        server.daemon_threads = True
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        stdout = StringIO()
+        call_command(
+            "loadtest",
+            server_url=f"http://127.0.0.1:{server.server_port}",
+            connections=3,
+            interval=0.05,
+            duration=0.3,
+            stdout=stdout,
+        )
+        output = stdout.getvalue()
+        assert "Peak open connections : 3" in output
+        assert "Errors                : 0" in output
+
+    def test_https(self):
+        """
+        Only plain HTTP is spoken, so other URLs should be refused.
+        """
+        with self.assertRaises(CommandError):
+            call_command("loadtest", server_url="https://example.com", stdout=StringIO())
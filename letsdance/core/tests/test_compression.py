@@ -0,0 +1,79 @@
+import gzip
+
+import pytest
+from django.utils import timezone
+
+from letsdance.core.compression import choose_encoding, compress, parse_accept_encoding
+from letsdance.core.utils import generate_fake_board_content
+
+
+def test_compress_round_trip():
+    """
+    Compressed variants should decode back to the original content.
+    """
+    content = generate_fake_board_content(timezone.now()).encode()
+    variants = compress(content)
+    assert gzip.decompress(variants["gzip"]) == content
+    assert len(variants["gzip"]) < len(content)
+
+
+def test_compress_brotli():
+    """
+    Brotli variants should be included when the package is installed.
+    """
+    brotli = pytest.importorskip("brotli")
+    content = generate_fake_board_content(timezone.now()).encode()
+    variants = compress(content)
+    assert brotli.decompress(variants["br"]) == content
+
+
+def test_compress_skips_larger_variants():
+    """
+    Variants that aren't smaller than the content shouldn't be kept.
+    """
+    assert compress(b"hi") == {}
+
+
+def test_compress_stable():
+    """
+    Compressing the same content twice should give the same bytes.
+    """
+    content = b"<time datetime='2022-07-01T00:00:00Z'>" * 20
+    assert compress(content) == compress(content)
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding("gzip, deflate;q=0.5, br;q=0 , *;q=0.1") == {
+        "gzip": 1.0,
+        "deflate": 0.5,
+        "br": 0.0,
+        "*": 0.1,
+    }
+    assert parse_accept_encoding("") == {}
+    assert parse_accept_encoding("gzip;q=bogus") == {"gzip": 0.0}
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("", None),
+        ("identity", None),
+        ("gzip", "gzip"),
+        ("gzip, br", "br"),
+        ("br;q=0.5, gzip", "gzip"),
+        ("br;q=0, gzip;q=0", None),
+        ("*", "br"),
+        ("*;q=0.5, br;q=0", "gzip"),
+        ("GZIP", "gzip"),
+    ],
+)
+def test_choose_encoding(header, expected):
+    assert choose_encoding(header, {"gzip", "br"}) == expected
+
+
+def test_choose_encoding_unavailable():
+    """
+    Only variants that exist should be chosen.
+    """
+    assert choose_encoding("br, gzip;q=0.5", {"gzip"}) == "gzip"
+    assert choose_encoding("br", {}) is None
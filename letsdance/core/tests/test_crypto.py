@@ -2,9 +2,15 @@ import pytest
 from freezegun import freeze_time
 
 from letsdance.core.crypto import (
+    clear_caches,
     dump_public_key,
     generate_private_key,
+    get_cache_stats,
+    get_valid_public_key_suffixes,
+    is_valid_public_key_bytes,
     validate_public_key,
+    verify_signature,
+    verify_signatures,
 )
 
 
@@ -44,3 +50,99 @@ def test_validate_public_key_valid(public_key, date):
     """
     key = f"{public_key[:-7]}83e{date}"
     assert validate_public_key(key)
+
+
+def test_verify_signature_cached():
+    """
+    Verifying the same content twice should be served from the cache.
+    """
+    clear_caches()
+    private_key = generate_private_key()
+    key = dump_public_key(private_key.public_key())
+    data = b"Hello World!"
+    signature = private_key.sign(data).hex()
+
+    assert verify_signature(signature, key, data)
+    assert verify_signature(signature, key, data)
+
+    stats = get_cache_stats()
+    assert stats["signatures"] == {"hits": 1, "misses": 1, "size": 1}
+    assert stats["public_keys"]["misses"] == 1
+
+
+def test_verify_signature_cached_tampered():
+    """
+    A cached signature should not be accepted for different content.
+    """
+    clear_caches()
+    private_key = generate_private_key()
+    key = dump_public_key(private_key.public_key())
+    data = b"Hello World!"
+    signature = private_key.sign(data).hex()
+
+    assert verify_signature(signature, key, data)
+    assert not verify_signature(signature, key, data + b"!")
+    assert not verify_signature(signature, key, data + b"!")
+    assert get_cache_stats()["signatures"]["size"] == 1
+
+
+def test_verify_signature_malformed():
+    """
+    A signature or key that isn't valid hex should be rejected, not raise.
+    """
+    private_key = generate_private_key()
+    key = dump_public_key(private_key.public_key())
+    data = b"Hello World!"
+    signature = private_key.sign(data).hex()
+
+    assert not verify_signature("zz" + signature[2:], key, data)
+    assert not verify_signature(signature[:-1], key, data)
+    assert not verify_signature(signature, "zz" + key[2:], data)
+
+
+@pytest.mark.parametrize("use_threads", [True, False])
+def test_verify_signatures(use_threads):
+    """
+    Bulk verification should return one result per item, in the original order.
+    """
+    items = []
+    expected = []
+    for i in range(20):
+        private_key = generate_private_key()
+        key = dump_public_key(private_key.public_key())
+        data = f"Board {i}".encode()
+        signature = private_key.sign(data).hex()
+        if i % 3 == 0:
+            data += b"!"
+        items.append((signature, key, data))
+        expected.append(i % 3 != 0)
+
+    results = verify_signatures(iter(items), workers=2, chunk_size=3, use_threads=use_threads)
+    assert list(results) == expected
+
+
+@freeze_time("2022-05-20")
+@pytest.mark.parametrize(
+    "date,valid",
+    [
+        ("0521", False),
+        ("0422", False),
+        ("0522", True),
+        ("1223", True),
+        ("0524", True),
+        ("0624", False),
+    ],
+)
+def test_is_valid_public_key_bytes(public_key, date, valid):
+    """
+    The raw byte check should agree with the hex/regex validation.
+    """
+    suffixes = get_valid_public_key_suffixes()
+    assert len(suffixes) == 25
+
+    key = f"{public_key[:-7]}83e{date}"
+    assert validate_public_key(key) == valid
+    assert is_valid_public_key_bytes(bytes.fromhex(key), suffixes) == valid
+
+    key = f"{public_key[:-7]}93e{date}"
+    assert not is_valid_public_key_bytes(bytes.fromhex(key), suffixes)
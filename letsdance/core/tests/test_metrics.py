@@ -0,0 +1,98 @@
+import threading
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from letsdance.core import metrics
+from letsdance.core.metrics import Counter, Histogram, Registry
+from letsdance.core.tasks import expire_old_boards
+from letsdance.core.tests.factories import BoardFactory
+
+
+def test_counter():
+    """
+    Increments from every thread should be added up, separately for each label.
+    """
+    counter = Counter("requests_total", "Requests.", ["status"])
+
+    def work():
+        for _ in range(1000):
+            counter.inc("200")
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.inc("404", amount=2)
+
+    assert list(counter.collect()) == [
+        'requests_total{status="200"} 4000',
+        'requests_total{status="404"} 2',
+    ]
+
+
+def test_histogram():
+    """
+    Buckets should be cumulative, ending with +Inf, the sum and the count.
+    """
+    histogram = Histogram("latency_seconds", "Latency.", buckets=[0.1, 1.0])
+    for value in [0.05, 0.1, 0.5, 5.0]:
+        histogram.observe(value)
+
+    assert list(histogram.collect()) == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 5.65",
+        "latency_seconds_count 4",
+    ]
+
+
+def test_render():
+    """
+    Every metric should be rendered with its help and type, and label values escaped.
+    """
+    registry = Registry()
+    registry.counter("peer_errors_total", "Errors.", ["peer"]).inc('say "hi"\n')
+    registry.gauge("answer", "The answer.", lambda: 42)
+
+    assert registry.render() == (
+        "# HELP peer_errors_total Errors.\n"
+        "# TYPE peer_errors_total counter\n"
+        'peer_errors_total{peer="say \\"hi\\"\\n"} 1\n'
+        "# HELP answer The answer.\n"
+        "# TYPE answer gauge\n"
+        "answer 42\n"
+    )
+
+
+class TestMetricsView(TestCase):
+    def test_disabled(self):
+        """
+        The endpoint is opt-in.
+        """
+        response = self.client.get(reverse("metrics"))
+        assert response.status_code == 404
+
+    @override_settings(METRICS_ENABLED=True)
+    def test_enabled(self):
+        """
+        Requests and jobs should show up in the metrics.
+        """
+        board = BoardFactory()
+        before = metrics.gets_total.labels("miss").sum()[0]
+        self.client.get(reverse("board", args=[board.key]))
+        self.client.get(reverse("board", args=[board.key]))
+        self.client.get(reverse("index"))
+        expire_old_boards()
+        assert metrics.gets_total.labels("miss").sum()[0] == before + 1
+
+        response = self.client.get(reverse("metrics"))
+        assert response.status_code == 200
+        assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+        content = response.content.decode()
+        assert 'letsdance_gets_total{result="hit"}' in content
+        assert 'letsdance_index_render_seconds_count{page="first"}' in content
+        assert "letsdance_boards_expired_total" in content
+        assert "letsdance_scheduler_jobs " in content
@@ -0,0 +1,138 @@
+import collections
+import random
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from letsdance.core.constants import PEER_BREAKER_THRESHOLD
+from letsdance.core.models import (
+    Board,
+    Counter,
+    DigestBucket,
+    Peer,
+    hash_board,
+    weighted_sample,
+)
+from letsdance.core.tests.factories import BoardFactory, PeerFactory
+
+
+class TestBoard(TestCase):
+    def test_delete_oldest(self):
+        """
+        The least recently modified boards should go first, and be taken off the counter.
+        """
+        now = timezone.now()
+        boards = [BoardFactory(last_modified=now - timedelta(days=i)) for i in range(5)]
+        Counter.objects.add(Counter.BOARDS, 5)
+
+        assert Board.objects.delete_oldest(2) == [boards[4].key, boards[3].key]
+        assert Board.objects.stored_count() == 3
+
+        assert Board.objects.delete_oldest(10, before=now - timedelta(hours=12)) == [
+            boards[2].key,
+            boards[1].key,
+        ]
+        assert Board.objects.stored_count() == 1
+        assert Board.objects.fill_level() > 0
+        assert list(Board.objects.all()) == [boards[0]]
+
+    def test_track(self):
+        """
+        The digest buckets should hold the XOR of the hashes of the current versions.
+        """
+        boards = BoardFactory.create_batch(20, last_modified=timezone.now())
+        Board.objects.track(added=[(board.key, board.last_modified) for board in boards])
+        later = boards[0].last_modified + timedelta(minutes=1)
+        Board.objects.track(
+            added=[(boards[0].key, later)], removed=[(boards[0].key, boards[0].last_modified)]
+        )
+        Board.objects.track(removed=[(boards[1].key, boards[1].last_modified)])
+
+        expected: collections.defaultdict[str, int] = collections.defaultdict(int)
+        for board in boards[2:]:
+            expected[board.key[:2]] ^= hash_board(board.key, board.last_modified)
+        expected[boards[0].key[:2]] ^= hash_board(boards[0].key, later)
+
+        buckets = dict(DigestBucket.objects.exclude(value=0).values_list("prefix", "value"))
+        assert buckets == {prefix: value for prefix, value in expected.items() if value}
+        assert Board.objects.stored_count() == 19
+
+
+class TestPeer(TestCase):
+    def test_record_attempt(self):
+        """
+        Latency and failure rate should be tracked as moving averages.
+        """
+        peer = PeerFactory()
+        peer.record_attempt(True, 1.0)
+        assert peer.latency == 1.0
+        assert peer.failure_rate == 0.0
+        assert peer.last_success is not None
+
+        peer.record_attempt(True, 2.0)
+        assert 1.0 < peer.latency < 2.0
+
+        peer.record_attempt(False, 5.0)
+        assert 1.0 < peer.latency < 2.0
+        assert 0.0 < peer.failure_rate < 1.0
+        assert peer.consecutive_failures == 1
+
+    def test_circuit_breaker(self):
+        """
+        The breaker should open after repeated failures and close on success.
+        """
+        peer = PeerFactory()
+        for _ in range(PEER_BREAKER_THRESHOLD - 1):
+            peer.record_attempt(False, 5.0)
+        assert peer.breaker_state == "closed"
+
+        peer.record_attempt(False, 5.0)
+        assert peer.breaker_state == "open"
+        first_cooldown = peer.breaker_until - timezone.now()
+
+        peer.record_attempt(False, 5.0)
+        assert peer.breaker_until - timezone.now() > first_cooldown
+
+        peer.breaker_until = timezone.now() - timedelta(seconds=1)
+        assert peer.breaker_state == "half-open"
+
+        peer.record_attempt(True, 0.1)
+        assert peer.breaker_state == "closed"
+        assert peer.breaker_until is None
+
+    def test_sample_skips_open_breaker(self):
+        """
+        Peers whose breaker is open should never be selected.
+        """
+        healthy = PeerFactory()
+        PeerFactory(
+            consecutive_failures=PEER_BREAKER_THRESHOLD,
+            breaker_until=timezone.now() + timedelta(hours=1),
+        )
+        for _ in range(20):
+            assert Peer.objects.sample(2) == [healthy]
+
+    @mock.patch("letsdance.core.models.PEER_SAMPLE_CANDIDATES", 3)
+    def test_sample_candidates(self):
+        """
+        Only a bounded number of peers should be loaded and weighed for a sample.
+        """
+        PeerFactory.create_batch(10)
+        with mock.patch("letsdance.core.models.weighted_sample", wraps=weighted_sample) as sample:
+            assert len(Peer.objects.sample(5)) == 3
+        assert len(sample.call_args.args[0]) == 3
+
+    def test_sample_prefers_healthy(self):
+        """
+        Fast, reliable peers should be picked much more often than slow, flaky ones.
+        """
+        random.seed(83)
+        fast = PeerFactory(latency=0.1)
+        slow = PeerFactory(latency=4.0, failure_rate=0.5)
+
+        counts: collections.Counter = collections.Counter()
+        for _ in range(1000):
+            counts.update(Peer.objects.sample(1))
+        assert counts[fast] > 10 * counts[slow] > 0
@@ -0,0 +1,169 @@
+import random
+from datetime import datetime, timezone
+
+import pytest
+from parsel import Selector
+
+from letsdance.core.parsing import find_time_tags, parse_timestamp
+
+
+def parsel_time_tags(content: str) -> list[str | None]:
+    """
+    The reference implementation that find_time_tags() replaced.
+    """
+    return [tag.attrib.get("datetime", None) for tag in Selector(content).css("time")]
+
+
+def random_time_tag(rng: random.Random) -> str:
+    name = rng.choice(["time", "TIME", "Time"])
+    value = rng.choice(["2022-06-17T12:30:00Z", "2022-6-1T1:2:3Z", "garbage", "", "a&amp;b"])
+    datetime_attribute = rng.choice(
+        [
+            f'datetime="{value}"',
+            f"datetime='{value}'",
+            f"DateTime = '{value}'",
+            f"datetime={value or 'x'}",
+            "datetime",
+            "",
+        ]
+    )
+    attributes = [datetime_attribute, 'class="x>y"', "title='<time datetime=z>'", "hidden"]
+    rng.shuffle(attributes)
+    attributes = attributes[: rng.randint(0, len(attributes))]
+    return f"<{name} {' '.join(attributes)}{rng.choice(['', ' ', '/'])}>"
+
+
+def random_board(rng: random.Random) -> str:
+    parts = []
+    for _ in range(rng.randint(0, 12)):
+        time_tag = random_time_tag(rng)
+        parts.append(
+            rng.choice(
+                [
+                    time_tag,
+                    time_tag,
+                    "</time>",
+                    "Hello <b>World</b>! ",
+                    "a < b > c ",
+                    '<p class="intro">',
+                    '<a href="https://example.com" title="2 > 1">link</a>',
+                    f'<a title="{time_tag}">',
+                    f"<!-- {time_tag} -->",
+                    f"<script>var s = '{time_tag}';</script>",
+                    f"<style>/* {time_tag} */</style>",
+                    f"<textarea>{time_tag}</textarea>",
+                    f"<title>{time_tag}</title>",
+                    "<!DOCTYPE html>",
+                    "<timestamp datetime=nope>",
+                    "<br/>",
+                    "</ ",
+                    "</<",
+                    "</'",
+                    "&amp; &lt;time&gt; ",
+                    "\n",
+                    "\r\n",
+                    "\x00",
+                    f"<time/={time_tag[1:]}",
+                    f"<time\r{time_tag[5:]}",
+                ]
+            )
+        )
+    return "".join(parts)
+
+
+def test_find_time_tags_matches_parsel():
+    """
+    The streaming extractor should find the same <time> tags as lxml on fuzzed boards.
+    """
+    rng = random.Random(83)
+    for _ in range(2000):
+        content = random_board(rng)
+        assert find_time_tags(content) == parsel_time_tags(content), content
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        '<time datetime="2022-01-01T00:00:00Z">',
+        "<time>",
+        '<time datetime="x"',
+        '<time datetime="x>',
+        "<time datetime=y\"a datetime='b'>",
+        "<!-- <time datetime=x> --><time datetime=y>",
+        "<!---><time datetime=x>-->",
+        "<script>a</scriptx><time datetime=x></script>",
+        "<iframe><time datetime=x></iframe><time datetime=y>",
+        "<plaintext><time datetime=x>",
+        "<![CDATA[<time datetime=x>]]>",
+        "<time datetime=a<time datetime=b>",
+        "<ti<me datetime=x>",
+        "<time =x datetime=y>",
+        "</<time datetime=a>",
+        "x</ <time datetime=a>",
+        "</'<time datetime=a>'>",
+        "</><time datetime=a>",
+        "<TIME/=datetime></script>",
+        "<time/datetime=x>",
+        "<time\r=datetime>",
+        "<time\rdatetime=x>",
+        '<time\t="> ',
+        '<time a/="x>" datetime=y>',
+        '<time datetime="a\r\nb">',
+        "<time\x00>",
+        "<ti\x00me datetime=x>",
+        "<time datetime=a\x00b>",
+        "<time\xa0datetime=x>",
+    ],
+)
+def test_find_time_tags_edge_cases(content):
+    """
+    Malformed HTML should be handled the same way that lxml handles it.
+    """
+    assert find_time_tags(content) == parsel_time_tags(content)
+
+
+def test_find_time_tags_fragments():
+    """
+    Short strings of the characters that tags are split on should parse the same as in lxml.
+    """
+    fragments = ["<time", "<TIME", "</", ">", "/", "=", "'", '"', " ", "\t", "\r", "\n", "\x0c"]
+    fragments += ["\x00", "\xa0", "datetime", "2022-06-17T12:30:00Z", "<!--", "-->", "<script>"]
+    rng = random.Random(83)
+    for _ in range(5000):
+        content = "".join(rng.choices(fragments, k=rng.randint(1, 10)))
+        assert find_time_tags(content) == parsel_time_tags(content), content
+
+
+def test_find_time_tags_limit():
+    assert find_time_tags("<time><time><time>", limit=2) == [None, None]
+
+
+@pytest.mark.parametrize(
+    "content",
+    ["<a" * 1100, "<a b" * 550, "<a b='" * 400, "<!x" * 700, "<a b" + " " * 2000, "<a /=" * 400],
+)
+def test_find_time_tags_linear(content):
+    """
+    Pathological input should not cause the regular expressions to backtrack.
+    """
+    assert find_time_tags(content) == parsel_time_tags(content)
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        ("2022-06-17T12:30:05Z", datetime(2022, 6, 17, 12, 30, 5, tzinfo=timezone.utc)),
+        ("2022-6-7T1:2:3Z", datetime(2022, 6, 7, 1, 2, 3, tzinfo=timezone.utc)),
+        ("2022-13-17T12:30:05Z", None),
+        ("2022-06-17T12:30:60Z", None),
+        ("2022-+6-17T12:30:05Z", None),
+        ("2022-06-17 12:30:05Z", None),
+        ("2022-06-17T12:30:05", None),
+        ("", None),
+    ],
+)
+def test_parse_timestamp(value, expected):
+    """
+    The fast path should accept exactly what strptime() accepts.
+    """
+    assert parse_timestamp(value) == expected
@@ -0,0 +1,76 @@
+import tempfile
+from io import StringIO
+
+import pytest
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from letsdance.core.profiling import ProfilerMiddleware, list_dumps
+from letsdance.core.tests.factories import BoardFactory
+
+
+def test_disabled():
+    """
+    The middleware should take itself out of the chain unless profiling is enabled.
+    """
+    with pytest.raises(MiddlewareNotUsed):
+        ProfilerMiddleware(lambda request: None)
+
+
+class TestProfilerMiddleware(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_ring(self):
+        """
+        Sampled requests should be saved with their view and key, keeping only the latest.
+        """
+        board = BoardFactory()
+        with self.settings(
+            PROFILE_ENABLED=True,
+            PROFILE_SAMPLE_RATE=1.0,
+            PROFILE_MAX_DUMPS=2,
+            PROFILE_DIR=self.directory.name,
+        ):
+            for _ in range(3):
+                self.client.get(reverse("board", args=[board.key]))
+            self.client.get(reverse("index"))
+
+        dumps = list_dumps(self.directory.name)
+        assert [(dump.method, dump.view, dump.key) for dump in dumps] == [
+            ("GET", "board", board.key),
+            ("GET", "index", None),
+        ]
+
+        stdout = StringIO()
+        call_command("profile_summary", dir=self.directory.name, view="board", stdout=stdout)
+        output = stdout.getvalue()
+        assert output.startswith("1 profile(s)")
+        assert f"GET board {board.key}" in output
+        assert "function calls" in output
+
+    async def test_async(self):
+        """
+        Requests through the async middleware chain should be profiled as well.
+        """
+        with self.settings(
+            PROFILE_ENABLED=True, PROFILE_SAMPLE_RATE=1.0, PROFILE_DIR=self.directory.name
+        ):
+            response = await self.async_client.get(reverse("index"))
+        assert response.status_code == 200
+        assert [dump.view for dump in list_dumps(self.directory.name)] == ["index"]
+
+    @override_settings(PROFILE_ENABLED=True, PROFILE_SAMPLE_RATE=1.0, PROFILE_SLOW_SECONDS=60)
+    def test_fast_requests_discarded(self):
+        """
+        Only requests slower than the threshold should be saved.
+        """
+        with self.settings(PROFILE_DIR=self.directory.name):
+            self.client.get(reverse("index"))
+        assert list_dumps(self.directory.name) == []
+
+        with pytest.raises(CommandError):
+            call_command("profile_summary", dir=self.directory.name)
@@ -0,0 +1,259 @@
+import collections
+import io
+import time
+from datetime import datetime, timedelta
+from functools import partial
+from unittest import mock
+
+import httpx
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from letsdance.core import sync
+from letsdance.core.client import AsyncClient
+from letsdance.core.constants import PEER_BREAKER_THRESHOLD
+from letsdance.core.crypto import dump_public_key, generate_private_key
+from letsdance.core.digest import format_hash
+from letsdance.core.models import Board, Delivery, FollowedKey, Peer, hash_board
+from letsdance.core.sync import reconcile, sync_boards
+from letsdance.core.tasks import reconcile_peers, sync_followed_boards
+from letsdance.core.tests.factories import BoardFactory, PeerFactory
+from letsdance.core.utils import date_to_header, generate_fake_board_content
+
+
+def mock_client(handler):
+    return mock.patch.object(
+        sync, "AsyncClient", partial(AsyncClient, transport=httpx.MockTransport(handler))
+    )
+
+
+def make_response(last_modified=None, sign=True) -> tuple[str, httpx.Response]:
+    private_key = generate_private_key()
+    key = dump_public_key(private_key.public_key())
+    content = generate_fake_board_content(last_modified or timezone.now()).encode()
+    signature = private_key.sign(content if sign else b"something else").hex()
+    return key, httpx.Response(200, content=content, headers={"Spring-Signature": signature})
+
+
+# Normally keys need to end in "ed2022", but this makes it too expensive to
+# generate keys for testing.
+@mock.patch("letsdance.core.views.validate_public_key", return_value=True)
+class TestSyncBoards(TestCase):
+    def test_new_board(self, *_):
+        """
+        A board that isn't stored yet should be fetched and stored.
+        """
+        PeerFactory(url="https://example.com")
+        key, response = make_response()
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            assert request.url == f"https://example.com/{key}"
+            assert "If-Modified-Since" not in request.headers
+            return response
+
+        with mock_client(handler):
+            assert sync_boards([key]) == {"updated": 1}
+
+        board = Board.objects.get(key=key)
+        assert board.content == response.content
+        assert Board.objects.stored_count() == 1
+
+    def test_unchanged(self, *_):
+        """
+        A stored board should be requested conditionally, a 304 leaves it alone.
+        """
+        PeerFactory()
+        last_modified = timezone.now().replace(microsecond=0) - timedelta(hours=1)
+        board = BoardFactory(last_modified=last_modified)
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            assert request.headers["If-Modified-Since"] == date_to_header(last_modified)
+            return httpx.Response(304)
+
+        with mock_client(handler):
+            assert sync_boards([board.key]) == {"unchanged": 1}
+
+    def test_invalid_then_valid(self, *_):
+        """
+        A board that fails validation should be skipped in favour of the next peer.
+        """
+        PeerFactory(url="https://bad.example.com")
+        PeerFactory(url="https://good.example.com")
+        key, good = make_response()
+        _, bad = make_response(sign=False)
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            return bad if request.url.host == "bad.example.com" else good
+
+        with mock_client(handler):
+            assert sync_boards([key]) == {"updated": 1}
+        assert Board.objects.get(key=key).signature == good.headers["Spring-Signature"]
+
+    def test_missing(self, *_):
+        """
+        A board that no peer has should be reported as missing, and errors recorded.
+        """
+        up = PeerFactory(url="https://up.example.com")
+        down = PeerFactory(url="https://down.example.com")
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.host == "down.example.com":
+                raise httpx.ConnectError("Connection refused", request=request)
+            return httpx.Response(404)
+
+        with mock_client(handler):
+            outcomes = sync_boards(["ab" * 32])
+        assert outcomes == {"failed": 1}
+
+        up.refresh_from_db()
+        down.refresh_from_db()
+        assert up.last_success is not None
+        assert down.consecutive_failures == 1
+
+    def test_overlapping_health_updates(self, *_):
+        """
+        A run that started before another one stored its outcomes shouldn't undo them.
+        """
+        peer = PeerFactory()
+        # Loaded by the sync before the outbox drain opens the peer's breaker
+        stale = Peer.objects.get(pk=peer.pk)
+        now = timezone.now()
+        Peer.objects.record_attempts(
+            [(peer.pk, False, 1.0, now) for _ in range(PEER_BREAKER_THRESHOLD)]
+        )
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            raise httpx.ConnectError("Connection refused", request=request)
+
+        with mock_client(handler):
+            assert sync_boards(["ab" * 32], peers=[stale]) == {"failed": 1}
+
+        peer.refresh_from_db()
+        assert peer.consecutive_failures == PEER_BREAKER_THRESHOLD + 1
+        assert peer.breaker_until is not None and peer.breaker_until > now
+
+    def test_rate_limited(self, *_):
+        """
+        Requests to a peer shouldn't be sent faster than its rate limit.
+        """
+        PeerFactory()
+        start = time.perf_counter()
+        with mock_client(lambda request: httpx.Response(404)):
+            with self.settings(SYNC_PEER_RATE=50.0, SYNC_PEER_BURST=1):
+                sync_boards([f"{i:064x}" for i in range(6)])
+        # The first request uses the burst, the other five wait 20ms each
+        assert time.perf_counter() - start >= 0.1
+
+    def test_followed(self, *_):
+        """
+        The scheduled job should pull every followed key.
+        """
+        PeerFactory()
+        key, response = make_response()
+        FollowedKey.objects.create(key=key)
+
+        with mock_client(lambda request: response):
+            assert sync_followed_boards() == 1
+        assert Board.objects.filter(key=key).exists()
+
+    def test_command_invalid_key(self, *_):
+        """
+        Malformed keys should be rejected before any peer is contacted, and not followed.
+        """
+        PeerFactory()
+        handler = mock.Mock()
+        with mock_client(handler):
+            for key in ["ab" * 32 + "\n", "AB" * 32, "xab" * 21 + "a"]:
+                with self.assertRaises(CommandError):
+                    call_command("sync_boards", key, "--follow", stdout=io.StringIO())
+        handler.assert_not_called()
+        assert not FollowedKey.objects.exists()
+
+        with self.assertRaises(ValidationError):
+            FollowedKey(key="x" + "ab" * 31 + "a").full_clean()
+
+
+def make_digest(boards: dict[str, datetime], prefix: str) -> dict:
+    """
+    Build the digest a peer storing the given boards would send.
+    """
+    versions = {key: lm for key, lm in boards.items() if key.startswith(prefix)}
+    hashes: collections.defaultdict[str, int] = collections.defaultdict(int)
+    for key, last_modified in versions.items():
+        hashes[key[: len(prefix) + 2]] ^= hash_board(key, last_modified)
+    return {
+        "prefix": prefix,
+        "count": len(versions),
+        "buckets": {bucket: format_hash(value) for bucket, value in hashes.items()},
+        "boards": {key: int(lm.timestamp()) for key, lm in versions.items()},
+    }
+
+
+@mock.patch("letsdance.core.views.validate_public_key", return_value=True)
+class TestReconcile(TestCase):
+    def test_reconcile(self, *_):
+        """
+        Boards the peer is newer on should be pulled, and the rest pushed through the outbox.
+        """
+        peer = PeerFactory(url="https://example.com")
+        now = timezone.now().replace(microsecond=0) - timedelta(hours=1)
+        private_key = generate_private_key()
+        same, ours = BoardFactory.create_batch(2, last_modified=now)
+        stale = BoardFactory(key=dump_public_key(private_key.public_key()), last_modified=now)
+        Board.objects.track(added=[(board.key, now) for board in (same, ours, stale)])
+        theirs, response = make_response(now)
+        remote = {same.key: now, stale.key: now + timedelta(minutes=1), theirs: now}
+        content = generate_fake_board_content(now + timedelta(minutes=1)).encode()
+        newer = httpx.Response(
+            200, content=content, headers={"Spring-Signature": private_key.sign(content).hex()}
+        )
+        requested = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/digest":
+                prefix = request.url.params["prefix"]
+                requested.append(prefix)
+                digest = make_digest(remote, prefix)
+                if prefix == "":
+                    del digest["boards"]
+                return httpx.Response(200, json=digest)
+            if request.url.path == f"/{theirs}":
+                return response
+            return newer
+
+        with mock_client(handler):
+            outcomes = reconcile([peer])
+
+        assert outcomes == {"updated": 2, "pushed": 1}
+        # Only the buckets that differ are walked
+        assert set(requested) - {""} <= {ours.key[:2], stale.key[:2], theirs[:2]}
+        assert Board.objects.filter(key=theirs).exists()
+        assert Board.objects.get(key=stale.key).content == newer.content
+        # Pulled boards are broadcast as usual, pushed ones are due straight away
+        assert Delivery.objects.get(key=ours.key, peer=peer).next_attempt <= timezone.now()
+        assert not Delivery.objects.filter(key=same.key).exists()
+
+    def test_peer_down(self, *_):
+        """
+        A peer that can't be reached should be reported as a failure.
+        """
+        peer = PeerFactory()
+        with mock_client(lambda request: httpx.Response(503)):
+            assert reconcile([peer]) == {"failed": 1}
+        peer.refresh_from_db()
+        assert peer.consecutive_failures == 1
+
+    def test_scheduled(self, *_):
+        """
+        The scheduled job should reconcile with a sampled peer.
+        """
+        PeerFactory()
+        board = BoardFactory(last_modified=timezone.now())
+        Board.objects.track(added=[(board.key, board.last_modified)])
+
+        digest = {"prefix": "", "count": 0, "buckets": {}, "boards": {}}
+        with mock_client(lambda request: httpx.Response(200, json=digest)):
+            assert reconcile_peers() == 1
+        assert Delivery.objects.filter(key=board.key).exists()
@@ -0,0 +1,291 @@
+from datetime import timedelta
+from functools import partial
+from unittest import mock
+
+import httpx
+from django.test import TestCase
+from django.utils import timezone
+
+from letsdance.core import tasks
+from letsdance.core.client import AsyncClient
+from letsdance.core.models import Board, Counter, Delivery
+from letsdance.core.tasks import broadcast_board, drain_outbox, expire_old_boards
+from letsdance.core.tests.factories import BoardFactory, PeerFactory
+
+
+def mock_client(handler):
+    return mock.patch.object(
+        tasks, "AsyncClient", partial(AsyncClient, transport=httpx.MockTransport(handler))
+    )
+
+
+class TestBroadcastBoard(TestCase):
+    def test_delivery_per_peer(self):
+        """
+        Every selected peer should get its own delivery in the outbox.
+        """
+        board = BoardFactory()
+        PeerFactory.create_batch(4)
+        assert broadcast_board(board.key) == 2
+
+        deliveries = Delivery.objects.filter(key=board.key)
+        assert deliveries.count() == 2
+        assert deliveries.values("peer").distinct().count() == 2
+
+    def test_queries(self):
+        """
+        The peers should be counted and picked from a single query.
+        """
+        board = BoardFactory()
+        PeerFactory.create_batch(20)
+        # The pending check, the peers and the insert
+        with self.assertNumQueries(3):
+            assert broadcast_board(board.key) == 5
+
+    def test_single_peer(self):
+        """
+        A realm with a single peer should still receive the board.
+        """
+        board = BoardFactory()
+        PeerFactory()
+        assert broadcast_board(board.key) == 1
+
+    def test_already_pending(self):
+        """
+        Updates made while a broadcast is waiting to go out shouldn't queue another one.
+        """
+        board = BoardFactory()
+        PeerFactory.create_batch(4)
+        broadcast_board(board.key)
+        assert broadcast_board(board.key) == 0
+        assert Delivery.objects.count() == 2
+
+    def test_requeue_retry(self):
+        """
+        A peer that is being retried should get the new version on the next broadcast.
+        """
+        board = BoardFactory()
+        peer = PeerFactory()
+        Delivery.objects.create(
+            key=board.key,
+            peer=peer,
+            attempts=3,
+            next_attempt=timezone.now() + timedelta(days=1),
+        )
+        broadcast_board(board.key, eta=0)
+
+        delivery = Delivery.objects.get()
+        assert delivery.attempts == 0
+        assert delivery.next_attempt <= timezone.now()
+
+
+class TestDrainOutbox(TestCase):
+    def test_publishes_latest_version(self):
+        """
+        The board should be loaded when it's sent, not when it was queued.
+        """
+        board = BoardFactory(content=b"first version")
+        PeerFactory(url="https://example.com")
+        broadcast_board(board.key, eta=0)
+        board.content = b"second version"
+        board.save()
+
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return httpx.Response(200)
+
+        with mock_client(handler):
+            assert drain_outbox() == 1
+
+        assert len(requests) == 1
+        assert requests[0].url == f"https://example.com/{board.key}"
+        assert requests[0].content == b"second version"
+        assert not Delivery.objects.exists()
+
+    def test_not_due(self):
+        """
+        Deliveries shouldn't be sent before their next attempt.
+        """
+        board = BoardFactory()
+        PeerFactory()
+        broadcast_board(board.key)
+        assert drain_outbox() == 0
+        assert Delivery.objects.count() == 1
+
+    def test_deleted_board(self):
+        """
+        Deliveries for boards that no longer exist should be dropped.
+        """
+        board = BoardFactory()
+        PeerFactory()
+        broadcast_board(board.key, eta=0)
+        board.delete()
+
+        with mock_client(lambda request: httpx.Response(200)):
+            assert drain_outbox() == 1
+        assert not Delivery.objects.exists()
+
+    def test_retry_server_error(self):
+        """
+        Server and connection errors, and rate limits, should be retried later.
+        Other client errors shouldn't.
+        """
+        board = BoardFactory()
+        PeerFactory(url="https://error.example.com")
+        PeerFactory(url="https://down.example.com")
+        PeerFactory(url="https://rejected.example.com")
+        PeerFactory(url="https://throttled.example.com")
+        PeerFactory.create_batch(3)
+        for peer in tasks.Peer.objects.all():
+            Delivery.objects.create(key=board.key, peer=peer)
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.host == "error.example.com":
+                return httpx.Response(503)
+            if request.url.host == "down.example.com":
+                raise httpx.ConnectError("Connection refused", request=request)
+            if request.url.host == "rejected.example.com":
+                return httpx.Response(409)
+            if request.url.host == "throttled.example.com":
+                return httpx.Response(429, headers={"Retry-After": "10"})
+            return httpx.Response(200)
+
+        start = timezone.now()
+        with mock_client(handler):
+            assert drain_outbox() == 7
+
+        retries = Delivery.objects.order_by("peer__url")
+        assert [d.peer.url for d in retries] == [
+            "https://down.example.com",
+            "https://error.example.com",
+            "https://throttled.example.com",
+        ]
+        attempts = tasks.metrics.publish_attempts_total
+        assert attempts.labels("https://throttled.example.com", "retry").sum() == [1]
+        assert attempts.labels("https://rejected.example.com", "rejected").sum() == [1]
+        for delivery in retries:
+            assert delivery.attempts == 1
+            assert delivery.claim == ""
+            assert delivery.next_attempt >= start + timedelta(seconds=300)
+
+    def test_give_up(self):
+        """
+        Deliveries should be dropped once the backoff limit has been reached.
+        """
+        board = BoardFactory()
+        Delivery.objects.create(key=board.key, peer=PeerFactory(), attempts=20)
+
+        with mock_client(lambda request: httpx.Response(500)):
+            assert drain_outbox() == 1
+        assert not Delivery.objects.exists()
+
+    def test_batches(self):
+        """
+        The whole backlog should be drained, one batch at a time.
+        """
+        boards = BoardFactory.create_batch(5)
+        peers = PeerFactory.create_batch(5)
+        for board in boards:
+            for peer in peers:
+                Delivery.objects.create(key=board.key, peer=peer)
+
+        with mock_client(lambda request: httpx.Response(200)):
+            with mock.patch.object(
+                tasks, "claim_deliveries", wraps=tasks.claim_deliveries
+            ) as claim:
+                assert drain_outbox(batch_size=10) == 25
+
+        assert claim.call_count == 3
+        assert not Delivery.objects.exists()
+
+    def test_claimed_rows_requeued(self):
+        """
+        A row that was re-queued while being sent should be kept for the next run.
+        """
+        board = BoardFactory()
+        PeerFactory()
+        broadcast_board(board.key, eta=0)
+
+        original_claim_deliveries = tasks.claim_deliveries
+
+        def claim_deliveries(batch_size):
+            deliveries = original_claim_deliveries(batch_size)
+            # The board is updated and broadcast again while it's being sent
+            broadcast_board(board.key, eta=0)
+            return deliveries
+
+        with mock_client(lambda request: httpx.Response(200)):
+            with mock.patch.object(tasks, "claim_deliveries", side_effect=claim_deliveries):
+                assert drain_outbox() == 1
+
+        delivery = Delivery.objects.get()
+        assert delivery.claim == ""
+        assert delivery.attempts == 0
+
+    def test_records_peer_health(self):
+        """
+        The outcome of every attempt should update the health of the peer.
+        """
+        board = BoardFactory()
+        up = PeerFactory(url="https://up.example.com")
+        down = PeerFactory(url="https://down.example.com")
+        Delivery.objects.create(key=board.key, peer=up)
+        Delivery.objects.create(key=board.key, peer=down)
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.host == "down.example.com":
+                raise httpx.ConnectError("Connection refused", request=request)
+            return httpx.Response(200)
+
+        with mock_client(handler):
+            drain_outbox()
+
+        up.refresh_from_db()
+        assert up.latency is not None
+        assert up.last_success is not None
+        assert up.failure_rate == 0.0
+
+        down.refresh_from_db()
+        assert down.last_success is None
+        assert down.failure_rate > 0.0
+        assert down.consecutive_failures == 1
+
+    def test_open_breaker_deferred(self):
+        """
+        Deliveries to a peer with an open breaker should wait until it closes.
+        """
+        board = BoardFactory()
+        breaker_until = timezone.now() + timedelta(hours=1)
+        peer = PeerFactory(consecutive_failures=10, breaker_until=breaker_until)
+        Delivery.objects.create(key=board.key, peer=peer, attempts=2)
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            raise AssertionError("The peer shouldn't be contacted")
+
+        with mock_client(handler):
+            assert drain_outbox() == 1
+
+        delivery = Delivery.objects.get()
+        assert delivery.next_attempt == breaker_until
+        assert delivery.attempts == 2
+        assert delivery.claim == ""
+
+
+class TestExpireOldBoards(TestCase):
+    def test_batches(self):
+        """
+        Expired boards should be deleted in batches, leaving fresh boards alone.
+        """
+        old = timezone.now() - timedelta(days=100)
+        BoardFactory.create_batch(7, last_modified=old)
+        fresh = BoardFactory.create_batch(2)
+        Counter.objects.add(Counter.BOARDS, 9)
+
+        with mock.patch.object(tasks.time, "sleep") as sleep:
+            assert expire_old_boards(batch_size=3) == 7
+
+        assert sleep.call_count == 2
+        assert set(Board.objects.all()) == set(fresh)
+        assert Board.objects.stored_count() == 2
@@ -0,0 +1,37 @@
+from letsdance.core.utils import RateLimiter, TokenBucket
+
+
+def test_token_bucket():
+    """
+    The bucket should allow a burst, then refill at the given rate.
+    """
+    now = 0.0
+    bucket = TokenBucket(rate=2.0, capacity=3, clock=lambda: now)
+    assert [bucket.consume() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.consume() == 0.5
+
+    now = 0.5
+    assert bucket.consume() == 0.0
+    assert bucket.consume() == 0.5
+
+    now = 100.0
+    assert [bucket.consume() for _ in range(4)] == [0.0, 0.0, 0.0, 0.5]
+
+
+def test_rate_limiter():
+    """
+    Each client should get its own bucket, and only the most recent clients are kept.
+    """
+    now = 0.0
+    limiter = RateLimiter(rate=1.0, capacity=2, max_clients=2, clock=lambda: now)
+    assert [limiter.consume("a") for _ in range(3)] == [0.0, 0.0, 1.0]
+    assert limiter.consume("b") == 0.0
+
+    now = 0.5
+    assert limiter.consume("a") == 0.5
+    # Seeing a third client forgets the least recently seen one
+    assert limiter.consume("c") == 0.0
+    assert "b" not in limiter.buckets
+    assert limiter.consume("a") == 0.5
+
+    assert RateLimiter(rate=0, capacity=0, max_clients=1).consume("a") == 0.0
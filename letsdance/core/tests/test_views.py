@@ -1,15 +1,26 @@
+import gzip
+import re
 from datetime import timedelta
 from unittest import mock
 
-from django.test import TestCase
+from asgiref.sync import sync_to_async
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 
+from letsdance.core import views
+from letsdance.core.cache import board_cache
 from letsdance.core.constants import TEST_KEY_PUBLIC
 from letsdance.core.crypto import dump_public_key, generate_private_key
-from letsdance.core.models import Board
-from letsdance.core.tests.factories import BoardFactory
-from letsdance.core.utils import date_to_header, generate_fake_board_content
+from letsdance.core.digest import peer_addresses
+from letsdance.core.models import Board, Counter
+from letsdance.core.newsstand import newsstand
+from letsdance.core.tests.factories import BoardFactory, PeerFactory
+from letsdance.core.utils import (
+    RateLimiter,
+    date_to_header,
+    generate_fake_board_content,
+)
 
 
 class TestIndexView(TestCase):
@@ -23,6 +34,119 @@ class TestIndexView(TestCase):
         assert response.headers["Spring-Version"] == "83"
         assert response.headers["Spring-Difficulty"] == "0"
 
+    def test_compressed(self):
+        """
+        The newsstand page should be served compressed, with a stable ETag.
+        """
+        BoardFactory.create_batch(10)
+        response = self.client.get(reverse("index"), HTTP_ACCEPT_ENCODING="gzip")
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert b"board" in gzip.decompress(response.getvalue())
+
+        etag = response.headers["ETag"]
+        response = self.client.get(
+            reverse("index"), HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=etag
+        )
+        assert response.status_code == 304
+
+    def test_newsstand_updated(self):
+        """
+        The newsstand should show the latest version of each board.
+        """
+        board = BoardFactory(content=b"first version")
+        response = self.client.get(reverse("index"))
+        assert b"first version" in response.getvalue()
+        assert b"ago)" in response.getvalue()
+
+        board.content = b"second version"
+        board.last_modified = timezone.now()
+        board.save()
+
+        response = self.client.get(reverse("index"))
+        assert b"first version" not in response.getvalue()
+        assert b"second version" in response.getvalue()
+
+    async def test_pagination(self):
+        """
+        Following the older boards links should visit every board once, newest first.
+        """
+        now = timezone.now()
+        # Boards that share a timestamp have to be split across pages by id
+        times = [now, now, now - timedelta(hours=1), now, now - timedelta(hours=2)] * 2
+        boards = [await sync_to_async(BoardFactory)(last_modified=t) for t in times]
+        expected = [b.key for b in sorted(boards, key=lambda b: (b.last_modified, b.id))][::-1]
+
+        keys = []
+        url = reverse("index")
+        with mock.patch.object(newsstand, "size", 3):
+            while url:
+                response = await self.async_client.get(url)
+                assert response.status_code == 200
+                if response.streaming:
+                    content = b"".join([chunk async for chunk in response.streaming_content])
+                else:
+                    content = response.content
+
+                keys += re.findall(r'title="([0-9a-f]{64})"', content.decode())
+                cursor = re.search(r'href="(\?before=[0-9-]+)"', content.decode())
+                url = reverse("index") + cursor.group(1) if cursor else None
+
+        assert keys == expected
+
+    def test_pagination_invalid_cursor(self):
+        """
+        A malformed cursor should be rejected.
+        """
+        response = self.client.get(reverse("index"), {"before": "yesterday"})
+        assert response.status_code == 400
+
+
+class TestDigestView(TestCase):
+    def setUp(self):
+        peer_addresses.clear()
+
+    def test_not_a_peer(self):
+        """
+        Only peers in the realm should be able to read the digest.
+        """
+        PeerFactory(url="https://192.0.2.1")
+        response = self.client.get(reverse("digest"))
+        assert response.status_code == 403
+
+    def test_digest(self):
+        """
+        The digest should bucket the boards by key prefix, and list them once there are few.
+        """
+        PeerFactory(url="http://127.0.0.1:8000")
+        boards = BoardFactory.create_batch(3, last_modified=timezone.now().replace(microsecond=0))
+        Board.objects.track(added=[(board.key, board.last_modified) for board in boards])
+
+        response = self.client.get(reverse("digest"))
+        assert response.status_code == 200
+        digest = response.json()
+        assert digest["count"] == 3
+        assert set(digest["buckets"]) == {board.key[:2] for board in boards}
+        assert digest["boards"] == {
+            board.key: int(board.last_modified.timestamp()) for board in boards
+        }
+
+        prefix = boards[0].key[:2]
+        response = self.client.get(reverse("digest"), {"prefix": prefix})
+        digest = response.json()
+        assert digest["count"] == sum(board.key.startswith(prefix) for board in boards)
+        assert boards[0].key[:4] in digest["buckets"]
+        assert boards[0].key in digest["boards"]
+
+    def test_invalid_prefix(self):
+        """
+        Prefixes have to be whole buckets of lowercase hex.
+        """
+        PeerFactory(url="http://127.0.0.1:8000")
+        for prefix in ["a", "AB", "zz", "ab" * 32]:
+            response = self.client.get(reverse("digest"), {"prefix": prefix})
+            assert response.status_code == 400, prefix
+
 
 class TestBoardView(TestCase):
 
@@ -33,6 +157,11 @@ class TestBoardView(TestCase):
         return_value=True,
     )
 
+    def setUp(self):
+        views.address_limiter.clear()
+        views.key_limiter.clear()
+        peer_addresses.clear()
+
     def test_get_unrecognized_board(self):
         """
         If the supplied key is not in the database return an error.
@@ -56,6 +185,17 @@ class TestBoardView(TestCase):
         assert response.status_code == 304
         assert response.headers["Spring-Version"] == "83"
 
+    def test_get_if_modified_since_same(self):
+        """
+        A board that hasn't changed since the if-modified-since header shouldn't be sent again.
+        """
+        last_modified = timezone.now().replace(microsecond=0) - timedelta(minutes=30)
+        board = BoardFactory(last_modified=last_modified)
+
+        headers = {"HTTP_IF_MODIFIED_SINCE": date_to_header(last_modified)}
+        response = self.client.get(reverse("board", args=[board.key]), **headers)
+        assert response.status_code == 304
+
     def test_get_success(self):
         """
         If everything checks out, we should return the board content.
@@ -66,10 +206,79 @@ class TestBoardView(TestCase):
         headers = {"HTTP_IF_MODIFIED_SINCE": date_to_header(if_modified_since)}
         response = self.client.get(reverse("board", args=[board.key]), **headers)
         assert response.status_code == 200
-        assert response.getvalue() == board.content.encode()
+        assert response.getvalue() == board.content
         assert response.headers["Spring-Version"] == "83"
         assert response.headers["Spring-Signature"] == board.signature
 
+    def test_get_cached(self):
+        """
+        Repeated reads of the same board should not hit the database.
+        """
+        board = BoardFactory()
+
+        response = self.client.get(reverse("board", args=[board.key]))
+        assert response.status_code == 200
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("board", args=[board.key]))
+        assert response.status_code == 200
+        assert response.getvalue() == board.content
+        assert response.headers["Spring-Signature"] == board.signature
+
+    def test_get_compressed(self):
+        """
+        A precomputed compressed variant should be sent if the client accepts it.
+        """
+        board = BoardFactory()
+        board.set_content(generate_fake_board_content(board.last_modified).encode())
+        board.save()
+
+        url = reverse("board", args=[board.key])
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.headers["Vary"] == "Accept-Encoding"
+        assert gzip.decompress(response.getvalue()) == board.content
+
+        response = self.client.get(url)
+        assert "Content-Encoding" not in response.headers
+        assert response.getvalue() == board.content
+
+    def test_get_if_none_match(self):
+        """
+        A matching ETag should get an empty 304 response.
+        """
+        board = BoardFactory()
+        board.set_content(generate_fake_board_content(board.last_modified).encode())
+        board.save()
+
+        url = reverse("board", args=[board.key])
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        etag = response.headers["ETag"]
+        assert etag.startswith(f'"{board.signature[:32]}')
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        assert response.getvalue() == b""
+        assert response.headers["ETag"] == etag
+
+        # The identity variant has a different ETag
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+
+    def test_get_expired(self):
+        """
+        Boards past their TTL should not be served, even if they're still cached.
+        """
+        board = BoardFactory(last_modified=timezone.now() - timedelta(days=100))
+        response = self.client.get(reverse("board", args=[board.key]))
+        assert response.status_code == 404
+
+        board_cache.set(board)
+        response = self.client.get(reverse("board", args=[board.key]))
+        assert response.status_code == 404
+        assert board_cache.get(board.key) is None
+
     def test_get_test_board(self):
         """
         Should return an automatically generate board if the test key is used.
@@ -80,6 +289,27 @@ class TestBoardView(TestCase):
         assert response.headers["Spring-Version"] == "83"
         assert response.headers["Spring-Signature"]
 
+    def test_get_test_board_cached(self):
+        """
+        The test board should be generated once per refresh interval, not per request.
+        """
+        board_cache.clear()
+        url = reverse("board", args=[TEST_KEY_PUBLIC])
+        with mock.patch.object(Board, "generate_board", wraps=Board.generate_board) as generate:
+            first = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+            second = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+            assert generate.call_count == 1
+            assert first.headers["Spring-Signature"] == second.headers["Spring-Signature"]
+            assert first.headers["Content-Encoding"] == "gzip"
+
+            etag = first.headers["ETag"]
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=etag)
+            assert response.status_code == 304
+
+            with override_settings(TEST_BOARD_REFRESH_SECONDS=0):
+                self.client.get(url)
+            assert generate.call_count == 2
+
     def test_put_above_max_size(self):
         """
         The board content must be under the maximum allowed size.
@@ -143,7 +373,7 @@ class TestBoardView(TestCase):
         content = generate_fake_board_content(last_modified)
         signature = private_key.sign(content.encode()).hex()
 
-        BoardFactory(content=content, key=key, signature=signature)
+        BoardFactory(content=content.encode(), key=key, signature=signature)
 
         headers = {
             "HTTP_IF_UNMODIFIED_SINCE": date_to_header(last_modified - timedelta(hours=1)),
@@ -209,6 +439,45 @@ class TestBoardView(TestCase):
         response = self.client.put(url, data=content, content_type="text/html", **headers)
         assert response.status_code == 400
 
+    @skip_public_key_validation
+    def test_put_invalid_last_modified_time(self, *_):
+        """
+        The <time> tag must contain a timestamp in the expected format.
+        """
+        last_modified = timezone.now()
+        private_key = generate_private_key()
+        key = dump_public_key(private_key.public_key())
+        content = '<time datetime="yesterday">Hello World!'
+        signature = private_key.sign(content.encode()).hex()
+
+        headers = {
+            "HTTP_IF_UNMODIFIED_SINCE": date_to_header(last_modified),
+            "HTTP_SPRING_SIGNATURE": signature,
+        }
+        url = reverse("board", args=[key])
+        response = self.client.put(url, data=content, content_type="text/html", **headers)
+        assert response.status_code == 400
+
+    @skip_public_key_validation
+    def test_put_invalid_utf8(self, *_):
+        """
+        The board content must be valid UTF-8.
+        """
+        last_modified = timezone.now()
+        private_key = generate_private_key()
+        key = dump_public_key(private_key.public_key())
+        content = generate_fake_board_content(last_modified).encode() + b"\xff"
+        signature = private_key.sign(content).hex()
+
+        headers = {
+            "HTTP_IF_UNMODIFIED_SINCE": date_to_header(last_modified),
+            "HTTP_SPRING_SIGNATURE": signature,
+        }
+        url = reverse("board", args=[key])
+        response = self.client.put(url, data=content, content_type="text/html", **headers)
+        assert response.status_code == 400
+        assert not Board.objects.filter(key=key).exists()
+
     @skip_public_key_validation
     def test_put_success_create(self, *_):
         """
@@ -230,7 +499,8 @@ class TestBoardView(TestCase):
 
         board = Board.objects.get(key=key)
         assert board.signature == signature
-        assert board.content == content
+        assert board.content == content.encode()
+        assert gzip.decompress(board.content_gzip) == board.content
 
     @skip_public_key_validation
     def test_put_success_update(self, *_):
@@ -255,4 +525,167 @@ class TestBoardView(TestCase):
 
         board.refresh_from_db()
         assert board.signature == signature
-        assert board.content == content
+        assert board.content == content.encode()
+
+    @skip_public_key_validation
+    def test_put_invalidates_cache(self, *_):
+        """
+        A cached board should be replaced after a successful PUT.
+        """
+        last_modified = timezone.now()
+        private_key = generate_private_key()
+        key = dump_public_key(private_key.public_key())
+        content = generate_fake_board_content(last_modified)
+        signature = private_key.sign(content.encode()).hex()
+
+        BoardFactory(key=key, last_modified=last_modified - timedelta(days=1))
+        response = self.client.get(reverse("board", args=[key]))
+        assert response.status_code == 200
+
+        headers = {
+            "HTTP_IF_UNMODIFIED_SINCE": date_to_header(timezone.now()),
+            "HTTP_SPRING_SIGNATURE": signature,
+        }
+        url = reverse("board", args=[key])
+        response = self.client.put(url, data=content, content_type="text/html", **headers)
+        assert response.status_code == 200
+
+        response = self.client.get(reverse("board", args=[key]))
+        assert response.status_code == 200
+        assert response.getvalue() == content.encode()
+        assert response.headers["Spring-Signature"] == signature
+
+    def put_new_board(self) -> tuple[str, int]:
+        last_modified = timezone.now()
+        private_key = generate_private_key()
+        key = dump_public_key(private_key.public_key())
+        content = generate_fake_board_content(last_modified)
+        headers = {
+            "HTTP_IF_UNMODIFIED_SINCE": date_to_header(last_modified),
+            "HTTP_SPRING_SIGNATURE": private_key.sign(content.encode()).hex(),
+        }
+        url = reverse("board", args=[key])
+        response = self.client.put(url, data=content, content_type="text/html", **headers)
+        return key, response.status_code
+
+    def test_put_content_length_too_large(self):
+        """
+        A board that is declared too large should be rejected without reading it.
+        """
+        url = reverse("board", args=[TEST_KEY_PUBLIC])
+        with mock.patch("django.http.HttpRequest.read") as read:
+            response = self.client.put(url, data=b"x" * 5000, content_type="text/html")
+        assert response.status_code == 413
+        read.assert_not_called()
+
+        response = self.client.put(
+            url, data=b"x", content_type="text/html", HTTP_CONTENT_LENGTH="lots"
+        )
+        assert response.status_code == 400
+
+    @skip_public_key_validation
+    def test_put_replay_skips_signature(self, *_):
+        """
+        A version that's already stored should be rejected before verifying the signature.
+        """
+        last_modified = timezone.now()
+        private_key = generate_private_key()
+        key = dump_public_key(private_key.public_key())
+        content = generate_fake_board_content(last_modified)
+        signature = private_key.sign(content.encode()).hex()
+        BoardFactory(key=key, last_modified=last_modified.replace(microsecond=0))
+
+        url = reverse("board", args=[key])
+        with mock.patch("letsdance.core.views.verify_signature") as verify:
+            response = self.client.put(
+                url, data=content, content_type="text/html", HTTP_SPRING_SIGNATURE=signature
+            )
+        assert response.status_code == 409
+        verify.assert_not_called()
+
+    @skip_public_key_validation
+    @mock.patch("letsdance.core.views.address_limiter", RateLimiter(1.0, 2, 10))
+    def test_put_rate_limited_address(self, *_):
+        """
+        Uploads from one address past its burst should get a 429, unless it's a peer.
+        """
+        assert self.put_new_board()[1] == 200
+        assert self.put_new_board()[1] == 200
+        key, status = self.put_new_board()
+        assert status == 429
+        assert not Board.objects.filter(key=key).exists()
+
+        response = self.client.put(reverse("board", args=[key]), data=b"", content_type="text/html")
+        assert response.headers["Retry-After"] == "1"
+
+        PeerFactory(url="http://127.0.0.1:8000")
+        peer_addresses.clear()
+        assert self.put_new_board()[1] == 200
+
+    @skip_public_key_validation
+    @mock.patch("letsdance.core.views.key_limiter", RateLimiter(1.0, 1, 10))
+    def test_put_rate_limited_key(self, *_):
+        """
+        A key past its burst should get a 429, only uploads signed by its owner count.
+        """
+        private_key = generate_private_key()
+        forger = generate_private_key()
+        key = dump_public_key(private_key.public_key())
+        url = reverse("board", args=[key])
+
+        def put(last_modified, signer=private_key):
+            content = generate_fake_board_content(last_modified)
+            signature = signer.sign(content.encode()).hex()
+            return self.client.put(
+                url, data=content, content_type="text/html", HTTP_SPRING_SIGNATURE=signature
+            )
+
+        now = timezone.now().replace(microsecond=0)
+        # Rejected as being from the future, or forged, without touching the bucket
+        assert put(now + timedelta(days=1)).status_code == 400
+        for minutes in range(5, 2, -1):
+            assert put(now - timedelta(minutes=minutes), forger).status_code == 401
+        assert put(now - timedelta(minutes=2)).status_code == 200
+        assert put(now - timedelta(minutes=1)).status_code == 429
+        assert Board.objects.get(key=key).last_modified == now - timedelta(minutes=2)
+
+    @skip_public_key_validation
+    def test_put_counted(self, *_):
+        """
+        Creating a board should add it to the board counter.
+        """
+        key, status = self.put_new_board()
+        assert status == 200
+        assert Board.objects.stored_count() == 1
+
+    @skip_public_key_validation
+    @mock.patch("letsdance.core.views.BOARD_MAX_COUNT", 3)
+    def test_put_at_capacity_evicts_oldest(self, *_):
+        """
+        A new board on a full server should push out the least recently modified one.
+        """
+        oldest = BoardFactory(last_modified=timezone.now() - timedelta(days=2))
+        newer = BoardFactory.create_batch(2, last_modified=timezone.now() - timedelta(days=1))
+        Counter.objects.add(Counter.BOARDS, 3)
+        board_cache.set(oldest)
+
+        key, status = self.put_new_board()
+        assert status == 200
+        assert set(Board.objects.values_list("key", flat=True)) == {b.key for b in newer} | {key}
+        assert Board.objects.stored_count() == 3
+        assert board_cache.get(oldest.key) is None
+
+    @skip_public_key_validation
+    @mock.patch("letsdance.core.views.BOARD_MAX_COUNT", 2)
+    @override_settings(BOARD_CAPACITY_POLICY="reject")
+    def test_put_at_capacity_rejected(self, *_):
+        """
+        A new board on a full server should be refused when eviction is turned off.
+        """
+        BoardFactory.create_batch(2)
+        Counter.objects.add(Counter.BOARDS, 2)
+
+        key, status = self.put_new_board()
+        assert status == 507
+        assert not Board.objects.filter(key=key).exists()
+        assert Board.objects.stored_count() == 2
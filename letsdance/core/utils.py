@@ -1,4 +1,9 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
 from datetime import datetime
+from typing import Any
 
 from django.template.loader import render_to_string
 from django.utils import timezone
@@ -34,3 +39,130 @@ def generate_fake_board_content(last_modified: datetime) -> str:
         },
     )
     return content
+
+
+class LRUCache:
+    """
+    A thread-safe, least-recently-used cache bounded by the total size of its values.
+
+    By default every value has a size of 1, which makes max_size a simple item count.
+    """
+
+    def __init__(self, max_size: int, sizeof: Callable[[Any], int] = lambda value: 1):
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self.size -= self.sizeof(self._data.pop(key))
+            if size > self.max_size:
+                return
+            self._data[key] = value
+            self.size += size
+            while self.size > self.max_size:
+                _, evicted = self._data.popitem(last=False)
+                self.size -= self.sizeof(evicted)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._data:
+                self.size -= self.sizeof(self._data.pop(key))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket, allowing bursts of up to capacity and rate tokens per second.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def consume(self, tokens: float = 1.0) -> float:
+        """
+        Take tokens from the bucket if there are enough.
+
+        Returns 0 if they were taken, otherwise the number of seconds to wait
+        before there will be enough (nothing is taken in that case).
+        """
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    A token bucket for each client, e.g. per IP address.
+
+    Only the most recently seen max_clients are tracked, a client that is
+    forgotten starts again with a full bucket. A rate of 0 disables the limit.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        max_clients: int,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.buckets = LRUCache(max_clients)
+        self._lock = threading.Lock()
+
+    def consume(self, client: Hashable, tokens: float = 1.0) -> float:
+        """
+        Take tokens from the client's bucket, returning the seconds to wait if there aren't enough.
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            bucket = self.buckets.get(client)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.capacity, self.clock)
+                self.buckets.set(client, bucket)
+        return bucket.consume(tokens)
+
+    def clear(self) -> None:
+        self.buckets.clear()
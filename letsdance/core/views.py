@@ -1,33 +1,99 @@
 from __future__ import annotations
 
 import logging
-from datetime import datetime, timedelta
+import math
+import time
+from datetime import datetime
 from typing import Callable
 
-from apscheduler.jobstores.base import ConflictingIdError
-from django.http import HttpRequest, HttpResponse
-from django.template.loader import render_to_string
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.http import (
+    Http404,
+    HttpRequest,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    HttpResponseNotModified,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.utils import timezone
+from django.utils.http import parse_etags
 from django.views import View
-from parsel import Selector
 
-from letsdance.core.constants import BOARD_MAX_SIZE_BYTES, TEST_KEY_PUBLIC
+from letsdance.core import metrics
+from letsdance.core.cache import CachedBoard, board_cache
+from letsdance.core.compression import choose_encoding, compress
+from letsdance.core.constants import (
+    BOARD_MAX_COUNT,
+    BOARD_MAX_SIZE_BYTES,
+    TEST_KEY_PUBLIC,
+)
 from letsdance.core.crypto import validate_public_key, verify_signature
+from letsdance.core.digest import get_digest, peer_addresses
 from letsdance.core.exceptions import Spring83Exception
 from letsdance.core.models import Board
-from letsdance.core.tasks import broadcast_board, scheduler
-from letsdance.core.utils import date_from_header
+from letsdance.core.newsstand import Cursor, newsstand, parse_cursor
+from letsdance.core.parsing import find_time_tags, parse_timestamp
+from letsdance.core.tasks import broadcast_board
+from letsdance.core.utils import RateLimiter, date_from_header
 
 logger = logging.getLogger(__name__)
 
+# Limits on how often boards can be uploaded, applied before any expensive work
+address_limiter = RateLimiter(
+    settings.PUT_RATE_PER_ADDRESS,
+    settings.PUT_BURST_PER_ADDRESS,
+    settings.PUT_RATE_LIMIT_MAX_CLIENTS,
+)
+key_limiter = RateLimiter(
+    settings.PUT_RATE_PER_KEY,
+    settings.PUT_BURST_PER_KEY,
+    settings.PUT_RATE_LIMIT_MAX_CLIENTS,
+)
+
+
+def encoded_response(
+    request: HttpRequest, content: bytes, variants: dict[str, bytes], etag: str
+) -> HttpResponse:
+    """
+    Send the best precomputed variant of the content for the Accept-Encoding header.
+
+    Each variant has its own strong ETag, and a matching If-None-Match header
+    gets an empty 304 response instead.
+    """
+    encoding = choose_encoding(request.headers.get("Accept-Encoding", ""), variants)
+    if encoding is not None:
+        etag = f'{etag[:-1]}-{encoding}"'
+
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        etags = [value.removeprefix("W/") for value in parse_etags(if_none_match)]
+        if etag in etags or "*" in etags:
+            response = HttpResponseNotModified()
+            response.headers["ETag"] = etag
+            response.headers["Vary"] = "Accept-Encoding"
+            return response
+
+    if encoding is None:
+        response = HttpResponse(content)
+    else:
+        response = HttpResponse(variants[encoding])
+        response.headers["Content-Encoding"] = encoding
+    response.headers["ETag"] = etag
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
 
 def catch_spring83_exceptions(func: Callable):
-    def inner(*args, **kwargs):
+    async def inner(*args, **kwargs):
         try:
-            return func(*args, **kwargs)
+            return await func(*args, **kwargs)
         except Spring83Exception as e:
             logger.info(f"Spring 83 error: {e}")
-            response = HttpResponse(str(e), status=e.status)
+            response = HttpResponse(str(e), status=e.status, headers=e.headers)
             response.headers["Spring-Version"] = "83"
             return response
 
@@ -35,104 +101,258 @@ def catch_spring83_exceptions(func: Callable):
 
 
 class IndexView(View):
-    def get(self, request: HttpRequest) -> HttpResponse:
+    async def get(self, request: HttpRequest) -> HttpResponse:
         """
         Retrieve the current difficulty.
         """
-        context = {"boards": Board.objects.all().order_by("-last_modified")[:500]}
-        content = render_to_string("newsstand.html", context, request)
+        if "before" in request.GET:
+            try:
+                before = parse_cursor(request.GET["before"])
+            except (ValueError, OverflowError):
+                return HttpResponseBadRequest("Invalid before cursor.")
+            response = await self.stream_page(before)
+        else:
+            with metrics.index_render_seconds.time("first"):
+                page = await sync_to_async(newsstand.render_page)()
+            response = encoded_response(request, page.content, page.variants, page.etag)
 
-        response = HttpResponse(content)
         response.headers["Spring-Version"] = "83"
         response.headers["Spring-Difficulty"] = "0"
         return response
 
+    async def stream_page(self, before: Cursor) -> StreamingHttpResponse:
+        """
+        Stream an older page of the newsstand, starting from the given cursor.
+
+        These pages aren't cached or compressed, the first few boards are sent
+        while the fragments for the rest are still being loaded.
+        """
+        start = time.perf_counter()
+        entries = await sync_to_async(newsstand.get_entries)(before)
+        chunks = newsstand.iter_render(entries)
+
+        async def stream():
+            while (chunk := await sync_to_async(next)(chunks, None)) is not None:
+                yield chunk.encode()
+            metrics.index_render_seconds.observe(time.perf_counter() - start, "older")
+
+        return StreamingHttpResponse(stream(), content_type="text/html; charset=utf-8")
+
+
+class DigestView(View):
+    async def get(self, request: HttpRequest) -> HttpResponse:
+        """
+        Retrieve the digest of the stored boards under a key prefix, for peers only.
+        """
+        address = request.META.get("REMOTE_ADDR", "")
+        if not await sync_to_async(peer_addresses.__contains__)(address):
+            return HttpResponseForbidden("The digest is only available to peers.")
+
+        try:
+            digest = await sync_to_async(get_digest)(request.GET.get("prefix", ""))
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+
+        response = JsonResponse(digest)
+        response.headers["Spring-Version"] = "83"
+        return response
+
+
+class MetricsView(View):
+    async def get(self, request: HttpRequest) -> HttpResponse:
+        """
+        Retrieve the metrics of this process in the Prometheus text format, if enabled.
+        """
+        if not settings.METRICS_ENABLED:
+            raise Http404()
+
+        content = await sync_to_async(metrics.registry.render)()
+        return HttpResponse(content, content_type="text/plain; version=0.0.4; charset=utf-8")
+
 
 class BoardView(View):
     @catch_spring83_exceptions
-    def get(self, request: HttpRequest, key: str) -> HttpResponse:
+    async def get(self, request: HttpRequest, key: str) -> HttpResponse:
         """
         Retrieve a board from the server.
         """
-        board: Board | None
+        board: CachedBoard | None
 
         if key == TEST_KEY_PUBLIC:
-            board = Board.generate_board()
+            result = "test"
+            board = board_cache.get_test_board()
+            if board is None:
+                board = await sync_to_async(
+                    board_cache.refresh_test_board, thread_sensitive=False
+                )()
         else:
-            board = Board.objects.get_or_none(key=key)
+            result = "hit"
+            board = await board_cache.aget(key)
             if board is None:
+                result = "miss"
+                instance = await Board.objects.aget_or_none(key=key)
+                if instance is None or instance.is_expired:
+                    metrics.gets_total.inc("not_found")
+                    raise Spring83Exception(
+                        "No board for this key found on this server.", status=404
+                    )
+                board = await board_cache.aset(instance)
+            elif board.is_expired:
+                # Expired boards are removed in the background, don't wait for that
+                await board_cache.adelete(key)
+                metrics.gets_total.inc("not_found")
                 raise Spring83Exception("No board for this key found on this server.", status=404)
 
         if "If-Modified-Since" in request.headers:
             if_modified_since = date_from_header(request.headers["If-Modified-Since"])
-            if if_modified_since and if_modified_since > board.last_modified:
+            if if_modified_since and board.last_modified <= if_modified_since:
+                metrics.gets_total.inc("not_modified")
                 raise Spring83Exception(
                     "Board requested is newer than server's timestamp.", status=304
                 )
 
-        response = HttpResponse(board.content)
+        response = encoded_response(request, board.content, board.variants, board.etag)
+        metrics.gets_total.inc("not_modified" if response.status_code == 304 else result)
         response.headers["Spring-Version"] = "83"
         response.headers["Spring-Signature"] = board.signature
         return response
 
     @catch_spring83_exceptions
-    def put(self, request: HttpRequest, key: str) -> HttpResponse:
+    async def put(self, request: HttpRequest, key: str) -> HttpResponse:
         """
         Create or replace a board on the server.
         """
-        content = self.validate_content(request)
-        self.validate_public_key(key)
-        signature = self.validate_signature(request, key)
-
-        existing_board = Board.objects.get_or_none(key=key)
-        self.validate_last_modified_header(request, existing_board)
-        last_modified = self.validate_last_modified_meta(content, existing_board)
-
-        board, created = Board.objects.update_or_create(
-            key=key,
-            defaults={
-                "content": content,
-                "signature": signature,
-                "last_modified": last_modified,
-            },
-        )
+        try:
+            await self.throttle_address(request.META.get("REMOTE_ADDR", ""))
+            with metrics.put_stage_seconds.time("read"):
+                content = self.read_content(request)
+            board, created = await self.store_board(
+                key,
+                content,
+                request.headers.get("Spring-Signature"),
+                request.headers.get("If-Unmodified-Since"),
+                rate_limit=True,
+            )
+        except Spring83Exception as e:
+            metrics.puts_total.inc(str(e.status))
+            raise
+        metrics.puts_total.inc("200")
+
         if created:
             message = "Board was successfully created."
         else:
             message = "Board was successfully updated."
 
-        eta = 300
-        job_id = f"broadcast:{board.key}"
-        try:
-            scheduler.add_job(
-                broadcast_board,
-                id=job_id,
-                args=[board.key],
-                trigger="date",
-                run_date=timezone.now() + timedelta(seconds=eta),
-                replace_existing=False,
-            )
-        except ConflictingIdError:
-            # Job is already scheduled in the queue, don't replace it
-            pass
-        else:
-            logger.info(f"Scheduled job {job_id} with eta {eta}s.")
-
         response = HttpResponse(message)
         response.headers["Spring-Version"] = "83"
         response.headers["Spring-Signature"] = board.signature
         return response
 
-    def validate_content(self, request: HttpRequest) -> str:
+    async def store_board(
+        self,
+        key: str,
+        content: bytes,
+        signature: str | None,
+        unmodified_since: str | None = None,
+        rate_limit: bool = False,
+    ) -> tuple[Board, bool]:
+        """
+        Validate a board and store it, raising a Spring83Exception if it's rejected.
+
+        This is every check a PUT goes through, boards pulled from peers are
+        stored the same way. The checks run cheapest first, so that oversized,
+        malformed and replayed boards are turned away before the signature is
+        verified. Pass rate_limit to also limit how often each key's board can
+        be replaced, only uploads with a valid signature count towards it.
+        """
+        stage = metrics.put_stage_seconds.time
+        with stage("size"):
+            content = self.validate_content(content)
+        with stage("key"):
+            self.validate_public_key(key)
+        with stage("time_tag"):
+            # Boards are small enough to scan on the event loop, faster than handing off to a thread
+            last_modified = self.parse_last_modified_meta(self.decode_content(content))
+
+        with stage("db_read"):
+            # Checked again when saving, this is to skip the signature check for most replays
+            stored = await Board.objects.filter(key=key).only("key", "last_modified").afirst()
+            self.validate_last_modified_header(unmodified_since, stored)
+            self.validate_last_modified_order(last_modified, stored)
+
+        with stage("signature"):
+            # Keep the signature check off of the event loop
+            signature = await sync_to_async(self.validate_signature, thread_sensitive=False)(
+                key, content, signature
+            )
+
+        # Only signed uploads are charged, so others can't use up the publisher's budget
+        if rate_limit and (wait := key_limiter.consume(key)):
+            raise self.rate_limited("Too many uploads for this key.", wait)
+        with stage("compress"):
+            # Boards are read far more often than they're written, compress them once up front
+            variants = await sync_to_async(compress, thread_sensitive=False)(content)
+
+        with stage("db_write"):
+            board, created = await sync_to_async(self.save_board)(
+                key, content, variants, signature, last_modified, unmodified_since
+            )
+        await board_cache.adelete(key)
+        await sync_to_async(newsstand.update, thread_sensitive=False)(board)
+        return board, created
+
+    def read_content(self, request: HttpRequest) -> bytes:
+        """
+        Read the request body, without reading more than one byte over the size limit.
+
+        Under ASGI, Django buffers the whole body before the view runs, the
+        BodySizeLimit wrapper in letsdance.core.asgi turns large bodies away first.
+        """
+        content_length = request.headers.get("Content-Length")
+        if content_length:
+            try:
+                length = int(content_length)
+            except ValueError:
+                raise Spring83Exception("Invalid Content-Length header.", status=400)
+            if length > BOARD_MAX_SIZE_BYTES:
+                raise Spring83Exception(
+                    f"Board is larger than {BOARD_MAX_SIZE_BYTES} bytes.", status=413
+                )
+
+        return request.read(BOARD_MAX_SIZE_BYTES + 1)
+
+    async def throttle_address(self, address: str) -> None:
+        """
+        Rate limit uploads from a client address, peers in the realm are exempt.
+        """
+        wait = address_limiter.consume(address)
+        # Only look the address up once the limit is reached, to keep this cheap
+        if wait and not await sync_to_async(peer_addresses.__contains__)(address):
+            raise self.rate_limited("Too many uploads from this address.", wait)
+
+    def rate_limited(self, message: str, wait: float) -> Spring83Exception:
+        retry_after = str(math.ceil(wait))
+        return Spring83Exception(message, status=429, headers={"Retry-After": retry_after})
+
+    def validate_content(self, content: bytes) -> bytes:
         """
         Validate the board content matches the data constraints.
         """
-        if len(request.body) > BOARD_MAX_SIZE_BYTES:
+        if len(content) > BOARD_MAX_SIZE_BYTES:
             raise Spring83Exception(
                 f"Board is larger than {BOARD_MAX_SIZE_BYTES} bytes.", status=413
             )
 
-        return request.body.decode()
+        return content
+
+    def decode_content(self, content: bytes) -> str:
+        """
+        Decode the board HTML, boards are stored as bytes but parsed as text.
+        """
+        try:
+            return content.decode()
+        except UnicodeDecodeError:
+            raise Spring83Exception("Board is not valid UTF-8.", status=400)
 
     def validate_public_key(self, key: str) -> str:
         """
@@ -146,37 +366,35 @@ class BoardView(View):
 
         return key
 
-    def validate_signature(self, request: HttpRequest, key: str) -> str:
+    def validate_signature(self, key: str, content: bytes, signature: str | None) -> str:
         """
-        Validate that the authorization header and signature is correct.
+        Validate that the Spring-Signature header is present and correct.
         """
-        if "Spring-Signature" not in request.headers:
+        if signature is None:
             raise Spring83Exception("Missing Spring-Signature header.", status=401)
 
-        signature = request.headers["Spring-Signature"]
-        if not verify_signature(signature, key, request.body):
+        if not verify_signature(signature, key, content):
             raise Spring83Exception("Board was submitted without a valid signature.", status=401)
 
         return signature
 
-    def validate_last_modified_header(self, request: HttpRequest, board: Board | None) -> None:
+    def validate_last_modified_header(self, header: str | None, board: Board | None) -> None:
         """
-        Validate the Unmodified-Since header from the HTTP request.
+        Validate the If-Unmodified-Since header from the HTTP request, if one was sent.
         """
-        if board:
-            unmodified_since = date_from_header(request.headers["If-Unmodified-Since"])
+        if board and header:
+            unmodified_since = date_from_header(header)
             if unmodified_since and unmodified_since <= board.last_modified:
                 raise Spring83Exception(
                     "Board was submitted with a timestamp older than the server's timestamp.",
                     status=409,
                 )
 
-    def validate_last_modified_meta(self, content: str, board: Board | None) -> datetime:
+    def parse_last_modified_meta(self, content: str) -> datetime:
         """
-        Validate the last-modified date from a <time> tag in the board HTML.
+        Parse the last-modified date from the <time> tag in the board HTML.
         """
-        selector = Selector(content)
-        tags = selector.css("time")
+        tags = find_time_tags(content, limit=2)
         if not tags:
             raise Spring83Exception("Board is missing last-modified <time> tag.", status=400)
 
@@ -185,26 +403,86 @@ class BoardView(View):
                 "Board contains more than one last-modified <time> tag", status=400
             )
 
-        tag = tags[0]
-
-        last_modified_str = tag.attrib.get("datetime", None)
-        if last_modified_str is None:
+        last_modified = parse_timestamp(tags[0]) if tags[0] is not None else None
+        if last_modified is None:
             raise Spring83Exception(
                 "Unable to parse date from last-modified <time> tag.", status=400
             )
 
-        last_modified = datetime.strptime(last_modified_str, "%Y-%m-%dT%H:%M:%SZ")
-        last_modified = last_modified.replace(tzinfo=timezone.utc)
-
         if last_modified > timezone.now():
             raise Spring83Exception(
                 "Board was submitted with a timestamp in the future.", status=400
             )
 
+        return last_modified
+
+    def validate_last_modified_order(self, last_modified: datetime, board: Board | None) -> None:
+        """
+        Validate that the board is newer than the version stored on the server.
+        """
         if board and last_modified <= board.last_modified:
             raise Spring83Exception(
                 "Board was submitted with a timestamp older than the server's timestamp.",
                 status=409,
             )
 
-        return last_modified
+    def save_board(
+        self,
+        key: str,
+        content: bytes,
+        variants: dict[str, bytes],
+        signature: str,
+        last_modified: datetime,
+        unmodified_since: str | None = None,
+    ) -> tuple[Board, bool]:
+        """
+        Compare the board against the stored version and save it.
+
+        Everything expensive has been validated beforehand, so that the write
+        transaction around the read-check-write stays as short as possible.
+        """
+        evicted: list[str] = []
+        with transaction.atomic():
+            board = Board.objects.get_or_none(key=key)
+            self.validate_last_modified_header(unmodified_since, board)
+            self.validate_last_modified_order(last_modified, board)
+
+            created = board is None
+            removed = []
+            if board is None:
+                evicted = self.make_room()
+                board = Board(key=key)
+            else:
+                removed.append((board.key, board.last_modified))
+            board.set_content(content, variants)
+            board.signature = signature
+            board.last_modified = last_modified
+            board.save()
+            Board.objects.track(added=[(board.key, last_modified)], removed=removed)
+
+            # Queued in the same transaction, so every stored board gets broadcast
+            broadcast_board(board.key)
+
+        if evicted:
+            board_cache.delete_many(evicted)
+            newsstand.discard(evicted)
+            logger.info(f"Evicted {len(evicted)} board(s) to stay under capacity.")
+
+        return board, created
+
+    def make_room(self) -> list[str]:
+        """
+        Make space for a new board when the server is full, returning the evicted keys.
+
+        Uses the maintained board counter, so this is cheap when there's room.
+        Each call evicts a bounded batch, a server that is far over capacity
+        (e.g. after lowering the limit) shrinks a little with every new board.
+        """
+        overflow = Board.objects.stored_count() - BOARD_MAX_COUNT + 1
+        if overflow <= 0:
+            return []
+
+        if settings.BOARD_CAPACITY_POLICY == "reject":
+            raise Spring83Exception("Server is at capacity, try again later.", status=507)
+
+        return Board.objects.delete_oldest(min(overflow, settings.BOARD_EVICTION_BATCH_SIZE))
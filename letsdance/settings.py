@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import copy
 import os
 
 import environ
+from django.core.exceptions import ImproperlyConfigured
 
 env = environ.Env()
 env.smart_cast = False
@@ -40,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "letsdance.core.profiling.ProfilerMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -67,6 +70,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "letsdance.wsgi.application"
+ASGI_APPLICATION = "letsdance.asgi.application"
 
 # Database
 DATABASES = {
@@ -76,6 +80,41 @@ DATABASES = {
     }
 }
 
+# Storage profiles. "production" tunes SQLite for concurrent readers and writers:
+# WAL journaling, a larger page cache and memory-mapped reads, waiting on locks
+# instead of failing, write transactions that take the lock up front, and a
+# pool of connections reused across requests. Django's own persistent
+# connections are per thread, which under ASGI means per request, so they're off.
+DATABASE_PROFILES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "CONN_MAX_AGE": 0,
+        "CONN_HEALTH_CHECKS": False,
+        "OPTIONS": {},
+    },
+    "production": {
+        "ENGINE": "letsdance.core.backends.sqlite3",
+        "CONN_MAX_AGE": 0,
+        "CONN_HEALTH_CHECKS": False,
+        "OPTIONS": {
+            "transaction_mode": "IMMEDIATE",
+            "pool_size": env.int("DATABASE_POOL_SIZE", 16),
+            "pragmas": {
+                "journal_mode": "wal",
+                "synchronous": "normal",
+                "cache_size": -64 * 1024,
+                "mmap_size": 256 * 1024 * 1024,
+                "busy_timeout": 5000,
+                "temp_store": "memory",
+            },
+        },
+    },
+}
+DATABASE_PROFILE = env.str("DATABASE_PROFILE", "default")
+if DATABASE_PROFILE not in DATABASE_PROFILES:
+    raise ImproperlyConfigured(f"Unknown DATABASE_PROFILE: {DATABASE_PROFILE}")
+DATABASES["default"].update(copy.deepcopy(DATABASE_PROFILES[DATABASE_PROFILE]))
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS: list[dict] = []
 
@@ -130,3 +169,94 @@ LOGGING = {
 
 MEDIA_ROOT = os.path.join(BASE_DIR, "..", "data", "media")
 MEDIA_URL = "/media/"
+
+# Memory budget for the in-process cache of board responses
+BOARD_CACHE_MAX_BYTES = env.int("BOARD_CACHE_MAX_BYTES", 32 * 1024 * 1024)
+
+# Store cached boards in this django cache instead, to share them between workers
+BOARD_CACHE_ALIAS = env.str("BOARD_CACHE_ALIAS", None)
+
+# Seconds a cached board is served for before it's read from the database again
+BOARD_CACHE_TTL_SECONDS = env.int("BOARD_CACHE_TTL_SECONDS", 300)
+
+# Number of recently modified boards to preload into the cache at startup
+BOARD_CACHE_WARM_COUNT = env.int("BOARD_CACHE_WARM_COUNT", 5000)
+
+# How often, in seconds, the board served for the test key is regenerated
+TEST_BOARD_REFRESH_SECONDS = env.int("TEST_BOARD_REFRESH_SECONDS", 60)
+
+# Number of boards shown on each page of the newsstand
+NEWSSTAND_PAGE_SIZE = env.int("NEWSSTAND_PAGE_SIZE", 100)
+
+# Memory budget for the pre-rendered board fragments on the newsstand page
+NEWSSTAND_CACHE_MAX_BYTES = env.int("NEWSSTAND_CACHE_MAX_BYTES", 16 * 1024 * 1024)
+
+# Timeouts in seconds for HTTP requests made to peer servers
+PEER_CONNECT_TIMEOUT = env.float("PEER_CONNECT_TIMEOUT", 5.0)
+PEER_READ_TIMEOUT = env.float("PEER_READ_TIMEOUT", 10.0)
+
+# Number of peer hosts to keep connection pools for, and connections kept per host
+PEER_POOL_CONNECTIONS = env.int("PEER_POOL_CONNECTIONS", 32)
+PEER_POOL_MAXSIZE = env.int("PEER_POOL_MAXSIZE", 4)
+
+# Maximum number of in-flight requests when publishing a board to many peers at once
+PEER_MAX_CONCURRENCY = env.int("PEER_MAX_CONCURRENCY", 16)
+
+# How often, in seconds, the outbox is checked for boards due to be sent to peers
+OUTBOX_DRAIN_INTERVAL = env.int("OUTBOX_DRAIN_INTERVAL", 10)
+
+# Number of outbox deliveries claimed and sent together in one batch
+OUTBOX_BATCH_SIZE = env.int("OUTBOX_BATCH_SIZE", 100)
+
+# Number of expired boards deleted per batch, and the pause in seconds between batches
+BOARD_EXPIRY_BATCH_SIZE = env.int("BOARD_EXPIRY_BATCH_SIZE", 500)
+BOARD_EXPIRY_PAUSE = env.float("BOARD_EXPIRY_PAUSE", 0.05)
+
+# What to do with a new board once BOARD_MAX_COUNT boards are stored, either
+# "evict" the least recently modified boards or "reject" the new board
+BOARD_CAPACITY_POLICY = env.str("BOARD_CAPACITY_POLICY", "evict")
+if BOARD_CAPACITY_POLICY not in ("evict", "reject"):
+    raise ImproperlyConfigured(f"Unknown BOARD_CAPACITY_POLICY: {BOARD_CAPACITY_POLICY}")
+
+# Maximum number of boards evicted by a single PUT when the server is over capacity
+BOARD_EVICTION_BATCH_SIZE = env.int("BOARD_EVICTION_BATCH_SIZE", 100)
+
+# How often, in seconds, followed boards are pulled from peers
+SYNC_INTERVAL = env.int("SYNC_INTERVAL", 15 * 60)
+
+# Maximum number of peers asked for each followed board in a sync
+SYNC_PEERS_PER_KEY = env.int("SYNC_PEERS_PER_KEY", 3)
+
+# Requests per second, and the burst allowed on top of that, sent to each peer during a sync
+SYNC_PEER_RATE = env.float("SYNC_PEER_RATE", 2.0)
+SYNC_PEER_BURST = env.int("SYNC_PEER_BURST", 10)
+
+# How often, in seconds, the stored boards are reconciled with peers using their digests
+RECONCILE_INTERVAL = env.int("RECONCILE_INTERVAL", 60 * 60)
+
+# Number of peers, picked at random and weighted by health, reconciled with each time
+RECONCILE_PEERS = env.int("RECONCILE_PEERS", 1)
+
+# How long, in seconds, the resolved addresses of peers allowed to read the digest are cached
+DIGEST_PEER_CACHE_SECONDS = env.int("DIGEST_PEER_CACHE_SECONDS", 5 * 60)
+
+# Board uploads allowed per second, and the burst allowed on top of that, from each client
+# IP address (peers in the realm are exempt) and for each key. Set a rate to 0 to disable it.
+PUT_RATE_PER_ADDRESS = env.float("PUT_RATE_PER_ADDRESS", 2.0)
+PUT_BURST_PER_ADDRESS = env.int("PUT_BURST_PER_ADDRESS", 30)
+PUT_RATE_PER_KEY = env.float("PUT_RATE_PER_KEY", 0.1)
+PUT_BURST_PER_KEY = env.int("PUT_BURST_PER_KEY", 5)
+
+# Number of client addresses and keys the upload rate limits are tracked for
+PUT_RATE_LIMIT_MAX_CLIENTS = env.int("PUT_RATE_LIMIT_MAX_CLIENTS", 100_000)
+
+# Serve metrics for Prometheus to scrape at /metrics, they're per process
+METRICS_ENABLED = env.bool("METRICS_ENABLED", False)
+
+# Profile a fraction of requests with cProfile, saving those that take at least
+# PROFILE_SLOW_SECONDS to a ring of the last PROFILE_MAX_DUMPS files in PROFILE_DIR
+PROFILE_ENABLED = env.bool("PROFILE_ENABLED", False)
+PROFILE_SAMPLE_RATE = env.float("PROFILE_SAMPLE_RATE", 0.01)
+PROFILE_SLOW_SECONDS = env.float("PROFILE_SLOW_SECONDS", 0.0)
+PROFILE_MAX_DUMPS = env.int("PROFILE_MAX_DUMPS", 100)
+PROFILE_DIR = env.str("PROFILE_DIR", os.path.join(BASE_DIR, "..", "data", "profiles"))
@@ -4,7 +4,7 @@ from django.contrib import admin
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.urls import path, register_converter
 
-from letsdance.core.views import BoardView, IndexView
+from letsdance.core.views import BoardView, DigestView, IndexView, MetricsView
 
 
 class KeyConverter:
@@ -23,6 +23,8 @@ register_converter(KeyConverter, "key")
 urlpatterns = [
     path("", IndexView.as_view(), name="index"),
     path("<key:key>", BoardView.as_view(), name="board"),
+    path("digest", DigestView.as_view(), name="digest"),
+    path("metrics", MetricsView.as_view(), name="metrics"),
     path("admin/", admin.site.urls),
     *static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT),
     *staticfiles_urlpatterns(),
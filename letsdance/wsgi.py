@@ -6,6 +6,10 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "letsdance.settings")
 
 application = get_wsgi_application()
 
+from django.conf import settings  # noqa: E402
+
+from letsdance.core.cache import board_cache  # noqa: E402
 from letsdance.core.tasks import scheduler  # noqa: E402
 
 scheduler.start()
+board_cache.warm(settings.BOARD_CACHE_WARM_COUNT)